@@ -3,13 +3,18 @@ __version__ = "0.0.1"
 from aiohttp import web
 from aiohttp_apispec import setup_aiohttp_apispec, validation_middleware
 from aiohttp_swagger import setup_swagger
-from Crypto.PublicKey import RSA
-from Crypto.Signature import PKCS1_v1_5
 
 from app.db.postgres import close_postgres, init_postgres
 from app.db.redis import close_redis, init_redis
+from app.middlewares import overload_middleware
+from app.partitions import PartitionsManager
+from app.passwords import PasswordHasher
 from app.rates_client import RatesClient
+from app.report_jobs import ReportJobs
 from app.routes import setup_routes
+from app.sessions import SessionStorage
+from app.signer import OperationsSigner
+from app.wallets import WalletsResolver
 
 
 def create_app(config: dict) -> web.Application:
@@ -36,17 +41,22 @@ def create_app(config: dict) -> web.Application:
             {"name": "wallet", "description": "Wallet management methods"},
             {"name": "reports", "description": "Reports generating"},
             {"name": "operations", "description": "Moving operations between statuses"},
+            {"name": "metrics", "description": "Service metrics"},
         ],
     )
 
     app.on_startup.extend([swagger, init_postgres, init_redis])
     app.on_cleanup.extend([close_redis, close_postgres])
 
-    app.middlewares.extend([validation_middleware])
+    app.middlewares.extend([overload_middleware, validation_middleware])
 
+    PartitionsManager.register_app(app)
     RatesClient.register_app(app)
-
-    load_private_key(app)
+    OperationsSigner.register_app(app)
+    PasswordHasher.register_app(app)
+    SessionStorage.register_app(app)
+    ReportJobs.register_app(app)
+    WalletsResolver.register_app(app)
 
     return app
 
@@ -62,9 +72,3 @@ def get_description() -> str:
     except FileNotFoundError:
         description = ""
     return description
-
-
-def load_private_key(app):
-    with open(app["config"]["PRIVATE_KEY"], "r") as key_file:
-        private_key = RSA.importKey(key_file.read())
-    app["operations_signer"] = PKCS1_v1_5.new(private_key)
@@ -0,0 +1,46 @@
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    In-process LRU cache with expiration time for every item.
+    Counts hits and misses.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        try:
+            value, expires_at = self.items[key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        if expires_at <= time.monotonic():
+            del self.items[key]
+            self.misses += 1
+            return default
+
+        self.items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl: float = None):
+        """ Item ttl could only be smaller than default one """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self.items[key] = (value, time.monotonic() + ttl)
+        self.items.move_to_end(key)
+        if len(self.items) > self.max_size:
+            self.items.popitem(last=False)
+
+    def delete(self, key):
+        self.items.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"size": len(self.items), "hits": self.hits, "misses": self.misses}
@@ -19,9 +19,26 @@ class OperationStatuses(str, Enum):
         return self.value
 
 
+class OperationDirections(str, Enum):
+    """ Operation direction for one of its users """
+
+    INCOME = "income"
+    OUTCOME = "outcome"
+
+    def __str__(self):
+        """ For correct formatting in reports """
+        return self.value
+
+
 class ReportFormats(str, Enum):
     XML = "XML"
     CSV = "CSV"
+    NDJSON = "NDJSON"
+    # One page of report, see REPORT_PAGE_SIZE
+    JSON = "JSON"
+    # Columnar formats, need pyarrow
+    ARROW = "ARROW"
+    PARQUET = "PARQUET"
 
 
 class ReportTypes(str, Enum):
@@ -39,3 +56,23 @@ ALLOWED_TRANSACTIONS = {
     OperationStatuses.ACCEPTED: [],
     OperationStatuses.FAILED: [],
 }
+
+# Wallet balance changes on transactions: (wallet, sign) for every
+# (status, new status) pair, amount is converted with the wallet rate
+BALANCE_CHANGES = {
+    (OperationStatuses.DRAFT, OperationStatuses.PROCESSING): ("sender", -1),
+    (OperationStatuses.PROCESSING, OperationStatuses.ACCEPTED): ("receiver", 1),
+    (OperationStatuses.PROCESSING, OperationStatuses.FAILED): ("sender", 1),
+}
+
+# Operations in these statuses never change
+FINAL_STATUSES = [
+    status for status, allowed in ALLOWED_TRANSACTIONS.items() if not allowed
+]
+
+# Maximum number of operations accepted by one batch request
+MAX_OPERATIONS_BATCH_SIZE = 10_000
+
+# Number of report rows in one JSON page by default and at most
+REPORT_PAGE_SIZE = 50
+MAX_REPORT_PAGE_SIZE = 1_000
@@ -1,16 +1,30 @@
 from aiohttp import web
 from databases import Database
 
+from app.db.postgres.direct import DirectConnections
+
 
 async def init_postgres(app: web.Application):
+    config = app["config"]["POSTGRES"]
+    testing = app["config"].get("TESTING", False)
     app["db"] = Database(
-        app["config"]["POSTGRES"]["DSN"],
-        force_rollback=app["config"].get("TESTING", False),
-        min_size=app["config"]["POSTGRES"]["POOL_MIN_SIZE"],
-        max_size=app["config"]["POSTGRES"]["POOL_MAX_SIZE"],
+        config["DSN"],
+        force_rollback=testing,
+        min_size=config["POOL_MIN_SIZE"],
+        max_size=config["POOL_MAX_SIZE"],
     )
     await app["db"].connect()
 
+    # Hot queries connections, "databases" ones are used if direct pool is disabled
+    app["pg"] = DirectConnections(app["db"])
+    if config["DIRECT_POOL"]["ENABLED"] and not testing:
+        await app["pg"].connect(
+            config["DSN"],
+            min_size=config["DIRECT_POOL"]["MIN_SIZE"],
+            max_size=config["DIRECT_POOL"]["MAX_SIZE"],
+        )
+
 
 async def close_postgres(app: web.Application):
+    await app["pg"].disconnect()
     await app["db"].disconnect()
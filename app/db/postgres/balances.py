@@ -0,0 +1,24 @@
+"""
+Single statement wallet amount mutations. Other balance changes are made
+by change_operation_status() database function (app.db.postgres.transitions).
+Every function makes one round trip and is safe for concurrent use.
+"""
+import sqlalchemy as sa
+
+from app.db.postgres.models import wallets
+
+
+async def credit_user_wallet(con, user_id: int, amounts: dict):
+    """
+    Add amount to user wallet, amounts are given for every
+    possible wallet currency. Returns new wallet amount and currency.
+    """
+    return await con.fetch_one(
+        sa.update(wallets)
+        .values(
+            amount=wallets.c.amount
+            + sa.cast(sa.case(amounts, value=wallets.c.currency), wallets.c.amount.type)
+        )
+        .where(wallets.c.user_id == user_id)
+        .returning(wallets.c.amount, wallets.c.currency)
+    )
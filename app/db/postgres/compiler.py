@@ -0,0 +1,121 @@
+"""
+Compiling SQLAlchemy Core queries for direct asyncpg usage
+(cursors, COPY and so on), the same way "databases" does.
+Hot queries are compiled once by their shape and cached.
+"""
+import collections
+from typing import NamedTuple
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import pypostgresql
+
+from app.db.postgres.direct import DirectConnections
+
+
+def make_dialect():
+    dialect = pypostgresql.dialect(paramstyle="pyformat")
+    dialect.implicit_returning = True
+    dialect.supports_native_enum = True
+    dialect.supports_smallserial = True
+    dialect._backslash_escapes = False
+    dialect.supports_sane_multi_rowcount = True
+    dialect._has_native_hstore = True
+    dialect.supports_native_decimal = True
+    return dialect
+
+
+dialect = make_dialect()
+
+
+def compile_query(query: sa.sql.ClauseElement) -> (str, list):
+    """ Returns SQL with $n placeholders and list of its arguments """
+    if isinstance(query, BoundQuery):
+        return query
+    compiled = query.compile(dialect=dialect)
+    params = sorted(compiled.params.items())
+    mapping = {key: f"${i}" for i, (key, _) in enumerate(params, start=1)}
+    processors = compiled._bind_processors
+    args = [
+        processors[key](value) if key in processors else value for key, value in params
+    ]
+    return compiled.string % mapping, args
+
+
+class BoundQuery(NamedTuple):
+    """ Compiled query with its arguments, ready for asyncpg """
+
+    sql: str
+    args: list
+
+
+class CachedQuery:
+    """
+    Query compiled once with named bind parameters,
+    values of them are given for every execution.
+    """
+
+    def __init__(self, query: sa.sql.ClauseElement):
+        compiled = query.compile(dialect=dialect)
+        self.params = sorted(compiled.params.items())
+        mapping = {key: f"${i}" for i, (key, _) in enumerate(self.params, start=1)}
+        self.sql = compiled.string % mapping
+        self.processors = compiled._bind_processors
+        # Values of literals are compiled in, sa.bindparam() ones are required
+        self.names = {key for key, bind in compiled.binds.items() if bind.required}
+
+    def bind(self, **values) -> BoundQuery:
+        args = []
+        for key, value in self.params:
+            if key in self.names:
+                value = values[key]
+            args.append(
+                self.processors[key](value) if key in self.processors else value
+            )
+        return BoundQuery(self.sql, args)
+
+
+class QueryCache:
+    """
+    Process wide cache of compiled queries by their shape key, counts hits.
+    The same SQL text lets asyncpg reuse its prepared statements
+    from connection statement cache as well.
+    """
+
+    def __init__(self):
+        self.queries = {}
+        self.hits = collections.Counter()
+        self.misses = collections.Counter()
+
+    def get(self, key: tuple, build) -> CachedQuery:
+        """ build() returns query of the shape with sa.bindparam() for values """
+        query = self.queries.get(key)
+        if query is None:
+            self.misses[key[0]] += 1
+            query = self.queries[key] = CachedQuery(build())
+        else:
+            self.hits[key[0]] += 1
+        return query
+
+    def stats(self) -> dict:
+        return {
+            name: {"hits": self.hits[name], "misses": self.misses[name]}
+            for name in sorted(self.misses)
+        }
+
+
+queries = QueryCache()
+
+
+async def fetch_all(pg: DirectConnections, query: BoundQuery) -> list:
+    async with pg.connection() as con:
+        return await con.fetch(query.sql, *query.args)
+
+
+async def fetch_one(pg: DirectConnections, query: BoundQuery):
+    async with pg.connection() as con:
+        return await con.fetchrow(query.sql, *query.args)
+
+
+async def fetch_val(pg: DirectConnections, query: BoundQuery):
+    async with pg.connection() as con:
+        return await con.fetchval(query.sql, *query.args)
@@ -0,0 +1,62 @@
+"""
+Connections for hot queries: optional asyncpg pool used directly,
+without "databases" connection wrapping and result processing.
+Numeric and timestamp columns are decoded by asyncpg builtin binary
+codecs, enums are decoded to app.constants enums by registered codecs.
+
+When the pool is disabled (and always in tests, where data lives in
+rolled back transaction of "databases" connection) raw connections
+of "databases" are used and enums are decoded as plain strings.
+"""
+import contextlib
+from functools import partial
+
+import asyncpg
+from databases import Database
+
+from app.constants import OperationDirections, OperationStatuses, WalletCurrencies
+
+# PostgreSQL enum type: python enum
+ENUM_CODECS = {
+    "walletcurrencies": WalletCurrencies,
+    "operationstatuses": OperationStatuses,
+    "operationdirections": OperationDirections,
+}
+
+
+def encode_enum(enum, value) -> str:
+    return enum(value).value
+
+
+async def init_connection(con: asyncpg.Connection):
+    """ Registers codecs on every new pool connection """
+    for type_name, enum in ENUM_CODECS.items():
+        await con.set_type_codec(
+            type_name, encoder=partial(encode_enum, enum), decoder=enum, format="text"
+        )
+
+
+class DirectConnections:
+    """ Gives asyncpg connection of direct pool or of "databases" """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.pool: asyncpg.pool.Pool = None
+
+    async def connect(self, dsn: str, min_size: int, max_size: int):
+        self.pool = await asyncpg.create_pool(
+            dsn, min_size=min_size, max_size=max_size, init=init_connection
+        )
+
+    async def disconnect(self):
+        if self.pool:
+            await self.pool.close()
+
+    @contextlib.asynccontextmanager
+    async def connection(self) -> asyncpg.Connection:
+        if self.pool:
+            async with self.pool.acquire() as con:
+                yield con
+        else:
+            async with self.db.connection() as con:
+                yield con.raw_connection
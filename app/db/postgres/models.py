@@ -1,9 +1,14 @@
 import sqlalchemy as sa
 
-from app.constants import OperationStatuses, WalletCurrencies
+from app.constants import OperationDirections, OperationStatuses, WalletCurrencies
 
 metadata = sa.MetaData()
 
+# History tables are partitioned by month of "datetime", partitions are
+# created beforehand by app.partitions. Primary and unique keys have to include
+# "datetime", and other tables could not have foreign keys to partitioned ones.
+PARTITION_BY_MONTH = "RANGE (datetime)"
+
 users = sa.Table(
     "users",
     metadata,
@@ -34,7 +39,7 @@ wallets = sa.Table(
 operations = sa.Table(
     "operations",
     metadata,
-    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
     sa.Column(
         "sender_wallet_id",
         sa.Integer,
@@ -52,22 +57,75 @@ operations = sa.Table(
     sa.Column("amount", sa.DECIMAL(18, 2), nullable=False),
     sa.Column("sender_wallet_rate", sa.DECIMAL(10, 2), nullable=False),
     sa.Column("receiver_wallet_rate", sa.DECIMAL(10, 2), nullable=False),
-    sa.Column("datetime", sa.DateTime, nullable=False, index=True),
+    sa.Column("datetime", sa.DateTime, primary_key=True),
     sa.Column("signature", sa.Unicode, nullable=False),
+    # Last status from operations_statuses, kept in sync with it
+    sa.Column("current_status", sa.Enum(OperationStatuses), nullable=False),
+    # Number of statuses operation has had, for optimistic concurrency
+    sa.Column("status_version", sa.Integer, nullable=False),
+    postgresql_partition_by=PARTITION_BY_MONTH,
+)
+
+# Every operation id once with its datetime, kept by trigger on "operations".
+# Makes operations ids unique, could be referenced by foreign keys
+# and gives operation partition key by its id (see migration f0d3b6a81c92)
+operation_datetimes = sa.Table(
+    "operation_datetimes",
+    metadata,
+    sa.Column("id", sa.Integer, primary_key=True, autoincrement=False),
+    sa.Column("datetime", sa.DateTime, nullable=False),
 )
 
 operations_statuses = sa.Table(
     "operations_statuses",
     metadata,
-    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
     sa.Column(
         "operation_id",
         sa.Integer,
-        sa.ForeignKey("operations.id", ondelete="CASCADE"),
+        sa.ForeignKey("operation_datetimes.id", ondelete="CASCADE"),
         nullable=False,
         index=True,
     ),
     sa.Column("status", sa.Enum(OperationStatuses), nullable=False),
-    sa.Column("datetime", sa.DateTime, nullable=False),
-    sa.UniqueConstraint("operation_id", "status"),
+    sa.Column("datetime", sa.DateTime, primary_key=True),
+    sa.UniqueConstraint("operation_id", "status", "datetime"),
+    postgresql_partition_by=PARTITION_BY_MONTH,
+)
+# Operation statuses in order, status and datetime are INCLUDEd
+# in database index for index only scans (see migration f7a2c5e09d14)
+sa.Index(
+    "ix_operations_statuses_operation_id_id",
+    operations_statuses.c.operation_id,
+    operations_statuses.c.id,
+)
+
+# Every operation once for its sender and once for its receiver,
+# so history of one user is one primary key range scan ordered by datetime
+user_operations = sa.Table(
+    "user_operations",
+    metadata,
+    sa.Column(
+        "user_id",
+        sa.Integer,
+        sa.ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    sa.Column("datetime", sa.DateTime, primary_key=True),
+    sa.Column(
+        "operation_id",
+        sa.Integer,
+        sa.ForeignKey("operation_datetimes.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    ),
+    sa.Column(
+        "direction",
+        sa.Enum(
+            OperationDirections,
+            values_callable=lambda directions: [d.value for d in directions],
+        ),
+        nullable=False,
+    ),
+    postgresql_partition_by=PARTITION_BY_MONTH,
 )
@@ -0,0 +1,137 @@
+"""
+Single statement operation creation: operation, its first status and
+sender and receiver history rows are inserted by one data-modifying CTE,
+so creation is one round trip and needs no explicit transaction.
+Batch of operations runs the same statement for every one of them
+in one transaction.
+"""
+from typing import List, Tuple
+
+import sqlalchemy as sa
+
+from app.constants import OperationDirections, OperationStatuses
+from app.db.postgres.compiler import BoundQuery, fetch_val, queries
+from app.db.postgres.models import operations, operations_statuses, user_operations
+
+
+async def insert_operation(
+    pg, operation: dict, sender_user_id: int, receiver_user_id: int
+) -> int:
+    """ Insert DRAFT operation with its history, returns operation id """
+    return await fetch_val(
+        pg, insert_operation_query(operation, sender_user_id, receiver_user_id)
+    )
+
+
+async def insert_operations(pg, items: List[Tuple[dict, int, int]]) -> List[int]:
+    """
+    Insert DRAFT operations in one transaction, items are
+    (operation, sender_user_id, receiver_user_id) like insert_operation() args
+    and operations have the same keys.
+    Ids are reserved beforehand, returns them in order of items.
+    """
+    async with pg.connection() as con:
+        query = reserve_operation_ids_query(len(items))
+        operation_ids = [row["id"] for row in await con.fetch(query.sql, *query.args)]
+        inserts = [
+            insert_operation_query(
+                dict(operation, id=operation_id), sender_user_id, receiver_user_id
+            )
+            for (operation, sender_user_id, receiver_user_id), operation_id in zip(
+                items, operation_ids
+            )
+        ]
+        async with con.transaction():
+            # Statements of the same shape share SQL, sent in one pipeline
+            await con.executemany(inserts[0].sql, [query.args for query in inserts])
+    return operation_ids
+
+
+def reserve_operation_ids_query(count: int) -> BoundQuery:
+    query = queries.get(
+        ("reserve_operation_ids",),
+        lambda: sa.select(
+            [sa.func.nextval("operations_id_seq").label("id")]
+        ).select_from(
+            sa.func.generate_series(
+                sa.cast(1, sa.Integer), sa.bindparam("count", type_=sa.Integer)
+            )
+        ),
+    )
+    return query.bind(count=count)
+
+
+def insert_operation_query(
+    operation: dict, sender_user_id: int, receiver_user_id: int
+) -> BoundQuery:
+    keys = tuple(sorted(operation))
+    query = queries.get(
+        ("insert_operation", keys),
+        lambda: build_insert_operation_query(
+            {key: sa.bindparam(f"operation_{key}") for key in keys},
+            sa.bindparam("sender_user_id"),
+            sa.bindparam("receiver_user_id"),
+        ),
+    )
+    return query.bind(
+        **{f"operation_{key}": value for key, value in operation.items()},
+        sender_user_id=sender_user_id,
+        receiver_user_id=receiver_user_id,
+    )
+
+
+def build_insert_operation_query(
+    operation: dict, sender_user_id: int, receiver_user_id: int
+):
+    # Every step inserts rows from RETURNING of the previous one
+    operation = (
+        operations.insert()
+        .values(**operation, current_status=OperationStatuses.DRAFT, status_version=1)
+        .returning(operations.c.id, operations.c.datetime)
+        .cte("operation")
+    )
+    status = (
+        operations_statuses.insert()
+        .from_select(
+            ["operation_id", "status", "datetime"],
+            sa.select(
+                [
+                    operation.c.id,
+                    typed(operations_statuses.c.status, OperationStatuses.DRAFT),
+                    operation.c.datetime,
+                ]
+            ),
+        )
+        .returning(operations_statuses.c.operation_id, operations_statuses.c.datetime)
+        .cte("status")
+    )
+    history = (
+        user_operations.insert()
+        .from_select(
+            ["user_id", "operation_id", "datetime", "direction"],
+            sa.union_all(
+                *[
+                    sa.select(
+                        [
+                            typed(user_operations.c.user_id, user_id),
+                            status.c.operation_id,
+                            status.c.datetime,
+                            typed(user_operations.c.direction, direction),
+                        ]
+                    )
+                    for user_id, direction in (
+                        (sender_user_id, OperationDirections.OUTCOME),
+                        (receiver_user_id, OperationDirections.INCOME),
+                    )
+                ]
+            ),
+        )
+        .returning(user_operations.c.operation_id)
+        .cte("history")
+    )
+    return sa.select([history.c.operation_id]).limit(1)
+
+
+def typed(column, value):
+    """ Parameters in INSERT ... SELECT list are not typed by target columns """
+    return sa.cast(value, column.type)
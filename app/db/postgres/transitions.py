@@ -0,0 +1,286 @@
+"""
+Operation status transition as one database function call.
+Function source is generated from transition and balance rules
+in app.constants, its text is copied into migrations and tests check
+that installed function is the same as generated one.
+"""
+import datetime as dt
+from typing import List, Optional, Tuple
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.constants import ALLOWED_TRANSACTIONS, BALANCE_CHANGES
+from app.db.postgres.compiler import BoundQuery, fetch_one, queries
+from app.db.postgres.models import operation_datetimes, operations, wallets
+
+FUNCTION_NAME = "change_operation_status"
+
+# Function result codes other than 200 (changed)
+TRANSITION_ERRORS = {
+    404: "Operation not found",
+    400: "Not valid status",
+    202: "Not enough money on sender wallet",
+}
+
+
+async def change_operation_status(
+    pg, operation_id: int, new_status, status_datetime: dt.datetime
+) -> Tuple[int, Optional[dict]]:
+    """
+    Returns (code, operation) pair, code is 200 if status is changed
+    or one of TRANSITION_ERRORS codes and operation is None then.
+    Status history is stamped with app clock as operations are.
+    """
+    result = await fetch_one(
+        pg, change_status_query(operation_id, new_status, status_datetime)
+    )
+    if result["code"] != 200:
+        return result["code"], None
+    return 200, {column.name: result[column.name] for column in operations.c}
+
+
+def change_status_query(
+    operation_id: int, new_status, status_datetime: dt.datetime
+) -> BoundQuery:
+    query = queries.get(
+        ("change_status",),
+        lambda: build_change_status_query(
+            sa.bindparam("operation_id"),
+            sa.bindparam("new_status", type_=operations.c.current_status.type),
+            sa.bindparam("status_datetime", type_=operations.c.datetime.type),
+        ),
+    )
+    return query.bind(
+        operation_id=operation_id,
+        new_status=new_status,
+        status_datetime=status_datetime,
+    )
+
+
+def build_change_status_query(operation_id: int, new_status, status_datetime):
+    return sa.select(
+        [sa.column("code", sa.Integer)]
+        + [sa.column(column.name, column.type) for column in operations.c]
+    ).select_from(
+        getattr(sa.func, FUNCTION_NAME)(
+            operation_id,
+            sa.cast(new_status, operations.c.current_status.type),
+            sa.cast(status_datetime, operations.c.datetime.type),
+        )
+    )
+
+
+async def change_operations_statuses(
+    pg, items: List[Tuple[int, str]], status_datetime: dt.datetime
+) -> List[int]:
+    """
+    Changes statuses of many operations in one transaction with the same
+    database function, items are (operation_id, new_status) pairs applied
+    in their order, so one operation could be moved several times.
+    Returns change_operation_status() result code for every item.
+    """
+    operation_ids = sorted({operation_id for operation_id, _ in items})
+    async with pg.connection() as con:
+        async with con.transaction():
+            # Locking operations and then their wallets always in ascending
+            # id order, so concurrent batches could not deadlock each other
+            query = lock_operations_query(operation_ids)
+            locked = await con.fetch(query.sql, *query.args)
+            wallet_ids = sorted(
+                {
+                    wallet_id
+                    for operation in locked
+                    for wallet_id in (
+                        operation["sender_wallet_id"],
+                        operation["receiver_wallet_id"],
+                    )
+                }
+            )
+            query = lock_wallets_query(wallet_ids)
+            await con.fetch(query.sql, *query.args)
+            query = change_statuses_query(items, status_datetime)
+            results = await con.fetch(query.sql, *query.args)
+    return [result["code"] for result in results]
+
+
+def lock_operations_query(operation_ids: List[int]) -> BoundQuery:
+    query = queries.get(
+        ("lock_operations",),
+        lambda: sa.select(
+            [operations.c.sender_wallet_id, operations.c.receiver_wallet_id]
+        )
+        .select_from(
+            # Partition key from not partitioned table prunes other partitions
+            operation_datetimes.join(
+                operations,
+                sa.and_(
+                    operations.c.id == operation_datetimes.c.id,
+                    operations.c.datetime == operation_datetimes.c.datetime,
+                ),
+            )
+        )
+        .where(
+            operation_datetimes.c.id
+            == sa.any_(
+                sa.bindparam("operation_ids", type_=postgresql.ARRAY(sa.Integer))
+            )
+        )
+        .order_by(operations.c.id)
+        .with_for_update(of=operations),
+    )
+    return query.bind(operation_ids=operation_ids)
+
+
+def lock_wallets_query(wallet_ids: List[int]) -> BoundQuery:
+    query = queries.get(
+        ("lock_wallets",),
+        lambda: sa.select([wallets.c.id])
+        .where(
+            wallets.c.id
+            == sa.any_(sa.bindparam("wallet_ids", type_=postgresql.ARRAY(sa.Integer)))
+        )
+        .order_by(wallets.c.id)
+        .with_for_update(),
+    )
+    return query.bind(wallet_ids=wallet_ids)
+
+
+def change_statuses_query(
+    items: List[Tuple[int, str]], status_datetime: dt.datetime
+) -> BoundQuery:
+    query = queries.get(
+        ("change_statuses",),
+        lambda: build_change_statuses_query(
+            sa.bindparam("operation_ids", type_=postgresql.ARRAY(sa.Integer)),
+            sa.bindparam(
+                "new_statuses", type_=postgresql.ARRAY(operations.c.current_status.type)
+            ),
+            sa.bindparam("status_datetime", type_=operations.c.datetime.type),
+        ),
+    )
+    return query.bind(
+        operation_ids=[operation_id for operation_id, _ in items],
+        new_statuses=[new_status for _, new_status in items],
+        status_datetime=status_datetime,
+    )
+
+
+def build_change_statuses_query(operation_ids, new_statuses, status_datetime):
+    status_type = operations.c.current_status.type
+    operation_ids = sa.cast(operation_ids, postgresql.ARRAY(sa.Integer))
+    items = sa.select(
+        [
+            sa.func.unnest(operation_ids).label("operation_id"),
+            sa.func.unnest(sa.cast(new_statuses, postgresql.ARRAY(status_type))).label(
+                "new_status"
+            ),
+            sa.func.generate_subscripts(operation_ids, 1).label("position"),
+        ]
+    ).alias("items")
+    # Function in FROM sees previous FROM items, it is called for
+    # every item in order as the items are scanned
+    return (
+        sa.select([sa.column("code", sa.Integer)])
+        .select_from(items)
+        .select_from(
+            getattr(sa.func, FUNCTION_NAME)(
+                items.c.operation_id,
+                items.c.new_status,
+                sa.cast(status_datetime, operations.c.datetime.type),
+            )
+        )
+        .order_by(items.c.position)
+    )
+
+
+def change_status_function_sql() -> str:
+    dialect = postgresql.dialect()
+    status_type = operations.c.current_status.type.compile(dialect=dialect)
+    datetime_type = operations.c.datetime.type.compile(dialect=dialect)
+    columns = ", ".join(
+        f"{column.name} {column.type.compile(dialect=dialect)}"
+        for column in operations.c
+    )
+    return (
+        f"CREATE OR REPLACE FUNCTION {FUNCTION_NAME}"
+        f"(target_id integer, new_status {status_type}, "
+        f"status_datetime {datetime_type})\n"
+        f"RETURNS TABLE (code integer, {columns}) AS $${change_status_function_body()}$$ "
+        f"LANGUAGE plpgsql"
+    )
+
+
+def change_status_function_body() -> str:
+    status_type = operations.c.current_status.type.name
+    allowed = "\n".join(
+        f"        WHEN '{status.name}' THEN ARRAY["
+        + ", ".join(f"'{new_status.name}'" for new_status in new_statuses)
+        + f"]::{status_type}[]"
+        for status, new_statuses in ALLOWED_TRANSACTIONS.items()
+    )
+    # convert_amount() SQL function is installed by migrations
+    balance_changes = "\n".join(
+        f"    IF operation.current_status = '{status.name}' "
+        f"AND new_status = '{new_status.name}' THEN\n"
+        f"        change_wallet_id := operation.{wallet}_wallet_id;\n"
+        f"        change_amount := {sign} * "
+        f"convert_amount(operation.amount, operation.{wallet}_wallet_rate);\n"
+        f"    END IF;"
+        for (status, new_status), (wallet, sign) in BALANCE_CHANGES.items()
+    )
+    result = "\n".join(
+        f"    {column.name} := operation.{column.name};" for column in operations.c
+    )
+    return f"""
+#variable_conflict use_column
+DECLARE
+    operation operations%ROWTYPE;
+    change_wallet_id integer;
+    change_amount numeric;
+    target_datetime timestamp;
+BEGIN
+    -- Partition key by id from not partitioned table, so only
+    -- one partition of operations is locked and searched
+    SELECT operation_datetimes.datetime INTO target_datetime FROM operation_datetimes
+    WHERE operation_datetimes.id = target_id;
+    SELECT * INTO operation FROM operations
+    WHERE operations.id = target_id AND operations.datetime = target_datetime
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        code := 404;
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    IF NOT new_status = ANY(CASE operation.current_status
+{allowed}
+    END) THEN
+        code := 400;
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+{balance_changes}
+    IF change_amount IS NOT NULL THEN
+        UPDATE wallets SET amount = wallets.amount + change_amount
+        WHERE wallets.id = change_wallet_id AND wallets.amount + change_amount >= 0;
+        IF NOT FOUND THEN
+            code := 202;
+            RETURN NEXT;
+            RETURN;
+        END IF;
+    END IF;
+
+    UPDATE operations
+    SET current_status = new_status, status_version = operations.status_version + 1
+    WHERE operations.id = target_id AND operations.datetime = operation.datetime
+    RETURNING * INTO operation;
+    INSERT INTO operations_statuses (operation_id, status, datetime)
+    VALUES (target_id, new_status, status_datetime);
+
+    code := 200;
+{result}
+    RETURN NEXT;
+END;
+"""
@@ -0,0 +1,46 @@
+"""
+Single statement user registration: user and its wallet are inserted
+by one data-modifying CTE, concurrent signups with the same login
+are resolved by login unique index.
+"""
+from typing import Optional
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert
+
+from app.constants import WalletCurrencies
+from app.db.postgres.models import users, wallets
+
+
+async def insert_user(
+    con, user: dict, wallet_currency: WalletCurrencies
+) -> Optional[int]:
+    """ Insert user with empty wallet, returns None if login is already taken """
+    return await con.fetch_val(insert_user_query(user, wallet_currency))
+
+
+def insert_user_query(user: dict, wallet_currency: WalletCurrencies):
+    new_user = (
+        insert(users)
+        .values(user)
+        .on_conflict_do_nothing(index_elements=[users.c.login])
+        .returning(users.c.id)
+        .cte("new_user")
+    )
+    # Nothing is inserted here when login is taken
+    wallet = (
+        wallets.insert()
+        .from_select(
+            ["user_id", "amount", "currency"],
+            sa.select(
+                [
+                    new_user.c.id,
+                    sa.cast(0, wallets.c.amount.type),
+                    sa.cast(wallet_currency, wallets.c.currency.type),
+                ]
+            ),
+        )
+        .returning(wallets.c.user_id)
+        .cte("wallet")
+    )
+    return sa.select([wallet.c.user_id])
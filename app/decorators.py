@@ -1,7 +1,6 @@
 from functools import wraps
 
 from aiohttp import web
-from aioredis.commands import Redis
 
 
 def authorized_user(*args, **kwargs):
@@ -20,7 +19,6 @@ def authorized_user(*args, **kwargs):
     def authorized(func):
         @wraps(func)
         async def wrapper(request: web.Request):
-            redis: Redis = request.app["redis"]
             unauthorized = False
 
             # Checking auth header
@@ -30,10 +28,11 @@ def authorized_user(*args, **kwargs):
                 unauthorized = True
             else:
                 # Founding user session
-                user_id = await redis.get(key=auth_header)
-                if not user_id:
+                user_id = await request.app["sessions"].get_user_id(auth_header)
+                if user_id is None:
                     unauthorized = True
-                request["user_id"] = int(user_id)
+                else:
+                    request["user_id"] = user_id
 
             if unauthorized and not allow_unauthorized:
                 return web.json_response({}, status=401)
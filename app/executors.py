@@ -0,0 +1,80 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+EXECUTORS = {"process": ProcessPoolExecutor, "thread": ThreadPoolExecutor}
+
+
+class ExecutorOverloaded(Exception):
+    """ Too many tasks are already waiting for executor """
+
+
+class BoundedExecutor:
+    """
+    Runs blocking functions in thread or process pool.
+    Number of pending tasks is limited by max_queue - after that
+    ExecutorOverloaded is raised instead of queueing forever.
+    Collects queue wait and run time metrics.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        workers: int,
+        max_queue: int,
+        initializer=None,
+        initargs: tuple = (),
+    ):
+        self.executor: Executor = EXECUTORS[kind](
+            max_workers=workers, initializer=initializer, initargs=initargs
+        )
+        self.max_queue = max_queue
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait = 0.0
+        self.run_time = 0.0
+
+    @property
+    def saturated(self) -> bool:
+        return self.pending >= self.max_queue
+
+    async def run(self, func, *args):
+        if self.saturated:
+            self.rejected += 1
+            raise ExecutorOverloaded()
+
+        self.pending += 1
+        try:
+            queued_at = time.time()
+            loop = asyncio.get_event_loop()
+            started_at, result, finished_at = await loop.run_in_executor(
+                self.executor, timed_call, func, *args
+            )
+        finally:
+            self.pending -= 1
+
+        self.completed += 1
+        self.queue_wait += started_at - queued_at
+        self.run_time += finished_at - started_at
+        return result
+
+    def stats(self) -> dict:
+        completed = self.completed or 1
+        return {
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_queue_wait": self.queue_wait / completed,
+            "avg_run_time": self.run_time / completed,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+def timed_call(func, *args):
+    """ Call func in executor and return its result with start and finish time """
+    started_at = time.time()
+    result = func(*args)
+    return started_at, result, time.time()
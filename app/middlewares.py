@@ -0,0 +1,19 @@
+from aiohttp import web
+
+from app.executors import ExecutorOverloaded
+
+# Seconds for client to wait before retrying overloaded request
+RETRY_AFTER = 1
+
+
+@web.middleware
+async def overload_middleware(request: web.Request, handler):
+    """ Fast 503 response instead of waiting for overloaded executors """
+    try:
+        return await handler(request)
+    except ExecutorOverloaded:
+        return web.json_response(
+            {"error": "Service is overloaded"},
+            status=503,
+            headers={"Retry-After": str(RETRY_AFTER)},
+        )
@@ -0,0 +1,77 @@
+import asyncio
+import datetime as dt
+import logging
+
+from aiohttp import web
+from databases import Database
+
+from app.utils import month_start, next_month
+
+# Tables partitioned by month of "datetime"
+PARTITIONED_TABLES = ["operations", "operations_statuses", "user_operations"]
+# Only one worker creates partitions at a time
+PARTITIONS_LOCK_ID = 1_907_312_201
+
+logger = logging.getLogger(__name__)
+
+
+class PartitionsManager:
+    """
+    Creates monthly partitions of history tables MONTHS_AHEAD months
+    beforehand on startup and then every CHECK_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self.db: Database = None
+        self.months_ahead = None
+        self.check_interval = None
+        self.checker = None
+
+    async def on_startup(self, app: web.Application):
+        config = app["config"]["PARTITIONS"]
+        self.db = app["db"]
+        self.months_ahead = config["MONTHS_AHEAD"]
+        self.check_interval = config["CHECK_INTERVAL"]
+        await self.create_partitions()
+        self.checker = asyncio.ensure_future(self.check_forever())
+
+    async def on_cleanup(self, app: web.Application):
+        self.checker.cancel()
+
+    @classmethod
+    def register_app(cls, app: web.Application):
+        instance = cls()
+        app.on_startup.append(instance.on_startup)
+        app.on_cleanup.append(instance.on_cleanup)
+
+    async def create_partitions(self):
+        month = month_start(dt.datetime.utcnow())
+        async with self.db.connection() as con:
+            async with con.transaction():
+                await con.execute(f"SELECT pg_advisory_xact_lock({PARTITIONS_LOCK_ID})")
+                for _ in range(self.months_ahead + 1):
+                    for table in PARTITIONED_TABLES:
+                        await con.execute(create_partition_sql(table, month))
+                    month = next_month(month)
+
+    async def check_forever(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.create_partitions()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Partitions creating failed")
+
+
+def partition_name(table: str, month: dt.datetime) -> str:
+    return f"{table}_{month:%Y_%m}"
+
+
+def create_partition_sql(table: str, month: dt.datetime) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} "
+        f"PARTITION OF {table} FOR VALUES "
+        f"FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+    )
@@ -0,0 +1,47 @@
+from aiohttp import web
+from passlib.context import CryptContext
+
+from app.executors import BoundedExecutor
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords in thread pool with limited concurrency,
+    so login bursts do not block event loop (hashlib releases GIL).
+    Passwords hashed with outdated parameters are rehashed on verification.
+    """
+
+    def __init__(self):
+        self.executor = None
+        self.context = None
+
+    async def on_startup(self, app: web.Application):
+        config = app["config"]["PASSWORDS"]
+        self.context = CryptContext(
+            schemes=["pbkdf2_sha256"], pbkdf2_sha256__rounds=config["ROUNDS"]
+        )
+        self.executor = BoundedExecutor(
+            "thread", workers=config["WORKERS"], max_queue=config["MAX_QUEUE"]
+        )
+        app["password_hasher"] = self
+
+    async def on_cleanup(self, app: web.Application):
+        self.executor.shutdown()
+
+    @classmethod
+    def register_app(cls, app: web.Application):
+        instance = cls()
+        app.on_startup.append(instance.on_startup)
+        app.on_cleanup.append(instance.on_cleanup)
+
+    async def hash(self, password: str) -> str:
+        return await self.executor.run(self.context.hash, password)
+
+    async def verify(self, password: str, password_hash: str) -> (bool, str):
+        """
+        Returns (verified, new_hash) pair.
+        new_hash is not None if password should be rehashed with current parameters.
+        """
+        return await self.executor.run(
+            self.context.verify_and_update, password, password_hash
+        )
@@ -1,4 +1,8 @@
+import asyncio
 import decimal
+import logging
+import uuid
+from types import MappingProxyType
 
 import simplejson
 from aiohttp import ClientResponse, ClientSession, web
@@ -7,12 +11,31 @@ from aioredis.commands import Redis
 from app.constants import WalletCurrencies
 
 RATES_KEY = "rates"
+# Only lock owner fetches rates from rates service
+RATES_LOCK_KEY = "rates:lock"
+RATES_LOCK_TIMEOUT = 10
+RATES_LOCK_RETRY_INTERVAL = 0.1
+# Lock is deleted only by its owner, it may have expired and been taken by other worker
+RELEASE_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+# Retry interval after background refreshing failure
+REFRESH_RETRY_INTERVAL = 1
+
+logger = logging.getLogger(__name__)
 
 
 class RatesClient:
     """
     Makes requests to rates service every update_interval seconds.
-    Uses redis for caching.
+    Uses redis for caching and sharing rates between workers.
+    Only one request to rates service runs in cluster at a time.
+
+    With background refreshing rates snapshot is kept in memory
+    and get_rates makes no I/O at all.
     """
 
     def __init__(self):
@@ -31,15 +54,22 @@ class RatesClient:
         }
         self.update_interval = None
         self.app = None
+        self.rates = None
+        self.loading = None
+        self.refresher = None
 
     async def on_startup(self, app: web.Application):
         self.app = app
         self.url = app["config"]["RATES"]["URL"]
         self.update_interval = app["config"]["RATES"]["UPDATE_INTERVAL"]
         self.session = ClientSession()
+        if app["config"]["RATES"]["BACKGROUND_REFRESH"]:
+            self.refresher = asyncio.ensure_future(self.refresh_forever())
         app["rates_client"] = self
 
     async def on_cleanup(self, app: web.Application):
+        if self.refresher:
+            self.refresher.cancel()
         await self.session.close()
 
     @classmethod
@@ -49,22 +79,78 @@ class RatesClient:
         app.on_cleanup.append(instance.on_cleanup)
 
     async def get_rates(self):
+        if self.refresher and self.rates is not None:
+            return self.rates
+        return await self.load_rates()
+
+    async def load_rates(self):
+        """ Concurrent calls share one loading """
+        if not self.loading:
+            self.loading = asyncio.ensure_future(self._load_rates())
+            self.loading.add_done_callback(self._loading_done)
+        return await asyncio.shield(self.loading)
+
+    def _loading_done(self, future: asyncio.Future):
+        self.loading = None
+
+    async def _load_rates(self):
+        redis: Redis = self.app["redis"]
+
+        token = uuid.uuid4().hex
+        while True:
+            rates = await redis.get(RATES_KEY)
+            if rates:
+                rates = simplejson.loads(rates)
+                break
+
+            if await redis.set(
+                RATES_LOCK_KEY,
+                token,
+                expire=RATES_LOCK_TIMEOUT,
+                exist=redis.SET_IF_NOT_EXIST,
+            ):
+                try:
+                    response: ClientResponse = await self.session.get(
+                        self.url, params=self.params
+                    )
+                    data = await response.json()
+                    rates = data["rates"]
+
+                    await redis.setex(
+                        key=RATES_KEY,
+                        value=simplejson.dumps(rates),
+                        seconds=self.update_interval,
+                    )
+                finally:
+                    await release_lock(redis, token)
+                break
+
+            # Another worker is fetching rates
+            await asyncio.sleep(RATES_LOCK_RETRY_INTERVAL)
+
+        self.rates = MappingProxyType(
+            {WalletCurrencies(k): decimal.Decimal(str(v)) for k, v in rates.items()}
+        )
+        return self.rates
+
+    async def refresh_forever(self):
         redis: Redis = self.app["redis"]
 
-        rates = await redis.get(RATES_KEY)
-        if rates:
-            rates = simplejson.loads(rates)
-        else:
-            response: ClientResponse = await self.session.get(
-                self.url, params=self.params
-            )
-            data = await response.json()
-            rates = data["rates"]
-
-            await redis.setex(
-                key=RATES_KEY,
-                value=simplejson.dumps(rates),
-                seconds=self.update_interval,
-            )
-
-        return {WalletCurrencies(k): decimal.Decimal(str(v)) for k, v in rates.items()}
+        while True:
+            try:
+                await self.load_rates()
+                # Next refresh is right after shared rates expiration
+                delay = max(await redis.ttl(RATES_KEY), REFRESH_RETRY_INTERVAL)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Rates refreshing failed")
+                delay = REFRESH_RETRY_INTERVAL
+            await asyncio.sleep(delay)
+
+
+async def release_lock(redis: Redis, token: str) -> bool:
+    """ Deletes rates lock if it is still held with token """
+    return bool(
+        await redis.eval(RELEASE_LOCK_SCRIPT, keys=[RATES_LOCK_KEY], args=[token])
+    )
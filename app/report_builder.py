@@ -1,40 +1,253 @@
+import asyncio
+import base64
+import binascii
 import csv
+import datetime as dt
+import io
+import os
+import tempfile
+import time
+import zlib
 from abc import ABC, abstractmethod
-from xml.etree.ElementTree import Element, tostring
+from functools import lru_cache, partial
 
+import simplejson
 import sqlalchemy as sa
 from aiohttp import web
-from databases import Database
+from aioredis.commands import Redis
 
-from app.constants import OperationStatuses, ReportFormats, ReportTypes
-from app.db.postgres.models import operations, operations_statuses, users, wallets
-from app.utils import json_response
+from app.constants import (
+    FINAL_STATUSES,
+    REPORT_PAGE_SIZE,
+    OperationStatuses,
+    ReportFormats,
+    ReportTypes,
+)
+from app.db.postgres.compiler import (
+    BoundQuery,
+    compile_query,
+    fetch_all,
+    fetch_val,
+    queries,
+)
+from app.db.postgres.direct import DirectConnections
+from app.db.postgres.models import (
+    operations,
+    operations_statuses,
+    user_operations,
+    users,
+    wallets,
+)
+from app.utils import json_response, month_start, next_month, to_datetime
+
+try:
+    import zstandard
+except ImportError:  # zstd compression is optional
+    zstandard = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Arrow and Parquet reports are optional
+    pyarrow = None
 
 __all__ = ["make_report_builder"]
 
 
-def make_report_builder(request, report_format, report_type):
+def make_report_builder(
+    app, report_format, report_type, *, user_id=None, query_params=None
+):
     """
     Returns needed ReportBuilder subclass based on report_format and report_type.
     """
     builder = {
-        ReportFormats.CSV: CSVReportBuilder,
+        ReportFormats.CSV: CSV_ENGINES[app["config"]["REPORTS"]["CSV_ENGINE"]],
         ReportFormats.XML: XMLReportBuilder,
+        ReportFormats.NDJSON: NDJSONReportBuilder,
+        ReportFormats.JSON: JSONPageReportBuilder,
+        ReportFormats.ARROW: ArrowReportBuilder,
+        ReportFormats.PARQUET: ParquetReportBuilder,
     }[report_format]
-    return builder(request, report_type)
+    return builder(app, report_type, user_id=user_id, query_params=query_params)
+
+
+class BufferedWriter:
+    """
+    Collects serialized chunks and writes them with one call
+    when buffer is bigger than flush_size or flush_interval seconds passed.
+    """
+
+    def __init__(self, write, flush_size: int, flush_interval: float):
+        self._write = write
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.buffer = bytearray()
+        self.flushed_at = time.monotonic()
+
+    async def write(self, data: bytes):
+        self.buffer += data
+        if (
+            len(self.buffer) >= self.flush_size
+            or time.monotonic() - self.flushed_at >= self.flush_interval
+        ):
+            await self.flush()
+
+    async def flush(self):
+        if self.buffer:
+            await self._write(bytes(self.buffer))
+            self.buffer.clear()
+        self.flushed_at = time.monotonic()
+
+
+class GzipCompressor:
+    encoding = "gzip"
+
+    def __init__(self, level: int):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        # Flushing makes every chunk decodable by client as soon as it is received
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self.compressor.flush()
+
+
+class ZstdCompressor:
+    encoding = "zstd"
+
+    def __init__(self, level: int):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+    def finish(self) -> bytes:
+        return self.compressor.flush()
+
+
+COMPRESSORS = {"gzip": GzipCompressor}
+if zstandard:
+    COMPRESSORS["zstd"] = ZstdCompressor
+
+
+def negotiate_encoding(accept_encoding: str, algorithms: list):
+    """
+    Returns the first of server preferred algorithms
+    accepted by client in "Accept-Encoding" header or None.
+    """
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+
+    for algorithm in algorithms:
+        if algorithm in COMPRESSORS and accepted.get(algorithm, accepted.get("*", 0)):
+            return algorithm
+    return None
+
+
+class CompressedWriter:
+    """
+    Compresses every written chunk incrementally.
+    Chunks bigger than executor_size bytes are compressed in executor,
+    so event loop is not blocked.
+    """
+
+    def __init__(self, write, compressor, executor_size: int):
+        self._write = write
+        self.compressor = compressor
+        self.executor_size = executor_size
+
+    async def write(self, data: bytes):
+        if len(data) >= self.executor_size:
+            data = await asyncio.get_event_loop().run_in_executor(
+                None, self.compressor.compress, data
+            )
+        else:
+            data = self.compressor.compress(data)
+        if data:
+            await self._write(data)
+
+    async def close(self):
+        await self._write(self.compressor.finish())
 
 
-class BytesStream:
-    def write(self, string: str) -> bytes:
-        return string.encode()
+class SegmentRecorder:
+    """
+    Passes report segment to writer and keeps its copy for caching.
+    Segments bigger than max_size bytes are not kept.
+    """
+
+    def __init__(self, writer: BufferedWriter, max_size: int):
+        self.writer = writer
+        self.max_size = max_size
+        self.data = bytearray()
+
+    async def write(self, data: bytes):
+        if self.data is not None:
+            self.data += data
+            if len(self.data) > self.max_size:
+                self.data = None
+        await self.writer.write(data)
+
+
+class ReportSpool:
+    """
+    Keeps report in memory until it gets bigger than memory_size bytes,
+    then moves it to temporary file.
+    """
+
+    def __init__(self, memory_size: int, suffix: str, directory: str = None):
+        self.memory_size = memory_size
+        self.suffix = suffix
+        self.directory = directory
+        self.buffer = bytearray()
+        self.file = None
+
+    async def write(self, data: bytes):
+        if not self.file:
+            self.buffer += data
+            if len(self.buffer) <= self.memory_size:
+                return
+            self.file = tempfile.NamedTemporaryFile(
+                suffix=self.suffix, dir=self.directory, delete=False
+            )
+            data = bytes(self.buffer)
+            self.buffer.clear()
+        await asyncio.get_event_loop().run_in_executor(None, self.file.write, data)
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+    def remove(self):
+        if self.file:
+            self.file.close()
+            os.unlink(self.file.name)
 
 
 class ReportBuilder(ABC):
-    def __init__(self, request, report_type):
-        self.request = request
-        self.db: Database = request.app["db"]
-        self.user_id = request.get("user_id")
-        self.query_params = request["data"]
+    # Serialized rows of report parts could be concatenated
+    cacheable_segments = True
+    # Format is worth compressing on the wire
+    compressible = True
+
+    def __init__(self, app, report_type, *, user_id=None, query_params=None):
+        self.pg: DirectConnections = app["pg"]
+        self.redis: Redis = app["redis"]
+        self.config = app["config"]["REPORTS"]
+        self.user_id = user_id
+        self.query_params = query_params or {}
         self.report_type = report_type
 
     @property
@@ -43,45 +256,252 @@ class ReportBuilder(ABC):
         """ "Content-Type" header value """
         ...
 
+    @property
     @abstractmethod
-    async def stream_report(self, response: web.StreamResponse, query):
-        """ Actual streaming """
+    def file_extension(self) -> str:
         ...
 
-    async def build_report_response(self) -> web.StreamResponse:
-        """ Stream report file to client without saving whole file in memory """
+    def header(self) -> bytes:
+        """ Report beginning """
+        return b""
 
-        if not self.user_id:  # If it is not authorized request
-            try:
-                login = self.query_params["user_login"]
-            except KeyError:
-                return json_response({"user_login": "Required field"}, status=422)
-            user_id = await self.db.fetch_val(
-                sa.select([users.c.id]).where(users.c.login == login)
-            )
-            if not user_id:
-                return json_response({}, status=404, error="User not found")
-            self.user_id = user_id
+    def footer(self) -> bytes:
+        """ Report ending """
+        return b""
+
+    @abstractmethod
+    def serialize_rows(self, records) -> bytes:
+        """ Serialize batch of records into one chunk """
+        ...
+
+    async def resolve_user(self):
+        """ Finds report user by login, returns error response if it is not possible """
+        if self.user_id:
+            return None
+        try:
+            login = self.query_params["user_login"]
+        except KeyError:
+            return json_response({"user_login": "Required field"}, status=422)
+        self.user_id = await fetch_val(self.pg, user_id_query(login))
+        if not self.user_id:
+            return json_response({}, status=404, error="User not found")
+        return None
 
-        # Building query based on report type
-        query = build_report_query(
+    def build_query(self):
+        """ Building query based on report type """
+        return report_query(
             self.user_id,
             self.report_type,
             date_from=self.query_params.get("date_from"),
             date_to=self.query_params.get("date_to"),
         )
 
+    async def build_report_response(self, request) -> web.StreamResponse:
+        """ Stream report file to client without saving whole file in memory """
+
+        error_response = await self.resolve_user()
+        if error_response is not None:
+            return error_response
+
+        query = self.build_query()
+        compressor = self.make_compressor(request)
+        headers = {"Content-Type": self.content_type}
+        if self.config["COMPRESSION"]["ALGORITHMS"]:
+            headers["Vary"] = "Accept-Encoding"
+        if compressor:
+            headers["Content-Encoding"] = compressor.encoding
+
+        if self.config["SPOOL"]["ENABLED"]:
+            return await self.spooled_response(request, query, headers, compressor)
+
         # Preparing streaming response
-        response = web.StreamResponse(
-            status=200, headers={"Content-Type": self.content_type}
-        )
-        await response.prepare(self.request)
+        response = web.StreamResponse(status=200, headers=headers)
+        await response.prepare(request)
 
-        await self.stream_report(response, query)
+        await self.stream_report(response.write, query, compressor)
 
         await response.write_eof()
         return response
 
+    def make_compressor(self, request):
+        """ Compressor for the best encoding accepted by client or None """
+        config = self.config["COMPRESSION"]
+        if not self.compressible:
+            return None
+        encoding = negotiate_encoding(
+            request.headers.get("Accept-Encoding", ""), config["ALGORITHMS"]
+        )
+        if not encoding:
+            return None
+        return COMPRESSORS[encoding](config["LEVELS"][encoding])
+
+    async def spooled_response(
+        self, request, query, headers: dict, compressor=None
+    ) -> web.StreamResponse:
+        """
+        Report is drained from database at full speed to release connection
+        before slow client downloads it. Big reports are spooled to
+        temporary file and sent with zero-copy sendfile. The file is sent
+        here, so it is removed whether the sending succeeds or not.
+        """
+        spool = ReportSpool(
+            self.config["SPOOL"]["MEMORY_SIZE"],
+            suffix=self.file_extension,
+            directory=self.config["SPOOL"]["DIR"],
+        )
+        try:
+            await self.stream_report(spool.write, query, compressor)
+        except BaseException:
+            spool.remove()
+            raise
+        spool.close()
+
+        if not spool.file:
+            return web.Response(body=bytes(spool.buffer), headers=headers)
+        response = web.FileResponse(spool.file.name, headers=headers)
+        try:
+            await response.prepare(request)
+        finally:
+            spool.remove()
+        return response
+
+    async def write_report_file(self, path: str):
+        """ Write whole report to file """
+        loop = asyncio.get_event_loop()
+        with open(path, "wb") as file:
+            await self.stream_report(
+                partial(loop.run_in_executor, None, file.write), self.build_query()
+            )
+
+    async def stream_report(self, write, query, compressor=None):
+        """ Actual streaming with batched writes, compressed if compressor is given """
+        if compressor:
+            compressed_writer = CompressedWriter(
+                write, compressor, self.config["COMPRESSION"]["EXECUTOR_SIZE"]
+            )
+            write = compressed_writer.write
+        writer = BufferedWriter(
+            write, self.config["FLUSH_SIZE"], self.config["FLUSH_INTERVAL"]
+        )
+        await writer.write(self.header())
+        if self.cacheable_segments and self.config["SEGMENT_CACHE"]["ENABLED"]:
+            await self.write_segments(writer)
+        else:
+            await self.write_rows(writer, query)
+        await writer.write(self.footer())
+        await writer.flush()
+        if compressor:
+            await compressed_writer.close()
+
+    async def write_segments(self, writer: BufferedWriter):
+        """
+        Report is written by segments. Closed segments are taken
+        from cache or cached after they have been built.
+        """
+        config = self.config["SEGMENT_CACHE"]
+        loop = asyncio.get_event_loop()
+
+        segments = await self.report_segments()
+        keys = [key for _, _, key in segments if key]
+        cached = {}
+        if keys:
+            # Compressed segments are binary, while shared pool decodes replies
+            cached = dict(zip(keys, await self.redis.mget(*keys, encoding=None)))
+
+        for date_from, date_to, key in segments:
+            query = report_query(
+                self.user_id, self.report_type, date_from=date_from, date_to=date_to
+            )
+            if not key:
+                await self.write_rows(writer, query)
+                continue
+
+            segment = cached[key]
+            if segment is not None:
+                await writer.write(
+                    await loop.run_in_executor(None, zlib.decompress, segment)
+                )
+                continue
+
+            recorder = SegmentRecorder(writer, config["MAX_SIZE"])
+            await self.write_rows(recorder, query)
+            if recorder.data is not None:
+                segment = await loop.run_in_executor(
+                    None, zlib.compress, bytes(recorder.data)
+                )
+                await self.redis.setex(key, config["TTL"], segment)
+
+    async def report_segments(self) -> list:
+        """
+        Splits report period into monthly (date_from, date_to, cache_key) segments
+        in report order. Past months without unfinished operations never change,
+        so they get cache key with max operation id watermark. Other months
+        and the current month tail are built live and have no key,
+        adjacent live months are joined into one segment.
+        """
+        date_from = to_datetime(self.query_params.get("date_from"))
+        date_to = to_datetime(self.query_params.get("date_to"))
+        tail_from = month_start(dt.datetime.utcnow())
+        closed_to = min(date_to, tail_from) if date_to else tail_from
+
+        segments = []
+        if not date_from or date_from < closed_to:
+            months = await fetch_all(
+                self.pg, segments_query(self.user_id, date_from, closed_to)
+            )
+            for month in months:
+                segment_from = max(month["month"], date_from or month["month"])
+                segment_to = min(next_month(month["month"]), closed_to)
+                key = None
+                if not month["unfinished"]:
+                    key = SEGMENT_KEY.format(
+                        builder=type(self).__name__,
+                        user_id=self.user_id,
+                        report_type=ReportTypes(self.report_type).value,
+                        date_from=segment_from.isoformat(),
+                        date_to=segment_to.isoformat(),
+                        watermark=f"{month['max_id']}:{month['operations']}",
+                    )
+                add_segment(segments, segment_from, segment_to, key)
+
+        if not date_to or date_to > tail_from:
+            add_segment(segments, max(tail_from, date_from or tail_from), date_to, None)
+
+        if self.report_type == ReportTypes.STATUSES:
+            # Statuses report goes from newest operations
+            segments.reverse()
+        return segments
+
+    async def write_rows(self, writer: BufferedWriter, query):
+        async for records in self.fetch_batches(query):
+            await writer.write(self.serialize_rows(records))
+
+    async def fetch_batches(self, query):
+        """ Fetch query results in FETCH_SIZE batches using server side cursor """
+        sql, args = compile_query(query)
+        async with self.pg.connection() as con:
+            async with con.transaction():
+                cursor = await con.cursor(sql, *args)
+                while True:
+                    records = await cursor.fetch(self.config["FETCH_SIZE"])
+                    if not records:
+                        break
+                    yield records
+
+
+def add_segment(segments: list, date_from, date_to, key):
+    """ Live segments following each other are built by one ranged query """
+    if key is None and segments and segments[-1][2] is None:
+        date_from = segments.pop()[0]
+    segments.append((date_from, date_to, key))
+
+
+# Serialized rows of closed report segment
+SEGMENT_KEY = (
+    "report_segments:{builder}:{user_id}:{report_type}:"
+    "{date_from}:{date_to}:{watermark}"
+)
+
 
 class XMLReportBuilder(ReportBuilder):
     REPORT_TAG_MAP = {
@@ -93,26 +513,65 @@ class XMLReportBuilder(ReportBuilder):
     def content_type(self) -> str:
         return "text/xml"
 
-    async def stream_report(self, response: web.StreamResponse, query):
+    @property
+    def file_extension(self) -> str:
+        return ".xml"
+
+    def header(self) -> bytes:
+        main_tag, _ = self.REPORT_TAG_MAP[self.report_type]
+        return b'<?xml version="1.0" encoding="UTF-8"?>\n<%s>\n' % main_tag
+
+    def footer(self) -> bytes:
+        main_tag, _ = self.REPORT_TAG_MAP[self.report_type]
+        return b"</%s>\n" % main_tag
 
-        main_tag, one_tag = self.REPORT_TAG_MAP[self.report_type]
+    def serialize_rows(self, records) -> bytes:
+        if not records:
+            return b""
+        _, one_tag = self.REPORT_TAG_MAP[self.report_type]
+        serialize = xml_row_serializer(one_tag, tuple(records[0].keys()))
+        # Non ASCII symbols are written as character references like ElementTree does
+        return "".join(map(serialize, records)).encode("ascii", "xmlcharrefreplace")
 
-        await response.write(
-            b'<?xml version="1.0" encoding="windows-1251"?>\n<%s>\n' % main_tag
+
+def escape_xml(text: str) -> str:
+    """ The same escaping as ElementTree does for element text """
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+
+@lru_cache(maxsize=None)
+def xml_row_serializer(tag: str, keys: tuple):
+    """
+    Returns function serializing record into XML row
+    from template precompiled for given tag and columns.
+    Output is the same as ElementTree.tostring gives for
+    element with one child per column.
+    """
+    template = (
+        f"<{tag}>" + "".join(f"<{key}>{{}}</{key}>" for key in keys) + f"</{tag}>\n"
+    )
+
+    def serialize(record) -> str:
+        texts = [escape_xml(str(value)) for value in record.values()]
+        if all(texts):
+            return template.format(*texts)
+        # ElementTree writes empty elements in short form
+        return (
+            f"<{tag}>"
+            + "".join(
+                f"<{key}>{text}</{key}>" if text else f"<{key} />"
+                for key, text in zip(keys, texts)
+            )
+            + f"</{tag}>\n"
         )
-        async with self.db.transaction():
-            async for record in self.db.iterate(query):
-                await response.write(self.dict_to_xml(one_tag, record) + b"\n")
-        await response.write(b"</%s>\n" % main_tag)
 
-    @staticmethod
-    def dict_to_xml(tag, d):
-        elem = Element(tag)
-        for key, val in d.items():
-            child = Element(key)
-            child.text = str(val)
-            elem.append(child)
-        return tostring(elem)
+    return serialize
 
 
 class CSVReportBuilder(ReportBuilder):
@@ -126,19 +585,383 @@ class CSVReportBuilder(ReportBuilder):
             "receiver_login",
             "type",
         ],
-        ReportTypes.STATUSES: ["id", "status"],
+        ReportTypes.STATUSES: ["operation_id", "value", "datetime"],
     }
 
     @property
     def content_type(self) -> str:
         return "text/csv"
 
-    async def stream_report(self, response: web.StreamResponse, query):
-        writer = csv.writer(BytesStream())
-        await response.write(writer.writerow(self.ROW_NAMES_MAP[self.report_type]))
-        async with self.db.transaction():
-            async for record in self.db.iterate(query):
-                await response.write(writer.writerow(record.values()))
+    @property
+    def file_extension(self) -> str:
+        return ".csv"
+
+    def header(self) -> bytes:
+        return csv_rows([self.ROW_NAMES_MAP[self.report_type]])
+
+    def serialize_rows(self, records) -> bytes:
+        return csv_rows(record.values() for record in records)
+
+
+class CSVCopyReportBuilder(CSVReportBuilder):
+    """
+    Rows are produced by PostgreSQL itself with COPY ... TO STDOUT
+    and sent to client as is, without per row python work.
+    """
+
+    async def write_rows(self, writer: BufferedWriter, query):
+        sql, args = compile_query(query)
+        async with self.pg.connection() as con:
+            async with con.transaction():
+                await con.copy_from_query(sql, *args, output=writer.write, format="csv")
+
+
+CSV_ENGINES = {"cursor": CSVReportBuilder, "copy": CSVCopyReportBuilder}
+
+
+class NDJSONReportBuilder(ReportBuilder):
+    """ One JSON object per line """
+
+    @property
+    def content_type(self) -> str:
+        return "application/x-ndjson"
+
+    @property
+    def file_extension(self) -> str:
+        return ".ndjson"
+
+    def serialize_rows(self, records) -> bytes:
+        return "".join(
+            simplejson.dumps(json_record(record)) + "\n" for record in records
+        ).encode()
+
+
+class JSONPageReportBuilder(NDJSONReportBuilder):
+    """
+    One page of report in JSON with cursor of the next page.
+    Pages go from the newest rows and are selected by (datetime, id) keyset
+    from opaque cursor instead of OFFSET, so deep pages are as fast as the first one.
+    """
+
+    @property
+    def content_type(self) -> str:
+        return "application/json"
+
+    @property
+    def file_extension(self) -> str:
+        return ".json"
+
+    async def build_report_response(self, request) -> web.StreamResponse:
+        error_response = await self.resolve_user()
+        if error_response is not None:
+            return error_response
+
+        try:
+            after = decode_cursor(self.query_params.get("cursor"))
+        except ValueError:
+            return json_response({"cursor": "Not valid cursor"}, status=422)
+
+        limit = self.query_params.get("limit", REPORT_PAGE_SIZE)
+        # One more row shows if there is the next page
+        records = await fetch_all(
+            self.pg,
+            report_page_query(
+                self.user_id,
+                self.report_type,
+                limit + 1,
+                after=after,
+                date_from=self.query_params.get("date_from"),
+                date_to=self.query_params.get("date_to"),
+            ),
+        )
+        next_cursor = None
+        if len(records) > limit:
+            records = records[:limit]
+            next_cursor = encode_cursor(records[-1]["datetime"], records[-1]["id"])
+
+        return json_response(
+            {
+                "items": [json_record(record) for record in records],
+                "next_cursor": next_cursor,
+            }
+        )
+
+
+def json_record(record) -> dict:
+    return {
+        key: value.isoformat() if isinstance(value, dt.datetime) else value
+        for key, value in record.items()
+    }
+
+
+def encode_cursor(datetime: dt.datetime, row_id: int) -> str:
+    keyset = f"{datetime.isoformat()} {row_id}"
+    # without "=" padding cursor goes to query string as is
+    return base64.urlsafe_b64encode(keyset.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """ Returns (datetime, id) keyset from cursor or None, ValueError if broken """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        datetime, row_id = base64.urlsafe_b64decode(padded).decode().split(" ")
+        return dt.datetime.fromisoformat(datetime), int(row_id)
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(cursor) from e
+
+
+class ColumnarReportBuilder(ReportBuilder):
+    """
+    Typed columnar reports made with pyarrow.
+    Every fetched batch of rows is converted to Arrow record batch,
+    bytes written by pyarrow are taken from sink after every batch.
+    """
+
+    def __init__(self, app, report_type, **kwargs):
+        super().__init__(app, report_type, **kwargs)
+        self.sink = ChunksSink()
+        self.writer = None
+
+    async def build_report_response(self, request) -> web.StreamResponse:
+        if not pyarrow:
+            return json_response({}, status=400, error="Report format is not supported")
+        return await super().build_report_response(request)
+
+    @property
+    def schema(self):
+        return columnar_schema(self.report_type)
+
+    def record_batch(self, records):
+        return pyarrow.RecordBatch.from_arrays(
+            [
+                pyarrow.array([record[field.name] for record in records], field.type)
+                for field in self.schema
+            ],
+            schema=self.schema,
+        )
+
+
+class ArrowReportBuilder(ColumnarReportBuilder):
+    """ Arrow IPC streaming format """
+
+    @property
+    def content_type(self) -> str:
+        return "application/vnd.apache.arrow.stream"
+
+    @property
+    def file_extension(self) -> str:
+        return ".arrows"
+
+    def header(self) -> bytes:
+        self.writer = pyarrow.ipc.new_stream(
+            pyarrow.PythonFile(self.sink, mode="w"), self.schema
+        )
+        return self.sink.take()
+
+    def serialize_rows(self, records) -> bytes:
+        if records:
+            self.writer.write_batch(self.record_batch(records))
+        return self.sink.take()
+
+    def footer(self) -> bytes:
+        self.writer.close()
+        return self.sink.take()
+
+
+class ParquetReportBuilder(ColumnarReportBuilder):
+    """
+    Parquet file with row groups of PARQUET ROW_GROUP_SIZE rows,
+    only one row group is kept in memory.
+    """
+
+    # Parquet footer points to absolute offsets of row groups
+    cacheable_segments = False
+    # Parquet data pages are compressed already
+    compressible = False
+
+    def __init__(self, app, report_type, **kwargs):
+        super().__init__(app, report_type, **kwargs)
+        self.batches = []
+        self.rows = 0
+
+    @property
+    def content_type(self) -> str:
+        return "application/vnd.apache.parquet"
+
+    @property
+    def file_extension(self) -> str:
+        return ".parquet"
+
+    def header(self) -> bytes:
+        self.writer = pyarrow.parquet.ParquetWriter(
+            pyarrow.PythonFile(self.sink, mode="w"),
+            self.schema,
+            compression=self.config["PARQUET"]["COMPRESSION"],
+        )
+        return self.sink.take()
+
+    def serialize_rows(self, records) -> bytes:
+        if records:
+            self.batches.append(self.record_batch(records))
+            self.rows += len(records)
+        if self.rows >= self.config["PARQUET"]["ROW_GROUP_SIZE"]:
+            self.write_row_group()
+        return self.sink.take()
+
+    def footer(self) -> bytes:
+        self.write_row_group()
+        self.writer.close()
+        return self.sink.take()
+
+    def write_row_group(self):
+        if self.batches:
+            self.writer.write_table(pyarrow.Table.from_batches(self.batches))
+            self.batches = []
+            self.rows = 0
+
+
+class ChunksSink:
+    """ Write-only file collecting written bytes until they are taken """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+@lru_cache(maxsize=None)
+def columnar_schema(report_type):
+    """ Arrow schema of report columns """
+    amount_type = operations.c.amount.type
+    if report_type == ReportTypes.STATUSES:
+        return pyarrow.schema(
+            [
+                ("operation_id", pyarrow.int64()),
+                ("value", pyarrow.string()),
+                ("datetime", pyarrow.timestamp("us")),
+            ]
+        )
+    return pyarrow.schema(
+        [
+            ("id", pyarrow.int64()),
+            ("amount", pyarrow.decimal128(amount_type.precision, amount_type.scale)),
+            ("datetime", pyarrow.timestamp("us")),
+            ("signature", pyarrow.string()),
+            ("sender_login", pyarrow.string()),
+            ("receiver_login", pyarrow.string()),
+            ("type", pyarrow.string()),
+        ]
+    )
+
+
+def csv_rows(rows) -> bytes:
+    # Same line endings and datetimes as in PostgreSQL COPY output
+    stream = io.StringIO()
+    csv.writer(stream, lineterminator="\n").writerows(
+        [csv_value(value) for value in row] for row in rows
+    )
+    return stream.getvalue().encode()
+
+
+def csv_value(value):
+    if isinstance(value, dt.datetime):
+        # PostgreSQL text output: microseconds without trailing zeros
+        text = value.isoformat(sep=" ")
+        return text.rstrip("0") if value.microsecond else text
+    return value
+
+
+def user_id_query(login: str) -> BoundQuery:
+    query = queries.get(
+        ("user_id",),
+        lambda: sa.select([users.c.id]).where(users.c.login == sa.bindparam("login")),
+    )
+    return query.bind(login=login)
+
+
+def report_query(user_id, report_type, date_from=None, date_to=None) -> BoundQuery:
+    """ build_report_query compiled once for every report type and dates filters """
+    report_type = ReportTypes(report_type)
+    date_from, date_to = to_datetime(date_from), to_datetime(date_to)
+    query = queries.get(
+        ("report", report_type, date_from is not None, date_to is not None),
+        lambda: build_report_query(
+            sa.bindparam("user_id"), report_type, **dates_params(date_from, date_to)
+        ),
+    )
+    return query.bind(user_id=user_id, date_from=date_from, date_to=date_to)
+
+
+def segments_query(user_id, date_from=None, date_to=None) -> BoundQuery:
+    date_from, date_to = to_datetime(date_from), to_datetime(date_to)
+    query = queries.get(
+        ("segments", date_from is not None, date_to is not None),
+        lambda: build_segments_query(
+            sa.bindparam("user_id"), **dates_params(date_from, date_to)
+        ),
+    )
+    return query.bind(user_id=user_id, date_from=date_from, date_to=date_to)
+
+
+def report_page_query(
+    user_id, report_type, limit, after=None, date_from=None, date_to=None
+) -> BoundQuery:
+    report_type = ReportTypes(report_type)
+    date_from, date_to = to_datetime(date_from), to_datetime(date_to)
+    after_datetime, after_id = after or (None, None)
+    query = queries.get(
+        (
+            "report_page",
+            report_type,
+            after is not None,
+            date_from is not None,
+            date_to is not None,
+        ),
+        lambda: build_report_page_query(
+            sa.bindparam("user_id"),
+            report_type,
+            sa.bindparam("limit"),
+            after=after and (sa.bindparam("after_datetime"), sa.bindparam("after_id")),
+            **dates_params(date_from, date_to),
+        ),
+    )
+    return query.bind(
+        user_id=user_id,
+        limit=limit,
+        after_datetime=after_datetime,
+        after_id=after_id,
+        date_from=date_from,
+        date_to=date_to,
+    )
+
+
+def dates_params(date_from, date_to) -> dict:
+    """ Bind parameters for given dates filters """
+    return {
+        "date_from": None if date_from is None else sa.bindparam("date_from"),
+        "date_to": None if date_to is None else sa.bindparam("date_to"),
+    }
 
 
 def build_report_query(user_id, report_type, date_from=None, date_to=None):
@@ -148,10 +971,27 @@ def build_report_query(user_id, report_type, date_from=None, date_to=None):
     else:
         query = build_operations_query(user_id)
     # filters
-    if date_from:
-        query = query.where(operations.c.datetime >= date_from)
-    if date_to:
-        query = query.where(operations.c.datetime < date_to)
+    return filter_dates(query, report_type, date_from, date_to)
+
+
+def filter_dates(query, report_type, date_from=None, date_to=None):
+    """
+    Operations datetime filters. Every joined partitioned table
+    gets its own bounds, so PostgreSQL prunes partitions out of range.
+    """
+    date_from, date_to = to_datetime(date_from), to_datetime(date_to)
+    if report_type == ReportTypes.STATUSES:
+        tables = [user_operations]
+        # Statuses are never older than their operations
+        if date_from is not None:
+            query = query.where(operations_statuses.c.datetime >= date_from)
+    else:
+        tables = [user_operations, operations]
+    for table in tables:
+        if date_from is not None:
+            query = query.where(table.c.datetime >= date_from)
+        if date_to is not None:
+            query = query.where(table.c.datetime < date_to)
     return query
 
 
@@ -172,36 +1012,23 @@ def build_operations_query(user_id):
                 operations.c.signature,
                 senders.c.login.label("sender_login"),
                 receivers.c.login.label("receiver_login"),
-                sa.case(
-                    [
-                        (sender_wallets.c.user_id == user_id, "outcome"),
-                        (receiver_wallets.c.user_id == user_id, "income"),
-                    ]
-                ).label("type"),
+                user_operations.c.direction.label("type"),
             ]
         )
         .select_from(
-            operations.join(
-                sender_wallets, operations.c.sender_wallet_id == sender_wallets.c.id
-            )
+            user_operations.join(operations, operations_join_condition())
+            .join(sender_wallets, operations.c.sender_wallet_id == sender_wallets.c.id)
             .join(senders, sender_wallets.c.user_id == senders.c.id)
             .join(
                 receiver_wallets,
                 operations.c.receiver_wallet_id == receiver_wallets.c.id,
             )
             .join(receivers, receiver_wallets.c.user_id == receivers.c.id)
-            .join(
-                operations_statuses,
-                sa.and_(
-                    operations_statuses.c.operation_id == operations.c.id,
-                    operations_statuses.c.status == OperationStatuses.ACCEPTED,
-                ),
-            )
         )
         .where(
-            sa.or_(
-                sender_wallets.c.user_id == user_id,
-                receiver_wallets.c.user_id == user_id,
+            sa.and_(
+                user_operations.c.user_id == user_id,
+                operations.c.current_status == OperationStatuses.ACCEPTED,
             )
         )
     )
@@ -209,31 +1036,84 @@ def build_operations_query(user_id):
 
 def build_statuses_query(user_id):
 
-    sender_wallets = sa.alias(wallets)
-    receiver_wallets = sa.alias(wallets)
-
     # query
     return (
         sa.select(
             [
-                operations.c.id.label("operation_id"),
+                operations_statuses.c.operation_id,
                 operations_statuses.c.status.label("value"),
                 operations_statuses.c.datetime.label("datetime"),
             ]
         )
         .select_from(
-            operations_statuses.join(operations)
-            .join(sender_wallets, operations.c.sender_wallet_id == sender_wallets.c.id)
-            .join(
-                receiver_wallets,
-                operations.c.receiver_wallet_id == receiver_wallets.c.id,
+            user_operations.join(
+                operations_statuses,
+                operations_statuses.c.operation_id == user_operations.c.operation_id,
             )
         )
-        .where(
-            sa.or_(
-                sender_wallets.c.user_id == user_id,
-                receiver_wallets.c.user_id == user_id,
-            )
+        .where(user_operations.c.user_id == user_id)
+        .order_by(
+            user_operations.c.operation_id.desc(), operations_statuses.c.id.desc()
+        )
+    )
+
+
+def build_segments_query(user_id, date_from=None, date_to=None):
+    """ User operations grouped by month with watermarks and unfinished count """
+
+    month = sa.func.date_trunc(sa.literal_column("'month'"), user_operations.c.datetime)
+
+    # query
+    query = (
+        sa.select(
+            [
+                month.label("month"),
+                sa.func.max(user_operations.c.operation_id).label("max_id"),
+                sa.func.count().label("operations"),
+                sa.func.count()
+                .filter(operations.c.current_status.notin_(FINAL_STATUSES))
+                .label("unfinished"),
+            ]
         )
-        .order_by(operations.c.id.desc(), operations_statuses.c.id.desc())
+        .select_from(user_operations.join(operations, operations_join_condition()))
+        .where(user_operations.c.user_id == user_id)
+        .group_by(month)
+        .order_by(month)
+    )
+    # filters
+    return filter_dates(query, ReportTypes.OPERATIONS, date_from, date_to)
+
+
+def operations_join_condition():
+    # Equal datetime lets PostgreSQL look up operation only in its partition
+    return sa.and_(
+        operations.c.id == user_operations.c.operation_id,
+        operations.c.datetime == user_operations.c.datetime,
     )
+
+
+def build_report_page_query(
+    user_id, report_type, limit, after=None, date_from=None, date_to=None
+):
+    """ Report rows older than "after" (datetime, id) keyset, newest first """
+    if report_type == ReportTypes.STATUSES:
+        keyset = (operations_statuses.c.datetime, operations_statuses.c.id)
+        query = (
+            build_statuses_query(user_id)
+            .column(operations_statuses.c.id)
+            .order_by(None)
+        )
+    else:
+        # User operations are read in order from user_operations primary key
+        keyset = (user_operations.c.datetime, user_operations.c.operation_id)
+        query = build_operations_query(user_id)
+    query = filter_dates(query, report_type, date_from, date_to)
+    return keyset_page(query, keyset, limit, after)
+
+
+def keyset_page(query, keyset, limit, after=None):
+    # filters
+    if after is not None:
+        query = query.where(sa.tuple_(*keyset) < sa.tuple_(*after))
+    # ordering
+    return query.order_by(*[column.desc() for column in keyset]).limit(limit)
@@ -0,0 +1,193 @@
+import asyncio
+import datetime as dt
+import logging
+import os
+import time
+import uuid
+from enum import Enum
+from typing import Optional
+
+import aioredis
+from aiohttp import web
+from aioredis.commands import Redis
+
+from app.constants import ReportFormats, ReportTypes
+from app.report_builder import make_report_builder
+
+# Redis list with ids of jobs waiting for workers
+QUEUE_KEY = "report_jobs:queue"
+JOB_KEY = "report_jobs:{}"
+# Fields every job hash is created with
+JOB_FIELDS = ("id", "status", "report_type", "report_format")
+# Job fields are updated only while the job is not expired,
+# otherwise an incomplete hash without TTL would be recreated
+UPDATE_JOB_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 1 then
+    redis.call("HMSET", KEYS[1], unpack(ARGV))
+    return 1
+end
+return 0
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatuses(str, Enum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+
+class ReportJobs:
+    """
+    Builds reports in background workers using usual report builders.
+    Jobs are queued and described in redis, finished reports are
+    stored in local directory and removed after TTL seconds.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.redis: Redis = None
+        self.directory = None
+        self.ttl = None
+        self.connections = []
+        self.tasks = []
+
+    async def on_startup(self, app: web.Application):
+        config = app["config"]["REPORT_JOBS"]
+        self.app = app
+        self.redis = app["redis"]
+        self.directory = config["DIR"]
+        self.ttl = config["TTL"]
+        os.makedirs(self.directory, exist_ok=True)
+        for _ in range(config["WORKERS"]):
+            # Blocking queue reading needs its own connection
+            connection = await aioredis.create_redis(app["config"]["REDIS"]["DSN"])
+            self.connections.append(connection)
+            self.tasks.append(asyncio.ensure_future(self.work(connection)))
+        self.tasks.append(asyncio.ensure_future(self.clean_forever()))
+        app["report_jobs"] = self
+
+    async def on_cleanup(self, app: web.Application):
+        for task in self.tasks:
+            task.cancel()
+        for connection in self.connections:
+            connection.close()
+            await connection.wait_closed()
+
+    @classmethod
+    def register_app(cls, app: web.Application):
+        instance = cls()
+        app.on_startup.append(instance.on_startup)
+        app.on_cleanup.append(instance.on_cleanup)
+
+    async def create(
+        self, user_id: int, report_type, report_format, date_from=None, date_to=None
+    ) -> dict:
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": JobStatuses.PENDING.value,
+            "user_id": user_id,
+            "report_type": ReportTypes(report_type).value,
+            "report_format": ReportFormats(report_format).value,
+            "date_from": date_from.isoformat() if date_from else "",
+            "date_to": date_to.isoformat() if date_to else "",
+        }
+        key = JOB_KEY.format(job["id"])
+        transaction = self.redis.multi_exec()
+        transaction.hmset_dict(key, job)
+        transaction.expire(key, self.ttl)
+        transaction.lpush(QUEUE_KEY, job["id"])
+        await transaction.execute()
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """ Job or None if it is expired or incomplete """
+        job = await self.redis.hgetall(JOB_KEY.format(job_id))
+        if not all(field in job for field in JOB_FIELDS):
+            return None
+        return job
+
+    def path(self, job: dict) -> str:
+        return os.path.join(self.directory, job["id"])
+
+    async def work(self, connection: Redis):
+        while True:
+            _, job_id = await connection.brpop(QUEUE_KEY)
+            try:
+                await self.build(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Report job %s failed", job_id)
+                await self.update(job_id, status=JobStatuses.FAILED.value)
+
+    async def build(self, job_id: str):
+        job = await self.get(job_id)
+        if not job:  # Job is expired
+            return
+
+        await self.update(job_id, status=JobStatuses.RUNNING.value)
+        builder = make_report_builder(
+            self.app,
+            ReportFormats(job["report_format"]),
+            ReportTypes(job["report_type"]),
+            user_id=int(job["user_id"]),
+            query_params={
+                "date_from": parse_date(job["date_from"]),
+                "date_to": parse_date(job["date_to"]),
+            },
+        )
+        # Report is moved to its place only when it is completed
+        path = self.path(job)
+        try:
+            await builder.write_report_file(f"{path}.part")
+        except BaseException:
+            remove_file(f"{path}.part")
+            raise
+        os.rename(f"{path}.part", path)
+
+        if not await self.update(
+            job_id,
+            status=JobStatuses.DONE.value,
+            content_type=builder.content_type,
+            file_extension=builder.file_extension,
+        ):
+            # Job expired while report was built, nobody can get it
+            remove_file(path)
+
+    async def update(self, job_id: str, **fields) -> bool:
+        """ Updates job fields, returns False if job is expired """
+        args = [value for item in fields.items() for value in item]
+        return bool(
+            await self.redis.eval(
+                UPDATE_JOB_SCRIPT, keys=[JOB_KEY.format(job_id)], args=args
+            )
+        )
+
+    async def clean_forever(self):
+        """ Remove reports older than TTL """
+        while True:
+            expired_at = time.time() - self.ttl
+            for entry in os.scandir(self.directory):
+                # Files may be renamed or removed by other workers meanwhile
+                try:
+                    if entry.stat().st_mtime < expired_at:
+                        os.unlink(entry.path)
+                except FileNotFoundError:
+                    continue
+                except OSError:
+                    logger.exception("Report file %s cleaning failed", entry.path)
+            await asyncio.sleep(self.ttl / 10)
+
+
+def remove_file(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def parse_date(value: str) -> Optional[dt.date]:
+    return dt.date.fromisoformat(value) if value else None
@@ -1,6 +1,6 @@
 from aiohttp import web
 
-from app.views import auth, operations, reports, wallet
+from app.views import auth, metrics, operations, reports, wallet
 
 
 def setup_routes(app: web.Application):
@@ -9,15 +9,22 @@ def setup_routes(app: web.Application):
             # auth
             web.post(r"/api/auth/signup", auth.signup),
             web.post(r"/api/auth/login", auth.login),
+            web.post(r"/api/auth/logout", auth.logout),
             # wallet balance
             web.post(r"/api/wallet/balance", wallet.put_money_on_balance),
             web.get(r"/api/wallet/balance", wallet.get_balance),
             # wallet operations
             web.post(r"/api/wallet/operations", wallet.create_operation),
+            web.post(r"/api/wallet/operations/batch", wallet.create_operations_batch),
             # operations statuses
+            web.post(r"/api/operations", operations.change_statuses_batch),
             web.post(r"/api/operations/{operation_id:\d+}", operations.change_status),
             # reports
             web.get(r"/api/report/operations", reports.get_report_operations),
             web.get(r"/api/report/statuses", reports.get_report_statuses),
+            web.post(r"/api/report/jobs", reports.create_report_job),
+            web.get(r"/api/report/jobs/{job_id:[0-9a-f]{32}}", reports.get_report_job),
+            # metrics
+            web.get(r"/api/metrics", metrics.get_metrics),
         ]
     )
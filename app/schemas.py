@@ -3,7 +3,15 @@ import decimal
 import simplejson
 from marshmallow import Schema, ValidationError, fields, validate, validates_schema
 
-from app.constants import OperationStatuses, ReportFormats, WalletCurrencies
+from app.constants import (
+    MAX_OPERATIONS_BATCH_SIZE,
+    MAX_REPORT_PAGE_SIZE,
+    REPORT_PAGE_SIZE,
+    OperationStatuses,
+    ReportFormats,
+    ReportTypes,
+    WalletCurrencies,
+)
 
 
 class CurrencyField(fields.Decimal):
@@ -60,12 +68,34 @@ class MoneyReceiverLogin(Money):
     )
 
 
+class MoneyReceiverLoginBatch(StrictSchema):
+    operations = fields.Nested(
+        MoneyReceiverLogin,
+        many=True,
+        validate=validate.Length(min=1, max=MAX_OPERATIONS_BATCH_SIZE),
+        required=True,
+    )
+
+
 class OperationStatus(StrictSchema):
     status = fields.String(
         validate=validate.OneOf(OperationStatuses.__members__), required=True
     )
 
 
+class OperationIdStatus(OperationStatus):
+    operation_id = fields.Integer(required=True)
+
+
+class OperationStatusBatch(StrictSchema):
+    operations = fields.Nested(
+        OperationIdStatus,
+        many=True,
+        validate=validate.Length(min=1, max=MAX_OPERATIONS_BATCH_SIZE),
+        required=True,
+    )
+
+
 class Report(StrictSchema):
     report_format = fields.String(
         validate=validate.OneOf(ReportFormats.__members__), required=True
@@ -75,6 +105,12 @@ class Report(StrictSchema):
 
     user_login = fields.String()
 
+    # JSON report paging
+    limit = fields.Integer(
+        validate=validate.Range(1, MAX_REPORT_PAGE_SIZE), missing=REPORT_PAGE_SIZE
+    )
+    cursor = fields.String()
+
     @validates_schema
     def validate_dates(self, data):
         if (
@@ -85,3 +121,21 @@ class Report(StrictSchema):
             raise ValidationError(
                 '"date_from" should be smaller than "date_to"', ["date_from", "date_to"]
             )
+
+
+class ReportJob(Report):
+    # Background jobs build whole reports, JSON pages are not supported
+    report_format = fields.String(
+        validate=validate.OneOf(
+            [
+                report_format.value
+                for report_format in ReportFormats
+                if report_format != ReportFormats.JSON
+            ]
+        ),
+        required=True,
+    )
+    report_type = fields.String(
+        validate=validate.OneOf([report_type.value for report_type in ReportTypes]),
+        required=True,
+    )
@@ -0,0 +1,90 @@
+import asyncio
+import uuid
+from typing import Optional
+
+import aioredis
+from aiohttp import web
+from aioredis.commands import Redis
+
+from app.cache import LRUCache
+
+# Channel for broadcasting deleted sessions to all workers
+INVALIDATION_CHANNEL = "sessions:invalidated"
+
+
+class SessionStorage:
+    """
+    Keeps user sessions in redis with optional in-process near-cache.
+    Cached sessions live no longer than they live in redis.
+    Deleted sessions are evicted from all workers caches over redis pub/sub.
+    """
+
+    def __init__(self):
+        self.redis: Redis = None
+        self.expires = None
+        self.cache: Optional[LRUCache] = None
+        self.subscriber: Redis = None
+        self.listener: asyncio.Task = None
+
+    async def on_startup(self, app: web.Application):
+        self.redis = app["redis"]
+        self.expires = app["config"]["SESSION_EXPIRES"]
+        config = app["config"]["SESSION_CACHE"]
+        if config["ENABLED"]:
+            self.cache = LRUCache(max_size=config["MAX_SIZE"], ttl=config["TTL"])
+            # Subscribed connection could not be used for other commands
+            self.subscriber = await aioredis.create_redis(app["config"]["REDIS"]["DSN"])
+            (channel,) = await self.subscriber.subscribe(INVALIDATION_CHANNEL)
+            self.listener = asyncio.ensure_future(self.listen(channel))
+        app["sessions"] = self
+
+    async def on_cleanup(self, app: web.Application):
+        if self.listener:
+            self.listener.cancel()
+            self.subscriber.close()
+            await self.subscriber.wait_closed()
+
+    @classmethod
+    def register_app(cls, app: web.Application):
+        instance = cls()
+        app.on_startup.append(instance.on_startup)
+        app.on_cleanup.append(instance.on_cleanup)
+
+    async def create(self, user_id: int) -> str:
+        token = str(uuid.uuid4())
+        await self.redis.setex(key=token, value=user_id, seconds=self.expires)
+        return token
+
+    async def get_user_id(self, token: str) -> Optional[int]:
+        if not self.cache:
+            user_id = await self.redis.get(token)
+            return int(user_id) if user_id is not None else None
+
+        user_id = self.cache.get(token)
+        if user_id is not None:
+            return user_id
+
+        transaction = self.redis.multi_exec()
+        transaction.get(token)
+        transaction.ttl(token)
+        user_id, ttl = await transaction.execute()
+        if user_id is None:
+            return None
+
+        user_id = int(user_id)
+        if ttl > 0:
+            self.cache.set(token, user_id, ttl=ttl)
+        return user_id
+
+    async def delete(self, token: str):
+        if self.cache:
+            self.cache.delete(token)
+        await self.redis.delete(token)
+        await self.redis.publish(INVALIDATION_CHANNEL, token)
+
+    async def listen(self, channel: aioredis.Channel):
+        async for token in channel.iter(encoding="utf-8"):
+            self.cache.delete(token)
+
+    def stats(self) -> Optional[dict]:
+        return self.cache.stats() if self.cache else None
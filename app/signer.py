@@ -0,0 +1,79 @@
+import asyncio
+import threading
+from base64 import b64encode
+
+from aiohttp import web
+from Crypto.Hash import SHA256
+from Crypto.PublicKey import RSA
+from Crypto.Signature import PKCS1_v1_5
+
+from app.executors import BoundedExecutor
+from app.utils import chunked
+
+# Max signatures in one executor task for batches
+SIGN_CHUNK_SIZE = 500
+
+# Private key is loaded once per worker process (or thread)
+_worker = threading.local()
+
+
+class OperationsSigner:
+    """
+    Signs operations with RSA private key in thread or process pool,
+    so CPU heavy signing does not block event loop.
+    """
+
+    def __init__(self):
+        self.executor = None
+
+    async def on_startup(self, app: web.Application):
+        config = app["config"]["SIGNER"]
+        self.executor = BoundedExecutor(
+            config["EXECUTOR"],
+            workers=config["WORKERS"],
+            max_queue=config["MAX_QUEUE"],
+            initializer=load_private_key,
+            initargs=(app["config"]["PRIVATE_KEY"],),
+        )
+        app["operations_signer"] = self
+        # Fail fast if private key could not be loaded
+        await self.sign("")
+
+    async def on_cleanup(self, app: web.Application):
+        self.executor.shutdown()
+
+    @classmethod
+    def register_app(cls, app: web.Application):
+        instance = cls()
+        app.on_startup.append(instance.on_startup)
+        app.on_cleanup.append(instance.on_cleanup)
+
+    async def sign(self, data: str) -> str:
+        return await self.executor.run(sign, data)
+
+    async def sign_many(self, data: list) -> list:
+        chunks = await asyncio.gather(
+            *[
+                self.executor.run(sign_many, chunk)
+                for chunk in chunked(data, SIGN_CHUNK_SIZE)
+            ]
+        )
+        return [signature for chunk in chunks for signature in chunk]
+
+
+def load_private_key(path: str):
+    """ Executor worker initializer """
+    with open(path, "r") as key_file:
+        private_key = RSA.importKey(key_file.read())
+    _worker.signer = PKCS1_v1_5.new(private_key)
+
+
+def sign(data: str) -> str:
+    """ Create sign for data and return it in base64 decoded """
+    digest = SHA256.new()
+    digest.update(data.encode())
+    return b64encode(_worker.signer.sign(digest)).decode()
+
+
+def sign_many(data: list) -> list:
+    return [sign(item) for item in data]
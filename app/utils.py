@@ -1,3 +1,4 @@
+import datetime as dt
 import decimal
 
 import simplejson
@@ -23,3 +24,26 @@ def convert_amount(
     quotation = rate_to / rate_from
     amount = amount * quotation
     return amount.quantize(decimal.Decimal(".01"))
+
+
+def chunked(items: list, size: int):
+    """ Split list into consecutive chunks with maximum "size" items in each """
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def to_datetime(date):
+    """ Date as datetime of its midnight, anything else is returned as is """
+    if not isinstance(date, dt.date) or isinstance(date, dt.datetime):
+        return date
+    return dt.datetime.combine(date, dt.time())
+
+
+def month_start(value: dt.datetime) -> dt.datetime:
+    return dt.datetime(value.year, value.month, 1)
+
+
+def next_month(value: dt.datetime) -> dt.datetime:
+    if value.month == 12:
+        return dt.datetime(value.year + 1, 1, 1)
+    return dt.datetime(value.year, value.month + 1, 1)
@@ -1,13 +1,13 @@
-import uuid
-
 import sqlalchemy as sa
 from aiohttp import web
 from aiohttp_apispec import docs, request_schema
-from aioredis.commands import Redis
 from databases import Database
-from passlib.hash import pbkdf2_sha256
 
-from app.db.postgres.models import users, wallets
+from app.db.postgres.compiler import fetch_one, queries
+from app.db.postgres.direct import DirectConnections
+from app.db.postgres.models import users
+from app.db.postgres.users import insert_user
+from app.decorators import authorized_user
 from app.schemas import Registration, User
 from app.utils import json_response
 
@@ -19,55 +19,58 @@ async def signup(request: web.Request):
     user = request["data"]["user"]
     wallet_currency = request["data"]["wallet_currency"]
 
-    async with db.connection() as con:
-        # Checking login uniqueness
-        login_exists = await con.fetch_val(
-            sa.select([sa.exists(users.select().where(users.c.login == user["login"]))])
-        )
-        if login_exists:
-            return json_response({"user": {"login": "Already exists."}}, status=422)
-
-        user["password"] = pbkdf2_sha256.hash(user["password"])
-
-        # Use transaction to make sure both user and wallet are created
-        async with con.transaction():
-            # Creating user
-            user_id = await con.fetch_val(
-                users.insert().values(user).returning(users.c.id)
-            )
-            # Creating user wallet
-            await con.execute(
-                wallets.insert().values(
-                    user_id=user_id, amount=0, currency=wallet_currency
-                )
-            )
-            return json_response({})
+    user["password"] = await request.app["password_hasher"].hash(user["password"])
+
+    # Login uniqueness is checked by the same statement
+    if not await insert_user(db, user, wallet_currency):
+        return json_response({"user": {"login": "Already exists."}}, status=422)
+
+    return json_response({})
 
 
 @docs(tags=["auth"], summary="User authorization")
 @request_schema(User(only=["login", "password"]))
 async def login(request: web.Request):
     db: Database = request.app["db"]
-    redis: Redis = request.app["redis"]
+    pg: DirectConnections = request.app["pg"]
     user = request["data"]
 
-    actual_user = await db.fetch_one(
-        sa.select([users.c.id, users.c.password]).where(users.c.login == user["login"])
-    )
+    query = queries.get(("login",), build_login_query)
+    actual_user = await fetch_one(pg, query.bind(login=user["login"]))
 
     # Login not found
     if not actual_user:
         return json_response({}, status=401)
 
+    verified, new_password_hash = await request.app["password_hasher"].verify(
+        user["password"], actual_user["password"]
+    )
+
     # Password is incorrect
-    if not pbkdf2_sha256.verify(user["password"], actual_user["password"]):
+    if not verified:
         return json_response({}, status=401)
 
-    session_token = str(uuid.uuid4())
-    await redis.setex(
-        key=session_token,
-        value=actual_user["id"],
-        seconds=request.app["config"]["SESSION_EXPIRES"],
-    )
+    # Password hash parameters are outdated
+    if new_password_hash:
+        await db.execute(
+            users.update()
+            .values(password=new_password_hash)
+            .where(users.c.id == actual_user["id"])
+        )
+
+    session_token = await request.app["sessions"].create(actual_user["id"])
 
     return json_response({"token": session_token})
+
+
+@docs(tags=["auth"], security={"auth": []}, summary="User logout")
+@authorized_user
+async def logout(request: web.Request):
+    await request.app["sessions"].delete(request.headers["Authorization"])
+    return json_response({})
+
+
+def build_login_query():
+    return sa.select([users.c.id, users.c.password]).where(
+        users.c.login == sa.bindparam("login")
+    )
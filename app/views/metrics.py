@@ -0,0 +1,20 @@
+from aiohttp import web
+from aiohttp_apispec import docs
+
+from app.db.postgres.compiler import queries
+from app.decorators import authorized_status_manager
+from app.utils import json_response
+
+
+@docs(tags=["metrics"], security={"status-manager": []}, summary="Service metrics")
+@authorized_status_manager
+async def get_metrics(request: web.Request) -> web.Response:
+    return json_response(
+        {
+            "signer": request.app["operations_signer"].executor.stats(),
+            "password_hasher": request.app["password_hasher"].executor.stats(),
+            "session_cache": request.app["sessions"].stats(),
+            "wallets_cache": request.app["wallets"].stats(),
+            "queries": queries.stats(),
+        }
+    )
@@ -1,15 +1,18 @@
 import datetime as dt
 
-import sqlalchemy as sa
 from aiohttp import web
 from aiohttp_apispec import docs, request_schema
-from databases import Database
 
-from app.constants import ALLOWED_TRANSACTIONS, OperationStatuses
-from app.db.postgres.models import operations, operations_statuses, wallets
+from app.constants import OperationStatuses
+from app.db.postgres.direct import DirectConnections
+from app.db.postgres.transitions import (
+    TRANSITION_ERRORS,
+    change_operation_status,
+    change_operations_statuses,
+)
 from app.decorators import authorized_status_manager
-from app.schemas import OperationStatus
-from app.utils import convert_amount, json_response
+from app.schemas import OperationStatus, OperationStatusBatch
+from app.utils import json_response
 
 
 @docs(
@@ -20,80 +23,52 @@ from app.utils import convert_amount, json_response
 @authorized_status_manager
 @request_schema(OperationStatus)
 async def change_status(request: web.Request) -> web.Response:
-    db: Database = request.app["db"]
+    pg: DirectConnections = request.app["pg"]
     operation_id = int(request.match_info["operation_id"])
     new_status = request["data"]["status"]
 
-    async with db.connection() as con:
+    # Transition checks, balance changing and history are made by database
+    code, operation = await change_operation_status(
+        pg, operation_id, new_status, dt.datetime.utcnow()
+    )
+    if code in TRANSITION_ERRORS:
+        return json_response({}, status=code, error=TRANSITION_ERRORS[code])
 
-        operation = await con.fetch_one(
-            sa.select([*operations.c, operations_statuses.c.status])
-            .select_from(operations.join(operations_statuses))
-            .where(operations.c.id == operation_id)
-            .order_by(sa.desc(operations_statuses.c.id))
-            .limit(1)
-        )
+    operation["status"] = new_status
+    operation["datetime"] = operation["datetime"].isoformat()
 
-        if not operation:
-            return json_response({}, status=404, error="Operation not found")
+    return json_response(operation)
 
-        if new_status not in ALLOWED_TRANSACTIONS[operation["status"]]:
-            return json_response({}, status=400, error="Not valid status")
-        async with con.transaction():
-            if (
-                operation["status"] == OperationStatuses.DRAFT
-                and new_status == OperationStatuses.PROCESSING
-            ):
-                sender_wallet = await con.fetch_one(
-                    wallets.select().where(
-                        wallets.c.id == operation["sender_wallet_id"]
-                    )
-                )
-                amount_from_sender = convert_amount(
-                    rate_to=operation["sender_wallet_rate"], amount=operation["amount"]
-                )
-                if sender_wallet["amount"] < amount_from_sender:
-                    return json_response(
-                        {}, status=202, error="Not enough money on sender wallet"
-                    )
-                new_sender_amount = sender_wallet["amount"] - amount_from_sender
-                await con.execute(
-                    sa.update(wallets)
-                    .values(amount=new_sender_amount)
-                    .where(wallets.c.id == operation["sender_wallet_id"])
-                )
 
-            elif operation["status"] == OperationStatuses.PROCESSING:
-                if new_status == OperationStatuses.ACCEPTED:
-                    amount_to_receiver = convert_amount(
-                        rate_to=operation["receiver_wallet_rate"],
-                        amount=operation["amount"],
-                    )
-                    await con.execute(
-                        sa.update(wallets)
-                        .values(amount=wallets.c.amount + amount_to_receiver)
-                        .where(wallets.c.id == operation["receiver_wallet_id"])
-                    )
-                elif new_status == OperationStatuses.FAILED:
-                    amount_to_sender = convert_amount(
-                        rate_to=operation["sender_wallet_rate"],
-                        amount=operation["amount"],
-                    )
-                    await con.execute(
-                        sa.update(wallets)
-                        .values(amount=wallets.c.amount + amount_to_sender)
-                        .where(wallets.c.id == operation["sender_wallet_id"])
-                    )
-            await con.execute(
-                operations_statuses.insert().values(
-                    operation_id=operation_id,
-                    status=new_status,
-                    datetime=dt.datetime.utcnow(),
-                )
-            )
+@docs(
+    tags=["operations"],
+    security={"status-manager": []},
+    summary="Change statuses of many operations in one transaction",
+)
+@authorized_status_manager
+@request_schema(OperationStatusBatch)
+async def change_statuses_batch(request: web.Request) -> web.Response:
+    pg: DirectConnections = request.app["pg"]
+    items = [
+        (item["operation_id"], OperationStatuses(item["status"]))
+        for item in request["data"]["operations"]
+    ]
 
-    operation = dict(operation)
-    operation["status"] = new_status
-    operation["datetime"] = operation["datetime"].isoformat()
+    # The same database function as for one operation, applied in items order
+    codes = await change_operations_statuses(pg, items, dt.datetime.utcnow())
 
-    return json_response(operation)
+    results = []
+    for (operation_id, new_status), code in zip(items, codes):
+        if code in TRANSITION_ERRORS:
+            results.append(
+                {
+                    "operation_id": operation_id,
+                    "code": code,
+                    "error": TRANSITION_ERRORS[code],
+                }
+            )
+        else:
+            results.append(
+                {"operation_id": operation_id, "code": code, "status": new_status}
+            )
+    return json_response({"operations": results})
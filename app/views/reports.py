@@ -4,7 +4,9 @@ from aiohttp_apispec import docs, request_schema
 from app.constants import ReportTypes
 from app.decorators import authorized_user
 from app.report_builder import make_report_builder
-from app.schemas import Report
+from app.report_jobs import JobStatuses
+from app.schemas import Report, ReportJob
+from app.utils import json_response
 
 
 @docs(tags=["reports"], security={"auth": []}, summary="Operations report generating")
@@ -12,9 +14,13 @@ from app.schemas import Report
 @request_schema(Report, locations=["query"])
 async def get_report_operations(request: web.Request) -> web.StreamResponse:
     report_builder = make_report_builder(
-        request, request["data"]["report_format"], ReportTypes.OPERATIONS
+        request.app,
+        request["data"]["report_format"],
+        ReportTypes.OPERATIONS,
+        user_id=request.get("user_id"),
+        query_params=request["data"],
     )
-    return await report_builder.build_report_response()
+    return await report_builder.build_report_response(request)
 
 
 @docs(tags=["reports"], security={"auth": []}, summary="Statuses report generating")
@@ -22,6 +28,69 @@ async def get_report_operations(request: web.Request) -> web.StreamResponse:
 @request_schema(Report, locations=["query"])
 async def get_report_statuses(request: web.Request) -> web.StreamResponse:
     report_builder = make_report_builder(
-        request, request["data"]["report_format"], ReportTypes.STATUSES
+        request.app,
+        request["data"]["report_format"],
+        ReportTypes.STATUSES,
+        user_id=request.get("user_id"),
+        query_params=request["data"],
+    )
+    return await report_builder.build_report_response(request)
+
+
+@docs(
+    tags=["reports"], security={"auth": []}, summary="Report generating in background"
+)
+@authorized_user(allow_unauthorized=True)
+@request_schema(ReportJob)
+async def create_report_job(request: web.Request) -> web.Response:
+    data = request["data"]
+    report_builder = make_report_builder(
+        request.app,
+        data["report_format"],
+        ReportTypes(data["report_type"]),
+        user_id=request.get("user_id"),
+        query_params=data,
+    )
+    error_response = await report_builder.resolve_user()
+    if error_response is not None:
+        return error_response
+
+    job = await request.app["report_jobs"].create(
+        report_builder.user_id,
+        data["report_type"],
+        data["report_format"],
+        date_from=data.get("date_from"),
+        date_to=data.get("date_to"),
+    )
+    return json_response({"id": job["id"], "status": job["status"]}, status=202)
+
+
+@docs(
+    tags=["reports"],
+    summary="Background report status or file when it is done",
+    description="Finished report supports HTTP Range requests and ETag",
+)
+async def get_report_job(request: web.Request) -> web.StreamResponse:
+    report_jobs = request.app["report_jobs"]
+    job = await report_jobs.get(request.match_info["job_id"])
+    if not job:
+        return json_response({}, status=404, error="Report job not found")
+
+    if job["status"] != JobStatuses.DONE:
+        return json_response({"id": job["id"], "status": job["status"]}, status=202)
+
+    # Finished reports never change
+    etag = f'"{job["id"]}"'
+    if request.headers.get("If-None-Match") == etag:
+        return web.Response(status=304, headers={"ETag": etag})
+
+    return web.FileResponse(
+        report_jobs.path(job),
+        headers={
+            "Content-Type": job["content_type"],
+            "Content-Disposition": (
+                f'attachment; filename="{job["report_type"]}{job["file_extension"]}"'
+            ),
+            "ETag": etag,
+        },
     )
-    return await report_builder.build_report_response()
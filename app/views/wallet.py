@@ -1,29 +1,28 @@
 import datetime as dt
-from base64 import b64encode
 
 import sqlalchemy as sa
 from aiohttp import web
 from aiohttp_apispec import docs, request_schema
-from Crypto.Hash import SHA256
 from databases import Database
 
-from app.constants import OperationStatuses
-from app.db.postgres.models import operations, operations_statuses, users, wallets
+from app.constants import OperationStatuses, WalletCurrencies
+from app.db.postgres.balances import credit_user_wallet
+from app.db.postgres.compiler import fetch_one, queries
+from app.db.postgres.direct import DirectConnections
+from app.db.postgres.models import wallets
+from app.db.postgres.operations import insert_operation, insert_operations
 from app.decorators import authorized_user
-from app.schemas import Money, MoneyReceiverLogin
+from app.schemas import Money, MoneyReceiverLogin, MoneyReceiverLoginBatch
 from app.utils import convert_amount, json_response
 
 
 @docs(tags=["wallet"], security={"auth": []}, summary="Get wallet balance info")
 @authorized_user
 async def get_balance(request: web.Request) -> web.Response:
-    db: Database = request.app["db"]
+    pg: DirectConnections = request.app["pg"]
 
-    wallet = await db.fetch_one(
-        sa.select([wallets.c.amount, wallets.c.currency]).where(
-            wallets.c.user_id == request["user_id"]
-        )
-    )
+    query = queries.get(("balance",), build_balance_query)
+    wallet = await fetch_one(pg, query.bind(user_id=request["user_id"]))
 
     return json_response(dict(wallet))
 
@@ -36,88 +35,68 @@ async def put_money_on_balance(request: web.Request) -> web.Response:
     money = request["data"]
     rates = await request.app["rates_client"].get_rates()
 
-    async with db.connection() as con:
-        wallet = await con.fetch_one(
-            sa.select([wallets.c.amount, wallets.c.currency]).where(
-                wallets.c.user_id == request["user_id"]
+    # Amount is converted to every currency to credit wallet in one statement
+    wallet = await credit_user_wallet(
+        db,
+        request["user_id"],
+        {
+            currency: convert_amount(
+                rate_from=rates[money["currency"]],
+                rate_to=rates[currency],
+                amount=money["amount"],
             )
-        )
-
-        new_amount = wallet["amount"] + convert_amount(
-            rate_from=rates[money["currency"]],
-            rate_to=rates[wallet["currency"]],
-            amount=money["amount"],
-        )
-
-        await con.execute(
-            wallets.update()
-            .values(amount=new_amount)
-            .where(wallets.c.user_id == request["user_id"])
-        )
+            for currency in WalletCurrencies
+        },
+    )
 
-    return json_response({"amount": new_amount, "currency": wallet["currency"]})
+    return json_response({"amount": wallet["amount"], "currency": wallet["currency"]})
 
 
 @docs(tags=["wallet"], security={"auth": []}, summary="Send money to user")
 @authorized_user
 @request_schema(MoneyReceiverLogin)
 async def create_operation(request: web.Request) -> web.Response:
-    db: Database = request.app["db"]
+    pg: DirectConnections = request.app["pg"]
     data = request["data"]
     rates = await request.app["rates_client"].get_rates()
     now_datetime = dt.datetime.utcnow()
 
-    async with db.connection() as con:
-        receiver_wallet = await con.fetch_one(
-            sa.select([wallets.c.id, wallets.c.currency, users.c.id.label("user_id")])
-            .select_from(wallets.join(users))
-            .where(users.c.login == data["receiver_login"])
-        )
-
-        if not receiver_wallet:
-            return json_response({}, status=404, error="Receiver not found")
+    sender_wallet, receiver_wallet = await request.app["wallets"].resolve(
+        pg, request["user_id"], data["receiver_login"]
+    )
 
-        if receiver_wallet["user_id"] == request["user_id"]:
-            return json_response({}, status=400, error="Should be another wallet")
+    if not receiver_wallet:
+        return json_response({}, status=404, error="Receiver not found")
 
-        sender_wallet = await con.fetch_one(
-            sa.select([wallets.c.id, wallets.c.currency, wallets.c.amount]).where(
-                wallets.c.user_id == request["user_id"]
-            )
-        )
+    if receiver_wallet["user_id"] == request["user_id"]:
+        return json_response({}, status=400, error="Should be another wallet")
 
-        signature = operation_signature(
-            request.app["operations_signer"],
+    signature = await request.app["operations_signer"].sign(
+        operation_signature_data(
             sender_wallet["id"],
             receiver_wallet["id"],
             data["currency"],
             data["amount"],
             now_datetime,
         )
+    )
 
-        async with con.transaction():
-            operation_id = await con.fetch_val(
-                operations.insert()
-                .values(
-                    sender_wallet_id=sender_wallet["id"],
-                    receiver_wallet_id=receiver_wallet["id"],
-                    amount=convert_amount(
-                        rate_from=rates[data["currency"]], amount=data["amount"]
-                    ),
-                    sender_wallet_rate=rates[sender_wallet["currency"]],
-                    receiver_wallet_rate=rates[receiver_wallet["currency"]],
-                    datetime=now_datetime,
-                    signature=signature,
-                )
-                .returning(operations.c.id)
-            )
-            await con.execute(
-                operations_statuses.insert().values(
-                    operation_id=operation_id,
-                    status=OperationStatuses.DRAFT,
-                    datetime=now_datetime,
-                )
-            )
+    operation_id = await insert_operation(
+        pg,
+        dict(
+            sender_wallet_id=sender_wallet["id"],
+            receiver_wallet_id=receiver_wallet["id"],
+            amount=convert_amount(
+                rate_from=rates[data["currency"]], amount=data["amount"]
+            ),
+            sender_wallet_rate=rates[sender_wallet["currency"]],
+            receiver_wallet_rate=rates[receiver_wallet["currency"]],
+            datetime=now_datetime,
+            signature=signature,
+        ),
+        request["user_id"],
+        receiver_wallet["user_id"],
+    )
 
     return json_response(
         {
@@ -128,16 +107,100 @@ async def create_operation(request: web.Request) -> web.Response:
             "receiver_login": data["receiver_login"],
             "status": OperationStatuses.DRAFT,
             "signature": signature,
-            "rates": rates,
+            "rates": dict(rates),
         }
     )
 
 
-def operation_signature(
-    signer, sender_wallet_id, receiver_wallet_id, currency, amount, datetime
-):
-    """ Create sign for operation and return it in base64 decoded """
-    data = f"{sender_wallet_id}{receiver_wallet_id}{currency}{amount}{datetime}"
-    digest = SHA256.new()
-    digest.update(data.encode())
-    return b64encode(signer.sign(digest)).decode()
+@docs(
+    tags=["wallet"],
+    security={"auth": []},
+    summary="Send money to many users in one transaction",
+)
+@authorized_user
+@request_schema(MoneyReceiverLoginBatch)
+async def create_operations_batch(request: web.Request) -> web.Response:
+    pg: DirectConnections = request.app["pg"]
+    items = request["data"]["operations"]
+    rates = await request.app["rates_client"].get_rates()
+    now_datetime = dt.datetime.utcnow()
+
+    sender_wallet, receiver_wallets = await request.app["wallets"].resolve_many(
+        pg, request["user_id"], [item["receiver_login"] for item in items]
+    )
+
+    # Every result refers to its batch item by index and receiver login
+    results = []
+    accepted = []
+    for index, item in enumerate(items):
+        result = {"index": index, "receiver_login": item["receiver_login"]}
+        results.append(result)
+        receiver_wallet = receiver_wallets.get(item["receiver_login"])
+        if not receiver_wallet:
+            result.update(code=404, error="Receiver not found")
+        elif receiver_wallet["user_id"] == request["user_id"]:
+            result.update(code=400, error="Should be another wallet")
+        else:
+            result.update(
+                code=200,
+                amount=item["amount"],
+                currency=item["currency"],
+                datetime=now_datetime.isoformat(),
+                status=OperationStatuses.DRAFT,
+            )
+            accepted.append((result, receiver_wallet))
+
+    if accepted:
+        signatures = await request.app["operations_signer"].sign_many(
+            [
+                operation_signature_data(
+                    sender_wallet["id"],
+                    receiver_wallet["id"],
+                    result["currency"],
+                    result["amount"],
+                    now_datetime,
+                )
+                for result, receiver_wallet in accepted
+            ]
+        )
+        for (result, _), signature in zip(accepted, signatures):
+            result["signature"] = signature
+
+        operation_ids = await insert_operations(
+            pg,
+            [
+                (
+                    dict(
+                        sender_wallet_id=sender_wallet["id"],
+                        receiver_wallet_id=receiver_wallet["id"],
+                        amount=convert_amount(
+                            rate_from=rates[result["currency"]], amount=result["amount"]
+                        ),
+                        sender_wallet_rate=rates[sender_wallet["currency"]],
+                        receiver_wallet_rate=rates[receiver_wallet["currency"]],
+                        datetime=now_datetime,
+                        signature=result["signature"],
+                    ),
+                    request["user_id"],
+                    receiver_wallet["user_id"],
+                )
+                for result, receiver_wallet in accepted
+            ],
+        )
+        for (result, _), operation_id in zip(accepted, operation_ids):
+            result["id"] = operation_id
+
+    return json_response({"operations": results, "rates": dict(rates)})
+
+
+def build_balance_query():
+    return sa.select([wallets.c.amount, wallets.c.currency]).where(
+        wallets.c.user_id == sa.bindparam("user_id")
+    )
+
+
+def operation_signature_data(
+    sender_wallet_id, receiver_wallet_id, currency, amount, datetime
+) -> str:
+    """ Operation data to be signed """
+    return f"{sender_wallet_id}{receiver_wallet_id}{currency}{amount}{datetime}"
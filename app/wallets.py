@@ -0,0 +1,97 @@
+from typing import Dict, Iterable, Optional, Tuple
+
+import sqlalchemy as sa
+from aiohttp import web
+from sqlalchemy.dialects import postgresql
+
+from app.cache import LRUCache
+from app.constants import WalletCurrencies
+from app.db.postgres.compiler import fetch_all, queries
+from app.db.postgres.models import users, wallets
+
+
+class WalletsResolver:
+    """
+    Resolves sender and receiver wallets of operation (or of batch of them)
+    in one query.
+    Wallets ids and currencies never change, so resolved wallets are kept
+    in optional in-process cache and recently seen pairs need no query at all.
+    """
+
+    def __init__(self):
+        self.cache: Optional[LRUCache] = None
+
+    async def on_startup(self, app: web.Application):
+        config = app["config"]["WALLETS_CACHE"]
+        if config["ENABLED"]:
+            self.cache = LRUCache(max_size=config["MAX_SIZE"], ttl=config["TTL"])
+        app["wallets"] = self
+
+    @classmethod
+    def register_app(cls, app: web.Application):
+        instance = cls()
+        app.on_startup.append(instance.on_startup)
+
+    async def resolve(
+        self, pg, sender_user_id: int, receiver_login: str
+    ) -> Tuple[Optional[dict], Optional[dict]]:
+        """ Returns (sender_wallet, receiver_wallet), None for not found ones """
+        sender_wallet, receiver_wallets = await self.resolve_many(
+            pg, sender_user_id, [receiver_login]
+        )
+        return sender_wallet, receiver_wallets.get(receiver_login)
+
+    async def resolve_many(
+        self, pg, sender_user_id: int, receiver_logins: Iterable[str]
+    ) -> Tuple[Optional[dict], Dict[str, dict]]:
+        """ Returns (sender_wallet, {login: receiver_wallet}) of found ones """
+        receiver_logins = sorted(set(receiver_logins))
+        if self.cache:
+            sender_wallet = self.cache.get(("user_id", sender_user_id))
+            receiver_wallets = {
+                login: self.cache.get(("login", login)) for login in receiver_logins
+            }
+            if sender_wallet and all(receiver_wallets.values()):
+                return sender_wallet, receiver_wallets
+
+        sender_wallet, receiver_wallets = None, {}
+        query = queries.get(("wallets",), build_wallets_query)
+        for wallet in await fetch_all(
+            pg,
+            query.bind(sender_user_id=sender_user_id, receiver_logins=receiver_logins),
+        ):
+            wallet = dict(wallet, currency=WalletCurrencies(wallet["currency"]))
+            if wallet["user_id"] == sender_user_id:
+                sender_wallet = wallet
+            if wallet["login"] in receiver_logins:
+                receiver_wallets[wallet["login"]] = wallet
+            if self.cache:
+                self.cache.set(("user_id", wallet["user_id"]), wallet)
+                self.cache.set(("login", wallet["login"]), wallet)
+        return sender_wallet, receiver_wallets
+
+    def stats(self) -> dict:
+        return self.cache.stats() if self.cache else {}
+
+
+def build_wallets_query():
+    return (
+        sa.select(
+            [
+                wallets.c.id,
+                wallets.c.currency,
+                users.c.id.label("user_id"),
+                users.c.login,
+            ]
+        )
+        .select_from(wallets.join(users))
+        .where(
+            sa.or_(
+                users.c.id == sa.bindparam("sender_user_id"),
+                users.c.login
+                == sa.any_(
+                    sa.bindparam("receiver_logins", type_=postgresql.ARRAY(sa.Unicode))
+                ),
+            )
+        )
+    )
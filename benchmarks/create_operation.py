@@ -0,0 +1,162 @@
+"""
+Operation creation latency against local PostgreSQL: previous
+implementation (two lookups and three inserts in transaction) versus
+wallets resolving in one query plus one CTE statement, and versus
+the CTE statement alone as with warm wallets cache.
+
+Signing is the same for all paths and is not measured.
+Everything is rolled back at the end.
+
+    POSTGRES_DSN=... python -m benchmarks.create_operation [operations]
+"""
+import asyncio
+import datetime as dt
+import decimal
+import os
+import statistics
+import sys
+import time
+
+import sqlalchemy as sa
+from databases import Database
+
+from app.constants import OperationStatuses, WalletCurrencies
+from app.db.postgres.direct import DirectConnections
+from app.db.postgres.models import (
+    operations,
+    operations_statuses,
+    user_operations,
+    users,
+    wallets,
+)
+from app.db.postgres.operations import insert_operation
+from app.views.wallet import user_operations_rows
+from app.wallets import WalletsResolver
+
+OPERATIONS = 2000
+SENDER, RECEIVER = "benchmark_sender", "benchmark_receiver"
+RATE = decimal.Decimal("1")
+
+
+async def create_user(db, login: str) -> int:
+    user_id = await db.fetch_val(
+        users.insert().values(login=login, password="").returning(users.c.id)
+    )
+    await db.execute(
+        wallets.insert().values(
+            user_id=user_id, amount=0, currency=WalletCurrencies.USD
+        )
+    )
+    return user_id
+
+
+def operation_values(sender_wallet, receiver_wallet) -> dict:
+    return dict(
+        sender_wallet_id=sender_wallet["id"],
+        receiver_wallet_id=receiver_wallet["id"],
+        amount=decimal.Decimal("1"),
+        sender_wallet_rate=RATE,
+        receiver_wallet_rate=RATE,
+        datetime=dt.datetime.utcnow(),
+        signature="",
+    )
+
+
+async def previous(db, sender_user_id: int, resolver: WalletsResolver):
+    async with db.connection() as con:
+        receiver_wallet = await con.fetch_one(
+            sa.select([wallets.c.id, wallets.c.currency, users.c.id.label("user_id")])
+            .select_from(wallets.join(users))
+            .where(users.c.login == RECEIVER)
+        )
+        sender_wallet = await con.fetch_one(
+            sa.select([wallets.c.id, wallets.c.currency, wallets.c.amount]).where(
+                wallets.c.user_id == sender_user_id
+            )
+        )
+        values = operation_values(sender_wallet, receiver_wallet)
+        async with con.transaction():
+            operation_id = await con.fetch_val(
+                operations.insert()
+                .values(
+                    **values, current_status=OperationStatuses.DRAFT, status_version=1
+                )
+                .returning(operations.c.id)
+            )
+            await con.execute(
+                operations_statuses.insert().values(
+                    operation_id=operation_id,
+                    status=OperationStatuses.DRAFT,
+                    datetime=values["datetime"],
+                )
+            )
+            await con.execute(
+                user_operations.insert().values(
+                    user_operations_rows(
+                        operation_id,
+                        sender_user_id,
+                        receiver_wallet["user_id"],
+                        values["datetime"],
+                    )
+                )
+            )
+
+
+async def single_statement(pg, sender_user_id: int, resolver: WalletsResolver):
+    sender_wallet, receiver_wallet = await resolver.resolve(
+        pg, sender_user_id, RECEIVER
+    )
+    await insert_operation(
+        pg,
+        operation_values(sender_wallet, receiver_wallet),
+        sender_user_id,
+        receiver_wallet["user_id"],
+    )
+
+
+async def make_resolver(cache: bool) -> WalletsResolver:
+    resolver = WalletsResolver()
+    await resolver.on_startup(
+        {"config": {"WALLETS_CACHE": {"ENABLED": cache, "MAX_SIZE": 10, "TTL": 3600}}}
+    )
+    return resolver
+
+
+async def measure(
+    name: str, create, db, sender_user_id: int, count: int, cache: bool = False
+):
+    resolver = await make_resolver(cache)
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        await create(db, sender_user_id, resolver)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    print(
+        f"{name:<18} p50 {statistics.median(latencies):>7.3f} ms "
+        f"p99 {latencies[int(len(latencies) * 0.99)]:>7.3f} ms "
+        f"{count / sum(latencies) * 1000:>8,.0f} ops/s"
+    )
+
+
+async def main(count: int):
+    db = Database(os.environ["POSTGRES_DSN"], force_rollback=True)
+    await db.connect()
+    try:
+        sender_user_id = await create_user(db, SENDER)
+        await create_user(db, RECEIVER)
+        await measure("previous", previous, db, sender_user_id, count)
+        # Direct connections fall back to the same rolled back connection
+        pg = DirectConnections(db)
+        await measure("single statement", single_statement, pg, sender_user_id, count)
+        await measure(
+            "cached wallets", single_statement, pg, sender_user_id, count, cache=True
+        )
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.get_event_loop().run_until_complete(
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else OPERATIONS)
+    )
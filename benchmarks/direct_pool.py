@@ -0,0 +1,119 @@
+"""
+Hot queries through "databases" (previous implementation: Record
+wrapping and per column result processing), through raw asyncpg
+connections of "databases" (fallback) and through direct asyncpg pool
+with registered codecs. Rows are generated by PostgreSQL, so no tables
+are needed.
+
+    POSTGRES_DSN=... python -m benchmarks.direct_pool [rows] [requests] [concurrency]
+"""
+import asyncio
+import os
+import sys
+import time
+
+import sqlalchemy as sa
+from databases import Database
+
+from app.db.postgres.compiler import CachedQuery, fetch_all, fetch_one
+from app.db.postgres.direct import DirectConnections
+from app.db.postgres.models import operations, wallets
+
+ROWS = 1_000_000
+REQUESTS = 20_000
+CONCURRENCY = 20
+DEFAULTS = (ROWS, REQUESTS, CONCURRENCY)
+# Report batches are fetched by the same size
+FETCH_SIZE = 1000
+
+ROWS_QUERY = sa.text(
+    """
+    SELECT
+        i AS id,
+        (i * 1.01)::numeric(18, 2) AS amount,
+        '2019-01-01'::timestamp + i * interval '1 second' AS datetime,
+        (enum_range(NULL::walletcurrencies))[i % 4 + 1] AS currency,
+        (enum_range(NULL::operationstatuses))[i % 4 + 1] AS status
+    FROM generate_series(1, :rows) AS i
+    """
+).columns(
+    id=sa.Integer,
+    amount=operations.c.amount.type,
+    datetime=operations.c.datetime.type,
+    currency=wallets.c.currency.type,
+    status=operations.c.current_status.type,
+)
+COLUMNS = ("id", "amount", "datetime", "currency", "status")
+# Compiled once, as hot queries are
+QUERY = CachedQuery(ROWS_QUERY)
+
+
+def read(records) -> int:
+    """ Every value is taken, as serializers do """
+    for record in records:
+        for column in COLUMNS:
+            record[column]
+    return len(records)
+
+
+async def databases_rows(db: Database, pg: DirectConnections, rows: int) -> int:
+    return read(await db.fetch_all(ROWS_QUERY.bindparams(rows=rows)))
+
+
+async def direct_rows(db: Database, pg: DirectConnections, rows: int) -> int:
+    return read(await fetch_all(pg, QUERY.bind(rows=rows)))
+
+
+async def databases_request(db: Database, pg: DirectConnections) -> int:
+    return read([await db.fetch_one(ROWS_QUERY.bindparams(rows=1))])
+
+
+async def direct_request(db: Database, pg: DirectConnections) -> int:
+    return read([await fetch_one(pg, QUERY.bind(rows=1))])
+
+
+async def measure_rows(name: str, fetch, db, pg, rows: int):
+    started, fetched = time.perf_counter(), 0
+    while fetched < rows:
+        fetched += await fetch(db, pg, min(FETCH_SIZE, rows - fetched))
+    print(f"{name:<14} {rows / (time.perf_counter() - started):>12,.0f} rows/s")
+
+
+async def measure_requests(name: str, request, db, pg, count: int, concurrency: int):
+    async def worker(requests: int):
+        for _ in range(requests):
+            await request(db, pg)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker(count // concurrency) for _ in range(concurrency)])
+    print(f"{name:<14} {count / (time.perf_counter() - started):>12,.0f} req/s")
+
+
+async def main(rows: int, count: int, concurrency: int):
+    dsn = os.environ["POSTGRES_DSN"]
+    db = Database(dsn, min_size=concurrency, max_size=concurrency)
+    await db.connect()
+    fallback = DirectConnections(db)
+    direct = DirectConnections(db)
+    await direct.connect(dsn, min_size=concurrency, max_size=concurrency)
+    try:
+        paths = [
+            ("databases", databases_rows, databases_request, None),
+            ("fallback", direct_rows, direct_request, fallback),
+            ("direct pool", direct_rows, direct_request, direct),
+        ]
+        print(f"Report rows by {FETCH_SIZE}")
+        for name, fetch, _, pg in paths:
+            await measure_rows(f"  {name}", fetch, db, pg, rows)
+        print(f"Single row requests, {concurrency} concurrent")
+        for name, _, request, pg in paths:
+            await measure_requests(f"  {name}", request, db, pg, count, concurrency)
+    finally:
+        await direct.disconnect()
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.get_event_loop().run_until_complete(
+        main(*[int(arg) for arg in sys.argv[1:]], *DEFAULTS[len(sys.argv) - 1 :])
+    )
@@ -0,0 +1,142 @@
+"""
+Per endpoint SQLAlchemy work: building and compiling queries on every
+request (previous implementation) versus binding values to queries
+compiled once.
+
+Runs without database, so it measures only python side costs.
+
+    python -m benchmarks.query_cache [iterations]
+"""
+import datetime as dt
+import decimal
+import sys
+import time
+
+import sqlalchemy as sa
+
+from app.constants import ReportTypes
+from app.db.postgres.compiler import compile_query, queries
+from app.db.postgres.operations import (
+    build_insert_operation_query,
+    insert_operation_query,
+)
+from app.db.postgres.transitions import build_change_status_query, change_status_query
+from app.report_builder import (
+    build_report_page_query,
+    build_report_query,
+    report_page_query,
+    report_query,
+)
+from app.views.auth import build_login_query
+from app.views.wallet import build_balance_query
+from app.wallets import build_wallets_query
+
+ITERATIONS = 10_000
+NOW = dt.datetime(2019, 1, 1, 12, 12, 12)
+DATE_FROM, DATE_TO = dt.datetime(2019, 1, 1), dt.datetime(2019, 2, 1)
+OPERATION = dict(
+    sender_wallet_id=1,
+    receiver_wallet_id=2,
+    amount=decimal.Decimal("10.00"),
+    sender_wallet_rate=decimal.Decimal("1.00"),
+    receiver_wallet_rate=decimal.Decimal("0.90"),
+    datetime=NOW,
+    signature="c2lnbmF0dXJl" * 28,
+)
+
+
+def cached(name: str, build, **values):
+    return lambda: queries.get((name,), build).bind(**values)
+
+
+# endpoint: [(previous, cached)] for every query it makes
+ENDPOINTS = {
+    "GET /api/wallet/balance": [
+        (
+            lambda: compile_query(build_balance_query().params(user_id=1)),
+            cached("balance", build_balance_query, user_id=1),
+        )
+    ],
+    "POST /api/auth/login": [
+        (
+            lambda: compile_query(build_login_query().params(login="john123")),
+            cached("login", build_login_query, login="john123"),
+        )
+    ],
+    "POST /api/wallet/operations": [
+        (
+            lambda: compile_query(
+                build_wallets_query().params(
+                    sender_user_id=1, receiver_login="johnclone"
+                )
+            ),
+            cached(
+                "wallets",
+                build_wallets_query,
+                sender_user_id=1,
+                receiver_login="johnclone",
+            ),
+        ),
+        (
+            lambda: compile_query(build_insert_operation_query(OPERATION, 1, 2)),
+            lambda: insert_operation_query(OPERATION, 1, 2),
+        ),
+    ],
+    "POST /api/operations/{id}": [
+        (
+            lambda: compile_query(build_change_status_query(1, "PROCESSING", NOW)),
+            lambda: change_status_query(1, "PROCESSING", NOW),
+        )
+    ],
+    "GET /api/report/operations": [
+        (
+            lambda: compile_query(
+                build_report_query(1, ReportTypes.OPERATIONS, DATE_FROM, DATE_TO)
+            ),
+            lambda: report_query(1, ReportTypes.OPERATIONS, DATE_FROM, DATE_TO),
+        )
+    ],
+    "GET /api/report/statuses": [
+        (
+            lambda: compile_query(
+                build_report_query(1, ReportTypes.STATUSES, DATE_FROM, DATE_TO)
+            ),
+            lambda: report_query(1, ReportTypes.STATUSES, DATE_FROM, DATE_TO),
+        )
+    ],
+    "GET /api/report/operations JSON page": [
+        (
+            lambda: compile_query(
+                build_report_page_query(
+                    1, ReportTypes.OPERATIONS, sa.literal(51), after=(NOW, 100)
+                )
+            ),
+            lambda: report_page_query(1, ReportTypes.OPERATIONS, 51, after=(NOW, 100)),
+        )
+    ],
+}
+
+
+def measure(queries_makers, iterations: int) -> float:
+    """ Microseconds per request """
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for make in queries_makers:
+            make()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main(iterations: int):
+    print(f"{'endpoint':<38} {'previous':>12} {'cached':>12} {'speedup':>8}")
+    for endpoint, makers in ENDPOINTS.items():
+        previous = measure([previous for previous, _ in makers], iterations)
+        current = measure([current for _, current in makers], iterations)
+        print(
+            f"{endpoint:<38} {previous:>9.1f} us {current:>9.1f} us "
+            f"{previous / current:>7.1f}x"
+        )
+    print("cache:", queries.stats())
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else ITERATIONS)
@@ -0,0 +1,85 @@
+"""
+Report compression: bytes on the wire and CPU cost per MB
+of report for every available algorithm and level.
+
+Compression runs incrementally per flushed chunk as in real responses.
+Records have random signatures, amounts and datetimes like real ones,
+CPU cost is measured over uncompressed streaming of the same report.
+
+    python -m benchmarks.report_compression [rows]
+"""
+import asyncio
+import base64
+import datetime as dt
+import decimal
+import os
+import random
+import sys
+import time
+
+from app.constants import ReportTypes
+from app.report_builder import COMPRESSORS, CSVReportBuilder, XMLReportBuilder
+from benchmarks.report_streaming import CONFIG, FETCH_SIZE, Response
+
+ROWS = 200_000
+LEVELS = {"gzip": [1, 6, 9], "zstd": [1, 3, 9]}
+# Distinct batches are repeated, together they are bigger than compression windows
+BATCHES = 10
+
+
+def make_batch(size: int) -> list:
+    started = dt.datetime(2019, 1, 1)
+    return [
+        {
+            "id": random.randint(1, 10_000_000),
+            "amount": decimal.Decimal(random.randint(1, 10_000_000)) / 100,
+            "datetime": started + dt.timedelta(seconds=random.randint(0, 10_000_000)),
+            "signature": base64.b64encode(os.urandom(256)).decode(),
+            "sender_login": f"user{random.randint(1, 100_000)}",
+            "receiver_login": f"user{random.randint(1, 100_000)}",
+            "type": random.choice(["income", "outcome"]),
+        }
+        for _ in range(size)
+    ]
+
+
+def realistic(builder_class, rows: int):
+    batches = [make_batch(FETCH_SIZE) for _ in range(BATCHES)]
+
+    class RealisticBuilder(builder_class):
+        async def fetch_batches(self, query):
+            for i in range(rows // FETCH_SIZE):
+                yield batches[i % BATCHES]
+
+    return RealisticBuilder(
+        {"pg": None, "redis": None, "config": CONFIG}, ReportTypes.OPERATIONS
+    )
+
+
+def stream(builder, compressor) -> tuple:
+    response = Response()
+    cpu_started = time.process_time()
+    asyncio.get_event_loop().run_until_complete(
+        builder.stream_report(response.write, None, compressor)
+    )
+    return response.size, time.process_time() - cpu_started
+
+
+def main(rows: int):
+    for builder_class in (CSVReportBuilder, XMLReportBuilder):
+        builder = realistic(builder_class, rows)
+        raw_size, raw_cpu = stream(builder, None)
+        raw_mb = raw_size / 2 ** 20
+        print(f"{builder_class.__name__}: {raw_mb:.1f} MB uncompressed")
+        for encoding, compressor_class in COMPRESSORS.items():
+            for level in LEVELS[encoding]:
+                size, cpu = stream(builder, compressor_class(level))
+                print(
+                    f"  {encoding} {level:<4} {size / 2 ** 20:>8.1f} MB on wire "
+                    f"{raw_size / size:>6.1f}x "
+                    f"{(cpu - raw_cpu) / raw_mb * 1e3:>8.2f} ms CPU/MB"
+                )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else ROWS)
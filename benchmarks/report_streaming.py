@@ -0,0 +1,105 @@
+"""
+Report streaming: one write per row (previous implementation)
+versus batched serialization with buffered writes.
+
+Runs on synthetic records without database and network,
+so it measures only python side costs of streaming.
+
+    python -m benchmarks.report_streaming [rows]
+"""
+import asyncio
+import datetime as dt
+import decimal
+import sys
+import time
+
+from app.constants import ReportTypes
+from app.report_builder import CSVReportBuilder, XMLReportBuilder
+
+ROWS = 1_000_000
+FETCH_SIZE = 1000
+CONFIG = {
+    "REPORTS": {
+        "FETCH_SIZE": FETCH_SIZE,
+        "FLUSH_SIZE": 64 * 1024,
+        "FLUSH_INTERVAL": 1.0,
+        "SEGMENT_CACHE": {"ENABLED": False},
+        "COMPRESSION": {"EXECUTOR_SIZE": 64 * 1024},
+    }
+}
+
+
+class Response:
+    """ Counts writes and yields to event loop on every write as drain does """
+
+    def __init__(self):
+        self.writes = 0
+        self.size = 0
+
+    async def write(self, data: bytes):
+        self.writes += 1
+        self.size += len(data)
+        await asyncio.sleep(0)
+
+
+def make_batch(size: int) -> list:
+    return [
+        {
+            "id": i,
+            "amount": decimal.Decimal("1234.56"),
+            "datetime": dt.datetime(2019, 1, 1, 12, 12, 12, 123000),
+            "signature": "c2lnbmF0dXJl" * 28,
+            "sender_login": "john123",
+            "receiver_login": "johnclone",
+            "type": "outcome",
+        }
+        for i in range(size)
+    ]
+
+
+def synthetic(builder_class, rows: int):
+    batch = make_batch(FETCH_SIZE)
+
+    class SyntheticBuilder(builder_class):
+        async def fetch_batches(self, query):
+            for _ in range(rows // FETCH_SIZE):
+                yield batch
+
+    return SyntheticBuilder(
+        {"pg": None, "redis": None, "config": CONFIG}, ReportTypes.OPERATIONS
+    )
+
+
+async def per_row(builder, response: Response):
+    await response.write(builder.header())
+    async for records in builder.fetch_batches(None):
+        for record in records:
+            await response.write(builder.serialize_rows([record]))
+    await response.write(builder.footer())
+
+
+async def buffered(builder, response: Response):
+    await builder.stream_report(response.write, None)
+
+
+def measure(name: str, stream, builder, rows: int):
+    response = Response()
+    cpu_started, started = time.process_time(), time.perf_counter()
+    asyncio.get_event_loop().run_until_complete(stream(builder, response))
+    cpu, wall = time.process_time() - cpu_started, time.perf_counter() - started
+    print(
+        f"{name:<14} {rows / wall:>12,.0f} rows/s {cpu / rows * 1e6:>8.2f} us CPU/row "
+        f"{response.writes:>10,} writes {response.size / 2 ** 20:>8.1f} MB"
+    )
+
+
+def main(rows: int):
+    for builder_class in (CSVReportBuilder, XMLReportBuilder):
+        builder = synthetic(builder_class, rows)
+        print(builder_class.__name__)
+        measure("  per row", per_row, builder, rows)
+        measure("  buffered", buffered, builder, rows)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else ROWS)
@@ -0,0 +1,82 @@
+"""
+Signup burst load test (marketing campaign like): many concurrent
+signups, some of them repeated with the same login as double submits.
+Runs against working service, users are really created.
+
+    python -m benchmarks.signup_burst [url] [signups] [concurrency]
+"""
+import asyncio
+import collections
+import random
+import statistics
+import sys
+import time
+import uuid
+
+from aiohttp import ClientSession
+
+URL = "http://localhost:8765"
+SIGNUPS = 2000
+CONCURRENCY = 200
+# Share of signups sent twice at the same time
+DOUBLE_SUBMITS = 0.1
+
+
+def make_user(campaign: str, number: int) -> dict:
+    return {
+        "user": {
+            "name": "Campaign user",
+            "country": "Westeros",
+            "city": "Winterfell",
+            "login": f"{campaign}_{number}",
+            "password": "iknownothing",
+        },
+        "wallet_currency": random.choice(["USD", "EUR", "CAD", "CNY"]),
+    }
+
+
+async def main(url: str, signups: int, concurrency: int):
+    campaign = uuid.uuid4().hex[:8]
+    requests = [make_user(campaign, number) for number in range(signups)]
+    requests.extend(random.sample(requests, int(signups * DOUBLE_SUBMITS)))
+    random.shuffle(requests)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = collections.Counter()
+
+    async with ClientSession() as session:
+
+        async def signup(data: dict):
+            async with semaphore:
+                started = time.perf_counter()
+                async with session.post(f"{url}/api/auth/signup", json=data) as resp:
+                    await resp.read()
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses[resp.status] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*[signup(data) for data in requests])
+        wall = time.perf_counter() - started
+
+    latencies.sort()
+    print(
+        f"{len(requests):,} signups in {wall:.2f} s: {len(requests) / wall:,.0f} req/s, "
+        f"p50 {statistics.median(latencies):.1f} ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99)]:.1f} ms"
+    )
+    print("statuses:", dict(sorted(statuses.items())))
+    # Every double submit should be rejected exactly once
+    expected = {200: signups, 422: len(requests) - signups}
+    if dict(statuses) != expected:
+        print("expected:", expected)
+
+
+if __name__ == "__main__":
+    asyncio.get_event_loop().run_until_complete(
+        main(
+            sys.argv[1] if len(sys.argv) > 1 else URL,
+            int(sys.argv[2]) if len(sys.argv) > 2 else SIGNUPS,
+            int(sys.argv[3]) if len(sys.argv) > 3 else CONCURRENCY,
+        )
+    )
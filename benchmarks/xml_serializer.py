@@ -0,0 +1,47 @@
+"""
+XML report rows serialization: ElementTree (previous implementation)
+versus precompiled row template.
+
+    python -m benchmarks.xml_serializer [rows]
+"""
+import sys
+import time
+from xml.etree.ElementTree import Element, tostring
+
+from app.report_builder import xml_row_serializer
+from benchmarks.report_streaming import make_batch
+
+ROWS = 200_000
+
+
+def dict_to_xml(tag, d):
+    elem = Element(tag)
+    for key, val in d.items():
+        child = Element(key)
+        child.text = str(val)
+        elem.append(child)
+    return tostring(elem)
+
+
+def element_tree(records) -> bytes:
+    return b"".join(dict_to_xml("operation", record) + b"\n" for record in records)
+
+
+def template(records) -> bytes:
+    serialize = xml_row_serializer("operation", tuple(records[0].keys()))
+    return "".join(map(serialize, records)).encode("ascii", "xmlcharrefreplace")
+
+
+def main(rows: int):
+    records = make_batch(rows)
+    assert element_tree(records) == template(records)
+    for serializer in (element_tree, template):
+        started = time.perf_counter()
+        serializer(records)
+        print(
+            f"{serializer.__name__:<14} {rows / (time.perf_counter() - started):>12,.0f} rows/s"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else ROWS)
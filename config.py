@@ -5,6 +5,24 @@ config = {
         "DSN": environ["POSTGRES_DSN"],
         "POOL_MIN_SIZE": int(environ["POSTGRES_POOL_MIN_SIZE"]),
         "POOL_MAX_SIZE": int(environ["POSTGRES_POOL_MAX_SIZE"]),
+        # asyncpg pool used directly by hot queries (balance, login,
+        # operations creation, status changes and reports). It is off by default
+        # as it is opened in addition to the pool above: with it every worker
+        # may hold up to POOL_MAX_SIZE + DIRECT_POOL.MAX_SIZE connections, and
+        # that times workers count has to fit PostgreSQL max_connections.
+        "DIRECT_POOL": {
+            "ENABLED": bool(int(environ.get("POSTGRES_DIRECT_POOL_ENABLED", "0"))),
+            "MIN_SIZE": int(
+                environ.get(
+                    "POSTGRES_DIRECT_POOL_MIN_SIZE", environ["POSTGRES_POOL_MIN_SIZE"]
+                )
+            ),
+            "MAX_SIZE": int(
+                environ.get(
+                    "POSTGRES_DIRECT_POOL_MAX_SIZE", environ["POSTGRES_POOL_MAX_SIZE"]
+                )
+            ),
+        },
     },
     "REDIS": {
         "DSN": environ["REDIS_DSN"],
@@ -12,7 +30,53 @@ config = {
         "POOL_MAX_SIZE": int(environ["REDIS_POOL_MAX_SIZE"]),
     },
     "SESSION_EXPIRES": 86_400,
-    "RATES": {"UPDATE_INTERVAL": 60, "URL": "https://api.exchangeratesapi.io/latest"},
+    # In-process sessions cache, TTL is bounded by session expiration
+    "SESSION_CACHE": {"ENABLED": True, "MAX_SIZE": 100_000, "TTL": 60},
+    # In-process cache of resolved wallets ids and currencies
+    "WALLETS_CACHE": {"ENABLED": True, "MAX_SIZE": 100_000, "TTL": 3600},
+    # With BACKGROUND_REFRESH rates are kept in memory and refreshed in background
+    "RATES": {
+        "UPDATE_INTERVAL": 60,
+        "URL": "https://api.exchangeratesapi.io/latest",
+        "BACKGROUND_REFRESH": True,
+    },
     "STATUS_MANAGER_TOKEN": environ["STATUS_MANAGER_TOKEN"],
     "PRIVATE_KEY": "test_private_key.pem",
+    # Reports are fetched by FETCH_SIZE rows and sent by FLUSH_SIZE bytes chunks
+    # or at least every FLUSH_INTERVAL seconds.
+    # CSV_ENGINE: "copy" (PostgreSQL COPY) or "cursor" (python csv module)
+    "REPORTS": {
+        "FETCH_SIZE": 1000,
+        "FLUSH_SIZE": 64 * 1024,
+        "FLUSH_INTERVAL": 1.0,
+        "CSV_ENGINE": "copy",
+        # Reports are drained from database before sending, reports bigger than
+        # MEMORY_SIZE bytes are spooled to temporary files in DIR
+        "SPOOL": {"ENABLED": True, "MEMORY_SIZE": 1024 * 1024, "DIR": None},
+        # Closed monthly report segments are cached compressed for TTL seconds,
+        # segments bigger than MAX_SIZE bytes are not cached
+        "SEGMENT_CACHE": {
+            "ENABLED": True,
+            "TTL": 7 * 24 * 3600,
+            "MAX_SIZE": 16 * 1024 * 1024,
+        },
+        # Reports are compressed with the first of ALGORITHMS accepted by client,
+        # chunks bigger than EXECUTOR_SIZE bytes are compressed in executor
+        "COMPRESSION": {
+            "ALGORITHMS": ["zstd", "gzip"],
+            "LEVELS": {"zstd": 3, "gzip": 6},
+            "EXECUTOR_SIZE": 64 * 1024,
+        },
+        # Parquet reports are written by row groups of ROW_GROUP_SIZE rows
+        "PARQUET": {"ROW_GROUP_SIZE": 50_000, "COMPRESSION": "snappy"},
+    },
+    # Monthly partitions of history tables are created MONTHS_AHEAD months
+    # beforehand, checked every CHECK_INTERVAL seconds
+    "PARTITIONS": {"MONTHS_AHEAD": 3, "CHECK_INTERVAL": 6 * 3600},
+    # Background reports are stored in DIR for TTL seconds
+    "REPORT_JOBS": {"DIR": "/tmp/yopay-reports", "TTL": 3600, "WORKERS": 2},
+    # Operations signing pool: "process" or "thread" executor
+    "SIGNER": {"EXECUTOR": "process", "WORKERS": 4, "MAX_QUEUE": 1000},
+    # Passwords hashing pool, changed ROUNDS are applied on next user login
+    "PASSWORDS": {"ROUNDS": 29_000, "WORKERS": 4, "MAX_QUEUE": 64},
 }
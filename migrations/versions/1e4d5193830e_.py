@@ -0,0 +1,119 @@
+"""operation status transition function
+
+Revision ID: 1e4d5193830e
+Revises: f7a2c5e09d14
+Create Date: 2026-10-18 18:11:40.215730
+
+Function text is output of app.db.postgres.transitions.change_status_function_sql(),
+changed rules need new migration with its new output (tests fail until it is applied).
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '1e4d5193830e'
+down_revision = 'f7a2c5e09d14'
+branch_labels = None
+depends_on = None
+
+# Same rounding as app.utils.convert_amount (decimal quantize, half to even)
+CONVERT_AMOUNT_SQL = """
+CREATE OR REPLACE FUNCTION convert_amount(amount numeric, rate numeric)
+RETURNS numeric AS $$
+    SELECT CASE
+        WHEN rate = 1 THEN amount
+        WHEN abs(cents - trunc(cents)) = 0.5
+            THEN round((trunc(cents) + mod(abs(trunc(cents)), 2) * sign(cents)) / 100, 2)
+        ELSE round(cents / 100, 2)
+    END
+    FROM (SELECT amount * rate * 100 AS cents) AS amounts
+$$ LANGUAGE sql IMMUTABLE
+"""
+
+CHANGE_STATUS_SQL = """
+CREATE OR REPLACE FUNCTION change_operation_status(target_id integer, new_status operationstatuses, status_datetime TIMESTAMP WITHOUT TIME ZONE)
+RETURNS TABLE (code integer, id INTEGER, sender_wallet_id INTEGER, receiver_wallet_id INTEGER, amount DECIMAL(18, 2), sender_wallet_rate DECIMAL(10, 2), receiver_wallet_rate DECIMAL(10, 2), datetime TIMESTAMP WITHOUT TIME ZONE, signature VARCHAR, current_status operationstatuses, status_version INTEGER) AS $$
+#variable_conflict use_column
+DECLARE
+    operation operations%ROWTYPE;
+    change_wallet_id integer;
+    change_amount numeric;
+    target_datetime timestamp;
+BEGIN
+    -- Partition key by id from not partitioned table, so only
+    -- one partition of operations is locked and searched
+    SELECT operation_datetimes.datetime INTO target_datetime FROM operation_datetimes
+    WHERE operation_datetimes.id = target_id;
+    SELECT * INTO operation FROM operations
+    WHERE operations.id = target_id AND operations.datetime = target_datetime
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        code := 404;
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    IF NOT new_status = ANY(CASE operation.current_status
+        WHEN 'DRAFT' THEN ARRAY['PROCESSING', 'FAILED']::operationstatuses[]
+        WHEN 'PROCESSING' THEN ARRAY['ACCEPTED', 'FAILED']::operationstatuses[]
+        WHEN 'ACCEPTED' THEN ARRAY[]::operationstatuses[]
+        WHEN 'FAILED' THEN ARRAY[]::operationstatuses[]
+    END) THEN
+        code := 400;
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    IF operation.current_status = 'DRAFT' AND new_status = 'PROCESSING' THEN
+        change_wallet_id := operation.sender_wallet_id;
+        change_amount := -1 * convert_amount(operation.amount, operation.sender_wallet_rate);
+    END IF;
+    IF operation.current_status = 'PROCESSING' AND new_status = 'ACCEPTED' THEN
+        change_wallet_id := operation.receiver_wallet_id;
+        change_amount := 1 * convert_amount(operation.amount, operation.receiver_wallet_rate);
+    END IF;
+    IF operation.current_status = 'PROCESSING' AND new_status = 'FAILED' THEN
+        change_wallet_id := operation.sender_wallet_id;
+        change_amount := 1 * convert_amount(operation.amount, operation.sender_wallet_rate);
+    END IF;
+    IF change_amount IS NOT NULL THEN
+        UPDATE wallets SET amount = wallets.amount + change_amount
+        WHERE wallets.id = change_wallet_id AND wallets.amount + change_amount >= 0;
+        IF NOT FOUND THEN
+            code := 202;
+            RETURN NEXT;
+            RETURN;
+        END IF;
+    END IF;
+
+    UPDATE operations
+    SET current_status = new_status, status_version = operations.status_version + 1
+    WHERE operations.id = target_id AND operations.datetime = operation.datetime
+    RETURNING * INTO operation;
+    INSERT INTO operations_statuses (operation_id, status, datetime)
+    VALUES (target_id, new_status, status_datetime);
+
+    code := 200;
+    id := operation.id;
+    sender_wallet_id := operation.sender_wallet_id;
+    receiver_wallet_id := operation.receiver_wallet_id;
+    amount := operation.amount;
+    sender_wallet_rate := operation.sender_wallet_rate;
+    receiver_wallet_rate := operation.receiver_wallet_rate;
+    datetime := operation.datetime;
+    signature := operation.signature;
+    current_status := operation.current_status;
+    status_version := operation.status_version;
+    RETURN NEXT;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def upgrade():
+    op.execute(CONVERT_AMOUNT_SQL)
+    op.execute(CHANGE_STATUS_SQL)
+
+
+def downgrade():
+    op.execute('DROP FUNCTION change_operation_status(integer, operationstatuses, timestamp without time zone)')
+    op.execute('DROP FUNCTION convert_amount(numeric, numeric)')
@@ -0,0 +1,42 @@
+"""operations current status
+
+Revision ID: a3c5e1f0b9d2
+Revises: 297a558ef2ed
+Create Date: 2026-10-18 10:12:41.209671
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'a3c5e1f0b9d2'
+down_revision = '297a558ef2ed'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('operations', sa.Column('current_status', postgresql.ENUM(name='operationstatuses', create_type=False), nullable=True))
+    op.add_column('operations', sa.Column('status_version', sa.Integer(), nullable=True))
+    # Backfilling from statuses history
+    op.execute("""
+        UPDATE operations
+        SET current_status = latest.status, status_version = latest.version
+        FROM (
+            SELECT DISTINCT ON (operation_id)
+                operation_id,
+                status,
+                count(*) OVER (PARTITION BY operation_id) AS version
+            FROM operations_statuses
+            ORDER BY operation_id, id DESC
+        ) AS latest
+        WHERE operations.id = latest.operation_id
+    """)
+    op.alter_column('operations', 'current_status', nullable=False)
+    op.alter_column('operations', 'status_version', nullable=False)
+
+
+def downgrade():
+    op.drop_column('operations', 'status_version')
+    op.drop_column('operations', 'current_status')
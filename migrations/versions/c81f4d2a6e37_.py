@@ -0,0 +1,24 @@
+"""operations keyset pagination indexes
+
+Revision ID: c81f4d2a6e37
+Revises: a3c5e1f0b9d2
+Create Date: 2026-10-18 14:03:27.518934
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'c81f4d2a6e37'
+down_revision = 'a3c5e1f0b9d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_operations_sender_wallet_id_datetime_id', 'operations', ['sender_wallet_id', 'datetime', 'id'], unique=False)
+    op.create_index('ix_operations_receiver_wallet_id_datetime_id', 'operations', ['receiver_wallet_id', 'datetime', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_operations_receiver_wallet_id_datetime_id', table_name='operations')
+    op.drop_index('ix_operations_sender_wallet_id_datetime_id', table_name='operations')
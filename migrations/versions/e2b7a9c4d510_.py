@@ -0,0 +1,48 @@
+"""user operations
+
+Revision ID: e2b7a9c4d510
+Revises: c81f4d2a6e37
+Create Date: 2026-10-18 15:41:09.382115
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'e2b7a9c4d510'
+down_revision = 'c81f4d2a6e37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_operations',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('datetime', sa.DateTime(), nullable=False),
+    sa.Column('operation_id', sa.Integer(), nullable=False),
+    sa.Column('direction', sa.Enum('income', 'outcome', name='operationdirections'), nullable=False),
+    sa.ForeignKeyConstraint(['operation_id'], ['operations.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'datetime', 'operation_id')
+    )
+    op.create_index(op.f('ix_user_operations_operation_id'), 'user_operations', ['operation_id'], unique=False)
+    # Backfilling from operations of senders and receivers
+    op.execute("""
+        INSERT INTO user_operations (user_id, datetime, operation_id, direction)
+        SELECT wallets.user_id, operations.datetime, operations.id, 'outcome'::operationdirections
+        FROM operations JOIN wallets ON wallets.id = operations.sender_wallet_id
+        UNION ALL
+        SELECT wallets.user_id, operations.datetime, operations.id, 'income'::operationdirections
+        FROM operations JOIN wallets ON wallets.id = operations.receiver_wallet_id
+    """)
+    # Reports read user operations from user_operations now
+    op.drop_index('ix_operations_receiver_wallet_id_datetime_id', table_name='operations')
+    op.drop_index('ix_operations_sender_wallet_id_datetime_id', table_name='operations')
+
+
+def downgrade():
+    op.create_index('ix_operations_sender_wallet_id_datetime_id', 'operations', ['sender_wallet_id', 'datetime', 'id'], unique=False)
+    op.create_index('ix_operations_receiver_wallet_id_datetime_id', 'operations', ['receiver_wallet_id', 'datetime', 'id'], unique=False)
+    op.drop_index(op.f('ix_user_operations_operation_id'), table_name='user_operations')
+    op.drop_table('user_operations')
+    sa.Enum(name='operationdirections').drop(op.get_bind(), checkfirst=False)
@@ -0,0 +1,157 @@
+"""monthly partitioning of history tables
+
+Revision ID: f0d3b6a81c92
+Revises: e2b7a9c4d510
+Create Date: 2026-10-18 16:20:51.740312
+
+Needs PostgreSQL 11 or newer. Tables are copied into partitioned ones,
+so the migration takes time proportional to history size.
+
+Unique keys of partitioned tables have to include "datetime" and they can't
+be referenced by foreign keys. Unique operations ids and foreign keys of
+statuses and user operations are kept with not partitioned operation_datetimes
+table (filled by trigger on operations). One status row per
+(operation_id, status) is not enforced by database any more: statuses are
+inserted only by change_operation_status() which locks the operation and
+allows transitions to new statuses only.
+"""
+import datetime as dt
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'f0d3b6a81c92'
+down_revision = 'e2b7a9c4d510'
+branch_labels = None
+depends_on = None
+
+TABLES = ['operations', 'operations_statuses', 'user_operations']
+SEQUENCES = {'operations': 'operations_id_seq', 'operations_statuses': 'operations_statuses_id_seq'}
+# Partitions after the current month, app creates next ones itself
+MONTHS_AHEAD = 3
+
+SYNC_OPERATION_DATETIMES_SQL = """
+CREATE FUNCTION sync_operation_datetimes() RETURNS trigger AS $$
+BEGIN
+    -- Update of datetime moving row to other partition is a delete and an insert,
+    -- the moved row keeps its id and gets its new datetime
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO operation_datetimes (id, datetime) VALUES (NEW.id, NEW.datetime)
+        ON CONFLICT (id) DO UPDATE SET datetime = EXCLUDED.datetime
+        WHERE NOT EXISTS (
+            SELECT 1 FROM operations
+            WHERE operations.id = EXCLUDED.id AND operations.datetime = operation_datetimes.datetime
+        );
+        IF NOT FOUND THEN
+            RAISE unique_violation USING MESSAGE = format('Operation id %s already exists', NEW.id);
+        END IF;
+        RETURN NEW;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM operations WHERE operations.id = OLD.id) THEN
+        DELETE FROM operation_datetimes WHERE id = OLD.id;
+    END IF;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def next_month(month):
+    return dt.datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def copy_tables(partitioned):
+    """ Replaces tables with their partitioned (or not) copies """
+    for table, sequence in SEQUENCES.items():
+        # Sequences should not be dropped with old tables
+        op.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+    for table in TABLES:
+        op.execute(f'ALTER TABLE {table} RENAME TO {table}_old')
+        op.execute(
+            f'CREATE TABLE {table} (LIKE {table}_old INCLUDING DEFAULTS)'
+            + (' PARTITION BY RANGE (datetime)' if partitioned else '')
+        )
+
+    if partitioned:
+        now = dt.datetime.utcnow()
+        first_month = op.get_bind().execute(
+            "SELECT date_trunc('month', min(datetime)) FROM operations_old"
+        ).scalar()
+        month = min(first_month or now, now).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        last_month = dt.datetime(now.year, now.month, 1)
+        for _ in range(MONTHS_AHEAD):
+            last_month = next_month(last_month)
+        while month <= last_month:
+            for table in TABLES:
+                op.execute(
+                    f"CREATE TABLE {table}_{month:%Y_%m} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+                )
+            month = next_month(month)
+
+    for table in TABLES:
+        op.execute(f'INSERT INTO {table} SELECT * FROM {table}_old')
+        op.execute(f'DROP TABLE {table}_old CASCADE')
+    for table, sequence in SEQUENCES.items():
+        op.execute(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id')
+
+
+def upgrade():
+    copy_tables(partitioned=True)
+
+    # Unique keys of partitioned tables include partition key
+    op.create_primary_key('operations_pkey', 'operations', ['id', 'datetime'])
+    op.create_foreign_key('operations_sender_wallet_id_fkey', 'operations', 'wallets', ['sender_wallet_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('operations_receiver_wallet_id_fkey', 'operations', 'wallets', ['receiver_wallet_id'], ['id'], ondelete='CASCADE')
+    op.create_index('ix_operations_datetime', 'operations', ['datetime'], unique=False)
+    op.create_index('ix_operations_receiver_wallet_id', 'operations', ['receiver_wallet_id'], unique=False)
+    op.create_index('ix_operations_sender_wallet_id', 'operations', ['sender_wallet_id'], unique=False)
+
+    op.create_primary_key('operations_statuses_pkey', 'operations_statuses', ['id', 'datetime'])
+    op.create_unique_constraint('operations_statuses_idx', 'operations_statuses', ['operation_id', 'status', 'datetime'])
+    op.create_index('ix_operations_statuses_operation_id', 'operations_statuses', ['operation_id'], unique=False)
+
+    op.create_primary_key('user_operations_pkey', 'user_operations', ['user_id', 'datetime', 'operation_id'])
+    op.create_foreign_key('user_operations_user_id_fkey', 'user_operations', 'users', ['user_id'], ['id'], ondelete='CASCADE')
+    op.create_index('ix_user_operations_operation_id', 'user_operations', ['operation_id'], unique=False)
+
+    # Operation id is unique and could be referenced only in not partitioned table
+    op.create_table(
+        'operation_datetimes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('datetime', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.execute('INSERT INTO operation_datetimes (id, datetime) SELECT id, datetime FROM operations')
+    op.execute(SYNC_OPERATION_DATETIMES_SQL)
+    op.execute(
+        'CREATE TRIGGER operations_sync_operation_datetimes AFTER INSERT OR DELETE ON operations '
+        'FOR EACH ROW EXECUTE PROCEDURE sync_operation_datetimes()'
+    )
+    op.create_foreign_key('operations_statuses_operation_id_fkey', 'operations_statuses', 'operation_datetimes', ['operation_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('user_operations_operation_id_fkey', 'user_operations', 'operation_datetimes', ['operation_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    op.execute('DROP TRIGGER operations_sync_operation_datetimes ON operations')
+    op.execute('DROP FUNCTION sync_operation_datetimes()')
+    copy_tables(partitioned=False)
+    op.drop_table('operation_datetimes')
+
+    op.create_primary_key('operations_pkey', 'operations', ['id'])
+    op.create_foreign_key('operations_sender_wallet_id_fkey', 'operations', 'wallets', ['sender_wallet_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('operations_receiver_wallet_id_fkey', 'operations', 'wallets', ['receiver_wallet_id'], ['id'], ondelete='CASCADE')
+    op.create_index('ix_operations_datetime', 'operations', ['datetime'], unique=False)
+    op.create_index('ix_operations_receiver_wallet_id', 'operations', ['receiver_wallet_id'], unique=False)
+    op.create_index('ix_operations_sender_wallet_id', 'operations', ['sender_wallet_id'], unique=False)
+
+    op.create_primary_key('operations_statuses_pkey', 'operations_statuses', ['id'])
+    op.create_unique_constraint('operations_statuses_idx', 'operations_statuses', ['operation_id', 'status'])
+    op.create_foreign_key('operations_statuses_operation_id_fkey', 'operations_statuses', 'operations', ['operation_id'], ['id'], ondelete='CASCADE')
+    op.create_index('ix_operations_statuses_operation_id', 'operations_statuses', ['operation_id'], unique=False)
+
+    op.create_primary_key('user_operations_pkey', 'user_operations', ['user_id', 'datetime', 'operation_id'])
+    op.create_foreign_key('user_operations_user_id_fkey', 'user_operations', 'users', ['user_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('user_operations_operation_id_fkey', 'user_operations', 'operations', ['operation_id'], ['id'], ondelete='CASCADE')
+    op.create_index('ix_user_operations_operation_id', 'user_operations', ['operation_id'], unique=False)
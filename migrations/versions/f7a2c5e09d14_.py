@@ -0,0 +1,31 @@
+"""hot queries indexes
+
+Revision ID: f7a2c5e09d14
+Revises: f0d3b6a81c92
+Create Date: 2026-10-18 17:02:14.906125
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'f7a2c5e09d14'
+down_revision = 'f0d3b6a81c92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Statuses of operations in order (statuses report, latest status lookup)
+    # can be read from index only once pages are all-visible. Single column
+    # operation_id index is kept for lookups by operation while they are not
+    op.execute(
+        'CREATE INDEX ix_operations_statuses_operation_id_id '
+        'ON operations_statuses (operation_id, id) INCLUDE (status, datetime)'
+    )
+    # Date ranges are served by partitions and user_operations primary key
+    op.drop_index('ix_operations_datetime', table_name='operations')
+
+
+def downgrade():
+    op.create_index('ix_operations_datetime', 'operations', ['datetime'], unique=False)
+    op.drop_index('ix_operations_statuses_operation_id_id', table_name='operations_statuses')
@@ -7,7 +7,9 @@ from passlib.hash import pbkdf2_sha256
 
 from app import create_app
 from app.constants import WalletCurrencies
+from app.db.postgres.compiler import compile_query
 from app.db.postgres.models import operations, users, wallets
+from app.rates_client import RatesClient
 from config import config
 
 
@@ -54,16 +56,17 @@ def user2():
 @pytest.fixture
 def cli(loop, aiohttp_client):
     config["TESTING"] = True
+    config["RATES"]["BACKGROUND_REFRESH"] = False
     app = create_app(config)
     return loop.run_until_complete(aiohttp_client(app))
 
 
 @pytest.fixture(autouse=True)
-def mock_rates(cli, rates, monkeypatch):
-    async def get_rates():
+def mock_rates(rates, monkeypatch):
+    async def get_rates(self):
         return rates
 
-    monkeypatch.setattr(cli.app["rates_client"], "get_rates", get_rates)
+    monkeypatch.setattr(RatesClient, "get_rates", get_rates)
 
 
 @pytest.fixture
@@ -82,6 +85,44 @@ async def create_users(cli):
         yield
 
 
+@pytest.fixture
+def pooled_cli(loop, aiohttp_client):
+    """
+    Client of app with real connection pools instead of single rolled back
+    connection, so concurrent requests run on separate connections.
+    Data written through it is committed, so it can't be used with "cli".
+    """
+    postgres = config["POSTGRES"]
+    app_config = {
+        **config,
+        "TESTING": False,
+        "POSTGRES": {
+            **postgres,
+            "DIRECT_POOL": {**postgres["DIRECT_POOL"], "ENABLED": True},
+        },
+        "RATES": {**config["RATES"], "BACKGROUND_REFRESH": False},
+    }
+    return loop.run_until_complete(aiohttp_client(create_app(app_config)))
+
+
+@pytest.fixture
+async def pooled_users(pooled_cli):
+    """ Committed users with wallets, deleted with their operations afterwards """
+    db = pooled_cli.app["db"]
+    user_ids = []
+    for user in (User1Insert(), User2Insert()):
+        user_id = await db.fetch_val(users.insert().values(user).returning(users.c.id))
+        await db.execute(
+            wallets.insert().values(
+                user_id=user_id, amount=0, currency=WalletCurrencies.USD
+            )
+        )
+        user_ids.append(user_id)
+    yield
+    # Wallets, operations and operations history are deleted by cascade
+    await db.execute(users.delete().where(users.c.id.in_(user_ids)))
+
+
 @pytest.fixture
 async def user_selector(cli):
     db = cli.app["db"]
@@ -139,3 +180,24 @@ async def user_authorizer(cli):
 @pytest.fixture
 async def manager_auth(cli):
     return {"X-Status-Manager-Token": cli.app["config"]["STATUS_MANAGER_TOKEN"]}
+
+
+@pytest.fixture
+async def explain(cli):
+    db = cli.app["db"]
+
+    async def explainer(query, enable_seqscan: bool = True) -> str:
+        sql, args = compile_query(query)
+        async with db.connection() as con:
+            # Rolled back so SET LOCAL does not leak into outer test transaction
+            transaction = await con.transaction()
+            try:
+                if not enable_seqscan:
+                    # Tables in tests are tiny, so planner would prefer seq scans
+                    await con.execute("SET LOCAL enable_seqscan = off")
+                plan = await con.raw_connection.fetch(f"EXPLAIN {sql}", *args)
+            finally:
+                await transaction.rollback()
+        return "\n".join(row[0] for row in plan)
+
+    return explainer
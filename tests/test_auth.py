@@ -1,3 +1,8 @@
+import asyncio
+
+from passlib.context import CryptContext
+
+
 async def test_registration(cli, user1, user_selector):
     resp = await cli.post(
         "/api/auth/signup", json={"user": user1, "wallet_currency": "USD"}
@@ -11,9 +16,58 @@ async def test_registration(cli, user1, user_selector):
     assert user["name"] == user1["name"]
 
 
+async def test_registration_login_exists(cli, create_users, user1, wallet_selector):
+    resp = await cli.post(
+        "/api/auth/signup", json={"user": user1, "wallet_currency": "EUR"}
+    )
+    assert resp.status == 422
+    assert (await resp.json())["user"]["login"] == "Already exists."
+    assert (await wallet_selector(user1))["currency"] == "USD"
+
+
+async def test_registration_concurrently(cli, user1, user_selector):
+    responses = await asyncio.gather(
+        *[
+            cli.post("/api/auth/signup", json={"user": user1, "wallet_currency": "USD"})
+            for _ in range(5)
+        ]
+    )
+    assert sorted(resp.status for resp in responses) == [200, 422, 422, 422, 422]
+    assert await user_selector(user1)
+
+
 async def test_login(cli, create_users, user1):
     resp = await cli.post(
         "/api/auth/login", json={"password": user1["password"], "login": user1["login"]}
     )
     assert resp.status == 200
     assert "token" in await resp.json()
+
+
+async def test_login_rehash(cli, create_users, user1, user_selector):
+    cli.app["password_hasher"].context = CryptContext(
+        schemes=["pbkdf2_sha256"], pbkdf2_sha256__rounds=1000
+    )
+    resp = await cli.post(
+        "/api/auth/login", json={"password": user1["password"], "login": user1["login"]}
+    )
+    assert resp.status == 200
+    user = await user_selector(user1)
+    assert user["password"].startswith("$pbkdf2-sha256$1000$")
+
+
+async def test_logout(cli, create_users, user1, user_authorizer):
+    headers = await user_authorizer(user1)
+    resp = await cli.get("/api/wallet/balance", headers=headers)
+    assert resp.status == 200
+
+    resp = await cli.post("/api/auth/logout", headers=headers)
+    assert resp.status == 200
+
+    resp = await cli.get("/api/wallet/balance", headers=headers)
+    assert resp.status == 401
+
+
+async def test_unknown_token(cli):
+    resp = await cli.get("/api/wallet/balance", headers={"Authorization": "unknown"})
+    assert resp.status == 401
@@ -0,0 +1,134 @@
+import datetime as dt
+import decimal
+
+from app.constants import OperationDirections, OperationStatuses, WalletCurrencies
+from app.db.postgres.direct import init_connection
+
+
+async def test_direct_connections_fall_back_in_tests(cli):
+    assert cli.app["pg"].pool is None
+    async with cli.app["pg"].connection() as con:
+        async with cli.app["db"].connection() as db_con:
+            assert con is db_con.raw_connection
+
+
+async def test_direct_connection_codecs(cli):
+    async with cli.app["db"].connection() as con:
+        await init_connection(con.raw_connection)
+        row = await con.raw_connection.fetchrow(
+            "SELECT $1::walletcurrencies AS currency, $2::operationstatuses AS status,"
+            " 12.34::numeric(18, 2) AS amount, '2019-01-01 12:00'::timestamp AS datetime",
+            WalletCurrencies.EUR,
+            "PROCESSING",
+        )
+    assert row["currency"] is WalletCurrencies.EUR
+    assert row["status"] is OperationStatuses.PROCESSING
+    assert row["amount"] == decimal.Decimal("12.34")
+    assert row["datetime"] == dt.datetime(2019, 1, 1, 12)
+
+
+async def test_direct_pool_codecs(pooled_cli):
+    pg = pooled_cli.app["pg"]
+    assert pg.pool is not None
+    async with pg.connection() as con:
+        row = await con.fetchrow(
+            "SELECT $1::walletcurrencies AS currency, $2::operationdirections AS direction,"
+            " 12.34::numeric(18, 2) AS amount, '2019-01-01 12:00'::timestamp AS datetime",
+            WalletCurrencies.CNY,
+            "income",
+        )
+    assert row["currency"] is WalletCurrencies.CNY
+    assert row["direction"] is OperationDirections.INCOME
+    assert row["amount"] == decimal.Decimal("12.34")
+    assert row["datetime"] == dt.datetime(2019, 1, 1, 12)
+
+
+async def test_direct_pool_balance(pooled_cli, pooled_users, user1):
+    resp = await pooled_cli.post(
+        "/api/auth/login", json={"password": user1["password"], "login": user1["login"]}
+    )
+    headers = {"Authorization": (await resp.json())["token"]}
+    resp = await pooled_cli.post(
+        "/api/wallet/balance", headers=headers, json={"amount": "7", "currency": "CNY"}
+    )
+    assert resp.status == 200
+    resp = await pooled_cli.get("/api/wallet/balance", headers=headers)
+    assert resp.status == 200
+    assert await resp.json() == {"amount": 1, "currency": "USD"}
+
+
+async def test_direct_pool_statuses_batch(pooled_cli, pooled_users, user1, user2):
+    resp = await pooled_cli.post(
+        "/api/auth/login", json={"password": user1["password"], "login": user1["login"]}
+    )
+    headers = {"Authorization": (await resp.json())["token"]}
+    await pooled_cli.post(
+        "/api/wallet/balance", headers=headers, json={"amount": "10", "currency": "USD"}
+    )
+    resp = await pooled_cli.post(
+        "/api/wallet/operations",
+        headers=headers,
+        json={"amount": "10", "currency": "USD", "receiver_login": user2["login"]},
+    )
+    operation_id = (await resp.json())["id"]
+
+    resp = await pooled_cli.post(
+        "/api/operations",
+        headers={
+            "X-Status-Manager-Token": pooled_cli.app["config"]["STATUS_MANAGER_TOKEN"]
+        },
+        json={
+            "operations": [
+                {"operation_id": operation_id, "status": "PROCESSING"},
+                {"operation_id": operation_id, "status": "ACCEPTED"},
+            ]
+        },
+    )
+    assert resp.status == 200
+    results = (await resp.json())["operations"]
+    assert [result["code"] for result in results] == [200, 200]
+
+
+async def test_direct_pool_operations_batch(pooled_cli, pooled_users, user1, user2):
+    resp = await pooled_cli.post(
+        "/api/auth/login", json={"password": user1["password"], "login": user1["login"]}
+    )
+    headers = {"Authorization": (await resp.json())["token"]}
+    await pooled_cli.post(
+        "/api/wallet/balance", headers=headers, json={"amount": "20", "currency": "USD"}
+    )
+    resp = await pooled_cli.post(
+        "/api/wallet/operations/batch",
+        headers=headers,
+        json={
+            "operations": [
+                {"amount": "10", "currency": "USD", "receiver_login": user2["login"]},
+                {"amount": "1", "currency": "USD", "receiver_login": "nobody"},
+                {"amount": "7", "currency": "CNY", "receiver_login": user2["login"]},
+            ]
+        },
+    )
+    assert resp.status == 200
+    results = (await resp.json())["operations"]
+    assert [(result["index"], result["code"]) for result in results] == [
+        (0, 200),
+        (1, 404),
+        (2, 200),
+    ]
+
+    resp = await pooled_cli.post(
+        "/api/operations",
+        headers={
+            "X-Status-Manager-Token": pooled_cli.app["config"]["STATUS_MANAGER_TOKEN"]
+        },
+        json={
+            "operations": [
+                {"operation_id": results[0]["id"], "status": "PROCESSING"},
+                {"operation_id": results[2]["id"], "status": "PROCESSING"},
+            ]
+        },
+    )
+    assert [result["code"] for result in (await resp.json())["operations"]] == [
+        200,
+        200,
+    ]
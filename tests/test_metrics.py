@@ -0,0 +1,30 @@
+async def test_get_metrics(
+    cli, create_users, user1, user2, user_authorizer, manager_auth
+):
+    await cli.post(
+        "/api/wallet/operations",
+        headers=await user_authorizer(user1),
+        json={"amount": "1", "currency": "USD", "receiver_login": user2["login"]},
+    )
+    resp = await cli.get("/api/metrics", headers=manager_auth)
+    assert resp.status == 200
+    signer = (await resp.json())["signer"]
+    assert signer["completed"] >= 1
+    assert signer["rejected"] == 0
+
+
+async def test_get_metrics_queries(
+    cli, create_users, user1, user_authorizer, manager_auth
+):
+    headers = await user_authorizer(user1)
+    for _ in range(2):
+        await cli.get("/api/wallet/balance", headers=headers)
+    resp = await cli.get("/api/metrics", headers=manager_auth)
+    assert resp.status == 200
+    balance = (await resp.json())["queries"]["balance"]
+    assert balance["hits"] >= 1
+
+
+async def test_get_metrics_unauthorized(cli):
+    resp = await cli.get("/api/metrics")
+    assert resp.status == 401
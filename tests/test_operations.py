@@ -0,0 +1,134 @@
+import decimal
+
+import pytest
+import sqlalchemy as sa
+
+from app.constants import OperationStatuses
+from app.db.postgres.models import operations_statuses
+from app.db.postgres.transitions import FUNCTION_NAME, change_status_function_body
+from app.utils import convert_amount
+
+
+async def test_change_statuses_batch(
+    cli, create_users, user1, user2, user_authorizer, manager_auth, wallet_selector
+):
+    headers = await user_authorizer(user1)
+    await cli.post(
+        "/api/wallet/balance", headers=headers, json={"amount": "10", "currency": "USD"}
+    )
+    resp = await cli.post(
+        "/api/wallet/operations/batch",
+        headers=headers,
+        json={
+            "operations": [
+                {"amount": "10", "currency": "USD", "receiver_login": user2["login"]},
+                {"amount": "5", "currency": "USD", "receiver_login": user2["login"]},
+            ]
+        },
+    )
+    first_id, second_id = [result["id"] for result in (await resp.json())["operations"]]
+
+    resp = await cli.post(
+        "/api/operations",
+        headers=manager_auth,
+        json={
+            "operations": [
+                {"operation_id": first_id, "status": "PROCESSING"},
+                {"operation_id": first_id, "status": "ACCEPTED"},
+                {"operation_id": second_id, "status": "PROCESSING"},
+                {"operation_id": second_id + 1000, "status": "PROCESSING"},
+                {"operation_id": first_id, "status": "DRAFT"},
+            ]
+        },
+    )
+    assert resp.status == 200
+    results = (await resp.json())["operations"]
+    assert [result["code"] for result in results] == [200, 200, 202, 404, 400]
+
+    assert (await wallet_selector(user1))["amount"] == decimal.Decimal("0")
+    assert (await wallet_selector(user2))["amount"] == decimal.Decimal("10")
+
+
+async def test_change_status(
+    cli, create_users, user1, user2, user_authorizer, manager_auth
+):
+    resp = await cli.post(
+        "/api/wallet/operations",
+        headers=await user_authorizer(user1),
+        json={"amount": "10", "currency": "USD", "receiver_login": user2["login"]},
+    )
+    operation_id = (await resp.json())["id"]
+
+    resp = await cli.post(
+        f"/api/operations/{operation_id}",
+        headers=manager_auth,
+        json={"status": "FAILED"},
+    )
+    assert resp.status == 200
+    operation = await resp.json()
+    assert operation["current_status"] == "FAILED"
+    assert operation["status_version"] == 2
+
+    # History is stamped with the same clock as the operation itself
+    statuses = await cli.app["db"].fetch_all(
+        sa.select([operations_statuses.c.status])
+        .where(operations_statuses.c.operation_id == operation_id)
+        .order_by(operations_statuses.c.datetime, operations_statuses.c.id)
+    )
+    assert [status["status"] for status in statuses] == [
+        OperationStatuses.DRAFT,
+        OperationStatuses.FAILED,
+    ]
+
+    resp = await cli.post(
+        f"/api/operations/{operation_id}",
+        headers=manager_auth,
+        json={"status": "PROCESSING"},
+    )
+    assert resp.status == 400
+
+
+async def test_change_status_errors(
+    cli, create_users, user1, user2, user_authorizer, manager_auth, wallet_selector
+):
+    resp = await cli.post(
+        "/api/wallet/operations",
+        headers=await user_authorizer(user1),
+        json={"amount": "10", "currency": "USD", "receiver_login": user2["login"]},
+    )
+    operation_id = (await resp.json())["id"]
+
+    resp = await cli.post(
+        f"/api/operations/{operation_id + 1000}",
+        headers=manager_auth,
+        json={"status": "PROCESSING"},
+    )
+    assert resp.status == 404
+
+    resp = await cli.post(
+        f"/api/operations/{operation_id}",
+        headers=manager_auth,
+        json={"status": "PROCESSING"},
+    )
+    assert resp.status == 202
+    assert (await wallet_selector(user1))["amount"] == decimal.Decimal("0")
+
+
+async def test_status_function_is_up_to_date(cli):
+    pg_proc = sa.table("pg_proc", sa.column("proname"), sa.column("prosrc"))
+    sources = await cli.app["db"].fetch_all(
+        sa.select([pg_proc.c.prosrc]).where(pg_proc.c.proname == FUNCTION_NAME)
+    )
+    assert [source["prosrc"] for source in sources] == [change_status_function_body()]
+
+
+@pytest.mark.parametrize(
+    "amount, rate",
+    [("10.00", "1.00"), ("10.00", "0.90"), ("0.05", "0.50"), ("0.15", "0.50")],
+)
+async def test_convert_amount_function(cli, amount, rate):
+    amount, rate = decimal.Decimal(amount), decimal.Decimal(rate)
+    converted = await cli.app["db"].fetch_val(
+        sa.select([sa.func.convert_amount(amount, rate)])
+    )
+    assert converted == convert_amount(rate_to=rate, amount=amount)
@@ -0,0 +1,99 @@
+import datetime as dt
+
+import asyncpg
+import pytest
+import sqlalchemy as sa
+
+from app.constants import OperationStatuses, ReportTypes
+from app.db.postgres.models import operations, operations_statuses, user_operations
+from app.partitions import PARTITIONED_TABLES, partition_name
+from app.report_builder import build_report_query
+from app.utils import month_start, next_month
+
+
+async def test_partitions_created_ahead(cli):
+    month = month_start(dt.datetime.utcnow())
+    expected = []
+    for _ in range(cli.app["config"]["PARTITIONS"]["MONTHS_AHEAD"] + 1):
+        expected.extend(partition_name(table, month) for table in PARTITIONED_TABLES)
+        month = next_month(month)
+
+    existing = await cli.app["db"].fetch_all(
+        "SELECT relname FROM pg_class WHERE relname = ANY(:names)",
+        values={"names": expected},
+    )
+    assert {row["relname"] for row in existing} == set(expected)
+
+
+async def test_report_operations_partition_pruning(explain):
+    month = month_start(dt.datetime.utcnow())
+    plan = await explain(
+        build_report_query(
+            1, ReportTypes.OPERATIONS, date_from=month, date_to=next_month(month)
+        )
+    )
+    assert partition_name("operations", month) in plan
+    assert partition_name("user_operations", month) in plan
+    assert partition_name("operations", next_month(month)) not in plan
+    assert partition_name("user_operations", next_month(month)) not in plan
+
+
+async def test_report_statuses_partition_pruning(explain):
+    month = next_month(month_start(dt.datetime.utcnow()))
+    plan = await explain(
+        build_report_query(1, ReportTypes.STATUSES, date_from=month.date())
+    )
+    assert partition_name("operations_statuses", month) in plan
+    previous_month = month_start(month - dt.timedelta(days=1))
+    assert partition_name("operations_statuses", previous_month) not in plan
+    assert partition_name("user_operations", previous_month) not in plan
+
+
+@pytest.fixture
+async def draft_operation(cli, create_users, user1, user2, user_authorizer):
+    resp = await cli.post(
+        "/api/wallet/operations",
+        headers=await user_authorizer(user1),
+        json={"amount": "10", "currency": "USD", "receiver_login": user2["login"]},
+    )
+    return (await resp.json())["id"]
+
+
+async def test_repeated_transition_keeps_one_status(cli, draft_operation, manager_auth):
+    for status in ("FAILED", "FAILED"):
+        resp = await cli.post(
+            f"/api/operations/{draft_operation}",
+            headers=manager_auth,
+            json={"status": status},
+        )
+    assert resp.status == 400
+    statuses = await cli.app["db"].fetch_all(
+        sa.select([operations_statuses.c.status]).where(
+            operations_statuses.c.operation_id == draft_operation
+        )
+    )
+    assert sorted(row["status"] for row in statuses) == [
+        OperationStatuses.DRAFT,
+        OperationStatuses.FAILED,
+    ]
+
+
+async def test_operation_id_is_unique(cli, draft_operation):
+    db = cli.app["db"]
+    operation = await db.fetch_one(
+        operations.select().where(operations.c.id == draft_operation)
+    )
+    values = dict(operation)
+    values["datetime"] = next_month(month_start(values["datetime"]))
+    with pytest.raises(asyncpg.UniqueViolationError):
+        async with db.transaction():
+            await db.execute(operations.insert().values(values))
+
+
+async def test_operation_history_deleted_with_operation(cli, draft_operation):
+    db = cli.app["db"]
+    await db.execute(operations.delete().where(operations.c.id == draft_operation))
+    for table in (operations_statuses, user_operations):
+        assert not await db.fetch_all(
+            table.select().where(table.c.operation_id == draft_operation)
+        )
@@ -0,0 +1,260 @@
+import datetime as dt
+import re
+
+import databases.core
+import pytest
+import sqlalchemy as sa
+
+from app.constants import OperationDirections, OperationStatuses, ReportTypes
+from app.db.postgres.compiler import CachedQuery
+from app.db.postgres.models import (
+    operations,
+    operations_statuses,
+    user_operations,
+    users,
+    wallets,
+)
+from app.db.postgres.operations import typed
+from app.report_builder import (
+    build_report_page_query,
+    build_report_query,
+    build_segments_query,
+)
+from app.utils import month_start, next_month
+
+SEEDED_OPERATIONS = 1000
+
+# Statuses are read by operation
+STATUSES_LOOKUP_INDEXES = {
+    "ix_operations_statuses_operation_id",
+    "ix_operations_statuses_operation_id_id",
+}
+# or by datetime range of a month partition in primary key
+STATUSES_INDEXES = STATUSES_LOOKUP_INDEXES | {"operations_statuses_pkey"}
+
+
+@pytest.fixture
+async def seeded_operations(cli, create_users, user1, user2):
+    db = cli.app["db"]
+    (sender_user_id, sender_wallet_id), (receiver_user_id, receiver_wallet_id) = [
+        (wallet["user_id"], wallet["id"])
+        for wallet in [
+            await db.fetch_one(
+                sa.select([wallets.c.user_id, wallets.c.id])
+                .select_from(users.join(wallets))
+                .where(users.c.login == user["login"])
+            )
+            for user in (user1, user2)
+        ]
+    ]
+
+    n = sa.column("n")
+    month = sa.func.date_trunc("month", sa.func.timezone("utc", sa.func.now()))
+    await db.execute(
+        operations.insert().from_select(
+            [
+                "sender_wallet_id",
+                "receiver_wallet_id",
+                "amount",
+                "sender_wallet_rate",
+                "receiver_wallet_rate",
+                "datetime",
+                "signature",
+                "current_status",
+                "status_version",
+            ],
+            sa.select(
+                [
+                    typed(operations.c.sender_wallet_id, sender_wallet_id),
+                    typed(operations.c.receiver_wallet_id, receiver_wallet_id),
+                    typed(operations.c.amount, 1),
+                    typed(operations.c.sender_wallet_rate, 1),
+                    typed(operations.c.receiver_wallet_rate, 1),
+                    month + sa.func.make_interval(0, 0, 0, 0, 0, 0, n),
+                    typed(operations.c.signature, ""),
+                    typed(operations.c.current_status, OperationStatuses.ACCEPTED),
+                    typed(operations.c.status_version, 3),
+                ]
+            ).select_from(
+                sa.func.generate_series(
+                    sa.cast(1, sa.Integer), sa.cast(SEEDED_OPERATIONS, sa.Integer)
+                ).alias("n")
+            ),
+        )
+    )
+    for user_id, direction in (
+        (sender_user_id, OperationDirections.OUTCOME),
+        (receiver_user_id, OperationDirections.INCOME),
+    ):
+        await db.execute(
+            user_operations.insert().from_select(
+                ["user_id", "datetime", "operation_id", "direction"],
+                sa.select(
+                    [
+                        typed(user_operations.c.user_id, user_id),
+                        operations.c.datetime,
+                        operations.c.id,
+                        typed(user_operations.c.direction, direction),
+                    ]
+                ),
+            )
+        )
+    for status in (
+        OperationStatuses.DRAFT,
+        OperationStatuses.PROCESSING,
+        OperationStatuses.ACCEPTED,
+    ):
+        await db.execute(
+            operations_statuses.insert().from_select(
+                ["operation_id", "status", "datetime"],
+                sa.select(
+                    [
+                        operations.c.id,
+                        typed(operations_statuses.c.status, status),
+                        operations.c.datetime,
+                    ]
+                ),
+            )
+        )
+    for table in (operations, operations_statuses, user_operations):
+        await db.execute(f"ANALYZE {table.name}")
+    return sender_user_id
+
+
+@pytest.fixture
+async def scanned_indexes(cli):
+    """ Indexes of table scanned in plan, partitions indexes by parent name """
+    rows = await cli.app["db"].fetch_all(
+        "SELECT index.relname AS name, "
+        "coalesce(parent.relname, index.relname) AS parent, "
+        "tables.relname AS table "
+        "FROM pg_class index "
+        "LEFT JOIN pg_inherits ON pg_inherits.inhrelid = index.oid "
+        "LEFT JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_index ON pg_index.indexrelid = coalesce(parent.oid, index.oid) "
+        "JOIN pg_class tables ON tables.oid = pg_index.indrelid "
+        "WHERE index.relkind IN ('i', 'I')"
+    )
+    indexes = {row["name"]: (row["parent"], row["table"]) for row in rows}
+
+    def scanned(plan: str, table: str) -> set:
+        return {
+            indexes[name][0]
+            for name in re.findall(r"(?: using|Bitmap Index Scan on) (\w+)", plan)
+            if indexes[name][1] == table
+        }
+
+    return scanned
+
+
+@pytest.fixture
+def recorded_queries(monkeypatch):
+    """ Queries made by the app through "databases" and cached ones """
+    queries = []
+
+    def recording(method):
+        async def wrapper(self, query, *args, **kwargs):
+            if isinstance(query, sa.sql.ClauseElement):
+                queries.append(query)
+            return await method(self, query, *args, **kwargs)
+
+        return wrapper
+
+    for name in ("execute", "fetch_one", "fetch_all", "fetch_val"):
+        method = getattr(databases.core.Connection, name)
+        monkeypatch.setattr(databases.core.Connection, name, recording(method))
+
+    # Cached queries are executed with asyncpg directly
+    bind = CachedQuery.bind
+
+    def recording_bind(self, **values):
+        query = bind(self, **values)
+        queries.append(query)
+        return query
+
+    monkeypatch.setattr(CachedQuery, "bind", recording_bind)
+    return queries
+
+
+def report_queries(user_id):
+    month = month_start(dt.datetime.utcnow())
+    after = (month + dt.timedelta(seconds=SEEDED_OPERATIONS // 2), 1)
+    for report_type in ReportTypes:
+        yield build_report_query(user_id, report_type)
+        yield build_report_query(
+            user_id, report_type, date_from=month, date_to=next_month(month)
+        )
+        yield build_report_page_query(user_id, report_type, limit=50)
+        yield build_report_page_query(user_id, report_type, limit=50, after=after)
+    yield build_segments_query(user_id, date_from=month, date_to=next_month(month))
+
+
+async def test_report_queries_use_indexes(explain, scanned_indexes, seeded_operations):
+    statuses_indexes = set()
+    for query in report_queries(seeded_operations):
+        plan = await explain(query, enable_seqscan=False)
+        assert "Seq Scan" not in plan, f"{query}\n{plan}"
+        indexes = scanned_indexes(plan, "operations_statuses")
+        assert indexes <= STATUSES_INDEXES, f"{query}\n{plan}"
+        statuses_indexes |= indexes
+    assert STATUSES_LOOKUP_INDEXES <= statuses_indexes
+
+
+async def test_views_queries_use_indexes(
+    cli,
+    explain,
+    scanned_indexes,
+    seeded_operations,
+    recorded_queries,
+    user1,
+    user2,
+    user_authorizer,
+    manager_auth,
+):
+    headers = await user_authorizer(user1)
+    await cli.get("/api/wallet/balance", headers=headers)
+    await cli.post(
+        "/api/wallet/balance", headers=headers, json={"amount": "20", "currency": "USD"}
+    )
+    resp = await cli.post(
+        "/api/wallet/operations",
+        headers=headers,
+        json={"amount": "10", "currency": "USD", "receiver_login": user2["login"]},
+    )
+    operation_id = (await resp.json())["id"]
+    resp = await cli.post(
+        "/api/wallet/operations/batch",
+        headers=headers,
+        json={
+            "operations": [
+                {"amount": "5", "currency": "USD", "receiver_login": user2["login"]}
+            ]
+        },
+    )
+    batch_operation_id = (await resp.json())["operations"][0]["id"]
+    await cli.post(
+        f"/api/operations/{operation_id}",
+        headers=manager_auth,
+        json={"status": "PROCESSING"},
+    )
+    await cli.post(
+        "/api/operations",
+        headers=manager_auth,
+        json={
+            "operations": [
+                {"operation_id": operation_id, "status": "ACCEPTED"},
+                {"operation_id": batch_operation_id, "status": "PROCESSING"},
+            ]
+        },
+    )
+    await cli.get(
+        "/api/report/statuses",
+        params={"report_format": "JSON", "user_login": user1["login"]},
+    )
+
+    assert recorded_queries
+    for query in recorded_queries:
+        plan = await explain(query, enable_seqscan=False)
+        assert "Seq Scan" not in plan, f"{query}\n{plan}"
+        indexes = scanned_indexes(plan, "operations_statuses")
+        assert indexes <= STATUSES_INDEXES, f"{query}\n{plan}"
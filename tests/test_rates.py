@@ -0,0 +1,98 @@
+import asyncio
+import decimal
+
+import pytest
+
+from app.constants import WalletCurrencies
+from app.rates_client import RATES_KEY, RATES_LOCK_KEY, RatesClient, release_lock
+
+# get_rates is mocked for every test in conftest
+get_rates = RatesClient.get_rates
+
+
+class RatesSession:
+    """ Rates service stub counting requests """
+
+    def __init__(self):
+        self.requests = 0
+
+    async def get(self, url, params):
+        self.requests += 1
+        # Let concurrent loadings meet while request is in flight
+        await asyncio.sleep(0.05)
+        return self
+
+    async def json(self):
+        return {"rates": {"USD": 1, "EUR": 0.9, "CAD": 1.3, "CNY": 7}}
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+async def rates_client(cli):
+    client = cli.app["rates_client"]
+    redis = cli.app["redis"]
+    await redis.delete(RATES_KEY, RATES_LOCK_KEY)
+    await client.session.close()
+    client.session = RatesSession()
+    yield client
+    await redis.delete(RATES_KEY, RATES_LOCK_KEY)
+
+
+async def test_load_rates_single_flight(cli, rates_client):
+    results = await asyncio.gather(*[rates_client.load_rates() for _ in range(10)])
+    assert rates_client.session.requests == 1
+    assert all(rates is results[0] for rates in results)
+    assert results[0][WalletCurrencies.EUR] == decimal.Decimal("0.9")
+    # Lock is released, shared rates are cached
+    assert await cli.app["redis"].get(RATES_LOCK_KEY) is None
+    assert await cli.app["redis"].ttl(RATES_KEY) > 0
+
+
+async def test_load_rates_single_flight_between_workers(cli, rates_client):
+    other_worker = RatesClient()
+    other_worker.app = cli.app
+    other_worker.session = rates_client.session
+    other_worker.update_interval = rates_client.update_interval
+    first, second = await asyncio.gather(
+        rates_client.load_rates(), other_worker.load_rates()
+    )
+    # Second worker waits for the lock owner and reads shared rates
+    assert rates_client.session.requests == 1
+    assert first == second
+
+
+async def test_rates_snapshot(cli, rates_client):
+    rates_client.refresher = asyncio.ensure_future(asyncio.sleep(60))
+    try:
+        # No snapshot yet, rates are loaded
+        rates = await get_rates(rates_client)
+        assert rates_client.session.requests == 1
+
+        # Snapshot is returned without redis and rates service
+        await cli.app["redis"].delete(RATES_KEY)
+        assert await get_rates(rates_client) is rates
+        assert rates_client.session.requests == 1
+    finally:
+        rates_client.refresher.cancel()
+        rates_client.refresher = None
+
+
+async def test_rates_without_snapshot(cli, rates_client):
+    rates_client.rates = {WalletCurrencies.USD: decimal.Decimal("2")}
+    rates = await get_rates(rates_client)
+    assert rates_client.session.requests == 1
+    assert rates[WalletCurrencies.USD] == decimal.Decimal("1")
+
+
+async def test_release_lock_of_other_owner(cli):
+    redis = cli.app["redis"]
+    await redis.set(RATES_LOCK_KEY, "other")
+    try:
+        assert not await release_lock(redis, "mine")
+        assert await redis.get(RATES_LOCK_KEY) == "other"
+        assert await release_lock(redis, "other")
+        assert await redis.get(RATES_LOCK_KEY) is None
+    finally:
+        await redis.delete(RATES_LOCK_KEY)
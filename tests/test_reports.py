@@ -0,0 +1,422 @@
+import asyncio
+import datetime as dt
+import decimal
+import io
+import json
+import os
+from xml.etree.ElementTree import Element, tostring
+
+import pytest
+import sqlalchemy as sa
+from aiohttp import web
+
+import app.report_jobs
+from app.constants import ReportFormats, ReportTypes
+from app.db.postgres.models import operations, user_operations, users
+from app.partitions import PARTITIONED_TABLES, create_partition_sql
+from app.report_builder import (
+    ReportBuilder,
+    make_report_builder,
+    negotiate_encoding,
+    xml_row_serializer,
+)
+from app.utils import month_start
+
+
+@pytest.fixture
+async def accepted_operation(
+    cli, create_users, user1, user2, user_authorizer, manager_auth
+):
+    headers = await user_authorizer(user1)
+    await cli.post(
+        "/api/wallet/balance", headers=headers, json={"amount": "10", "currency": "USD"}
+    )
+    resp = await cli.post(
+        "/api/wallet/operations",
+        headers=headers,
+        json={"amount": "10", "currency": "USD", "receiver_login": user2["login"]},
+    )
+    operation_id = (await resp.json())["id"]
+    for status in ("PROCESSING", "ACCEPTED"):
+        await cli.post(
+            f"/api/operations/{operation_id}",
+            headers=manager_auth,
+            json={"status": status},
+        )
+    return operation_id
+
+
+@pytest.mark.parametrize("csv_engine", ["copy", "cursor"])
+async def test_report_operations_csv(
+    cli, accepted_operation, user1, user_authorizer, csv_engine, monkeypatch
+):
+    monkeypatch.setitem(cli.app["config"]["REPORTS"], "CSV_ENGINE", csv_engine)
+    resp = await cli.get(
+        "/api/report/operations",
+        params={"report_format": "CSV"},
+        headers=await user_authorizer(user1),
+    )
+    assert resp.status == 200
+    assert resp.headers["Content-Type"] == "text/csv"
+    lines = (await resp.text()).splitlines()
+    assert lines[0] == "id,amount,datetime,signature,sender_login,receiver_login,type"
+    assert len(lines) == 2
+    assert lines[1].startswith(f"{accepted_operation},10.00,")
+    assert lines[1].endswith(",john123,johnclone,outcome")
+
+
+@pytest.mark.parametrize(
+    "report_type, header",
+    [
+        ("operations", "id,amount,datetime,signature,sender_login,receiver_login,type"),
+        ("statuses", "operation_id,value,datetime"),
+    ],
+)
+async def test_report_csv_engines_match(
+    cli, accepted_operation, user1, user_authorizer, report_type, header, monkeypatch
+):
+    headers = await user_authorizer(user1)
+    bodies = []
+    for csv_engine in ("copy", "cursor"):
+        monkeypatch.setitem(cli.app["config"]["REPORTS"], "CSV_ENGINE", csv_engine)
+        resp = await cli.get(
+            f"/api/report/{report_type}",
+            params={"report_format": "CSV"},
+            headers=headers,
+        )
+        assert resp.status == 200
+        bodies.append(await resp.read())
+    assert bodies[0] == bodies[1]
+    assert b"\r" not in bodies[0]
+    lines = bodies[0].decode().splitlines()
+    assert lines[0] == header
+    assert all(len(line.split(",")) == len(header.split(",")) for line in lines)
+
+
+@pytest.mark.parametrize(
+    "spool",
+    [
+        {"ENABLED": False, "MEMORY_SIZE": 0, "DIR": None},
+        {"ENABLED": True, "MEMORY_SIZE": 1024 * 1024, "DIR": None},
+        {"ENABLED": True, "MEMORY_SIZE": 0, "DIR": None},
+    ],
+)
+async def test_report_statuses_xml(cli, accepted_operation, user2, spool, monkeypatch):
+    monkeypatch.setitem(cli.app["config"]["REPORTS"], "SPOOL", spool)
+    resp = await cli.get(
+        "/api/report/statuses",
+        params={"report_format": "XML", "user_login": user2["login"]},
+    )
+    assert resp.status == 200
+    assert resp.headers["Content-Type"] == "text/xml"
+    text = await resp.text()
+    assert text.count("<status>") == 3
+    assert text.index("<value>ACCEPTED</value>") < text.index("<value>DRAFT</value>")
+    assert text.endswith("</statuses>\n")
+
+
+@pytest.mark.parametrize("fail_sending", [False, True])
+async def test_report_spool_file_removed(
+    cli, accepted_operation, user2, tmp_path, fail_sending, monkeypatch
+):
+    spool = {"ENABLED": True, "MEMORY_SIZE": 0, "DIR": str(tmp_path)}
+    monkeypatch.setitem(cli.app["config"]["REPORTS"], "SPOOL", spool)
+    if fail_sending:
+
+        async def prepare(self, request):
+            raise RuntimeError("Sending failed")
+
+        monkeypatch.setattr(web.FileResponse, "prepare", prepare)
+    resp = await cli.get(
+        "/api/report/statuses",
+        params={"report_format": "XML", "user_login": user2["login"]},
+    )
+    assert resp.status == (500 if fail_sending else 200)
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("spool", [False, True])
+async def test_report_compression(
+    cli, accepted_operation, user1, user_authorizer, spool, monkeypatch
+):
+    monkeypatch.setitem(cli.app["config"]["REPORTS"]["SPOOL"], "ENABLED", spool)
+    headers = await user_authorizer(user1)
+    headers["Accept-Encoding"] = "gzip"
+    resp = await cli.get(
+        "/api/report/operations", params={"report_format": "CSV"}, headers=headers
+    )
+    assert resp.status == 200
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert resp.headers["Vary"] == "Accept-Encoding"
+    lines = (await resp.text()).splitlines()
+    assert len(lines) == 2
+    assert lines[1].startswith(f"{accepted_operation},10.00,")
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, algorithms, encoding",
+    [
+        ("gzip, deflate", ["gzip"], "gzip"),
+        ("gzip;q=0, deflate", ["gzip"], None),
+        ("*", ["gzip"], "gzip"),
+        ("deflate", ["gzip"], None),
+        ("GZIP", ["unknown", "gzip"], "gzip"),
+        ("gzip", [], None),
+        ("", ["gzip"], None),
+    ],
+)
+def test_negotiate_encoding(accept_encoding, algorithms, encoding):
+    assert negotiate_encoding(accept_encoding, algorithms) == encoding
+
+
+async def test_report_operations_ndjson(cli, accepted_operation, user2):
+    resp = await cli.get(
+        "/api/report/operations",
+        params={"report_format": "NDJSON", "user_login": user2["login"]},
+    )
+    assert resp.status == 200
+    assert resp.headers["Content-Type"] == "application/x-ndjson"
+    lines = (await resp.text()).splitlines()
+    assert len(lines) == 1
+    operation = json.loads(lines[0])
+    assert operation["id"] == accepted_operation
+    assert operation["type"] == "income"
+    assert operation["amount"] == 10
+
+
+async def test_report_statuses_json_pages(cli, accepted_operation, user1):
+    params = {"report_format": "JSON", "user_login": user1["login"], "limit": 2}
+    resp = await cli.get("/api/report/statuses", params=params)
+    assert resp.status == 200
+    page = await resp.json()
+    assert [item["value"] for item in page["items"]] == ["ACCEPTED", "PROCESSING"]
+    assert page["next_cursor"]
+
+    params["cursor"] = page["next_cursor"]
+    resp = await cli.get("/api/report/statuses", params=params)
+    page = await resp.json()
+    assert [item["value"] for item in page["items"]] == ["DRAFT"]
+    assert page["items"][0]["operation_id"] == accepted_operation
+    assert page["next_cursor"] is None
+
+    params["cursor"] = "broken"
+    resp = await cli.get("/api/report/statuses", params=params)
+    assert resp.status == 422
+
+
+async def test_report_operations_json_page(cli, accepted_operation, user1):
+    resp = await cli.get(
+        "/api/report/operations",
+        params={"report_format": "JSON", "user_login": user1["login"], "limit": 1},
+    )
+    assert resp.status == 200
+    page = await resp.json()
+    assert [item["id"] for item in page["items"]] == [accepted_operation]
+    assert page["items"][0]["type"] == "outcome"
+    assert page["next_cursor"] is None
+
+
+@pytest.mark.parametrize("report_format", ["ARROW", "PARQUET"])
+async def test_report_operations_columnar(
+    cli, accepted_operation, user1, report_format
+):
+    pyarrow = pytest.importorskip("pyarrow")
+    parquet = pytest.importorskip("pyarrow.parquet")
+    resp = await cli.get(
+        "/api/report/operations",
+        params={"report_format": report_format, "user_login": user1["login"]},
+    )
+    assert resp.status == 200
+    body = await resp.read()
+    if report_format == "ARROW":
+        table = pyarrow.ipc.open_stream(body).read_all()
+    else:
+        table = parquet.read_table(io.BytesIO(body))
+    assert table.schema.field("amount").type == pyarrow.decimal128(18, 2)
+    assert table.schema.field("datetime").type == pyarrow.timestamp("us")
+    columns = table.to_pydict()
+    assert columns["id"] == [accepted_operation]
+    assert columns["amount"] == [decimal.Decimal("10.00")]
+
+
+async def test_report_unknown_user(cli):
+    resp = await cli.get(
+        "/api/report/operations",
+        params={"report_format": "CSV", "user_login": "nobody"},
+    )
+    assert resp.status == 404
+
+
+@pytest.mark.parametrize("report_format", ["CSV", "JSON"])
+async def test_report_user_errors(cli, report_format):
+    resp = await cli.get(
+        "/api/report/operations",
+        params={"report_format": report_format, "user_login": "nobody"},
+    )
+    assert resp.status == 404
+    resp = await cli.get(
+        "/api/report/operations", params={"report_format": report_format}
+    )
+    assert resp.status == 422
+
+
+async def test_report_job_unknown_user(cli):
+    resp = await cli.post(
+        "/api/report/jobs",
+        json={
+            "report_format": "CSV",
+            "report_type": "operations",
+            "user_login": "nobody",
+        },
+    )
+    assert resp.status == 404
+
+
+async def test_report_closed_month_segment_cache(
+    cli, accepted_operation, user1, user2, user_authorizer
+):
+    db = cli.app["db"]
+    headers = await user_authorizer(user1)
+    previous_month = month_start(dt.datetime.utcnow()) - dt.timedelta(days=1)
+    for table in PARTITIONED_TABLES:
+        await db.execute(create_partition_sql(table, month_start(previous_month)))
+
+    async def move_to_previous_month(operation_id, **values):
+        await db.execute(
+            operations.update()
+            .where(operations.c.id == operation_id)
+            .values(datetime=previous_month, **values)
+        )
+        await db.execute(
+            user_operations.update()
+            .where(user_operations.c.operation_id == operation_id)
+            .values(datetime=previous_month)
+        )
+
+    async def get_report():
+        resp = await cli.get(
+            "/api/report/operations", params={"report_format": "CSV"}, headers=headers
+        )
+        assert resp.status == 200
+        return await resp.text()
+
+    await move_to_previous_month(accepted_operation)
+    report = await get_report()
+    assert len(report.splitlines()) == 2
+
+    # Closed month is served from cache
+    await move_to_previous_month(accepted_operation, signature="changed")
+    assert await get_report() == report
+
+    # Unfinished operation makes month live again
+    resp = await cli.post(
+        "/api/wallet/operations",
+        headers=headers,
+        json={"amount": "1", "currency": "USD", "receiver_login": user2["login"]},
+    )
+    await move_to_previous_month((await resp.json())["id"])
+    assert "changed" in await get_report()
+
+    # Live previous month and the current month tail are read by one query
+    user_id = await db.fetch_val(
+        sa.select([users.c.id]).where(users.c.login == user1["login"])
+    )
+    builder = make_report_builder(
+        cli.app, ReportFormats.CSV, ReportTypes.OPERATIONS, user_id=user_id
+    )
+    assert await builder.report_segments() == [
+        (month_start(previous_month), None, None)
+    ]
+
+
+async def test_report_job(cli, accepted_operation, user1, user_authorizer):
+    resp = await cli.post(
+        "/api/report/jobs",
+        headers=await user_authorizer(user1),
+        json={"report_format": "CSV", "report_type": "operations"},
+    )
+    assert resp.status == 202
+    job_id = (await resp.json())["id"]
+
+    for _ in range(100):
+        resp = await cli.get(f"/api/report/jobs/{job_id}")
+        if resp.status != 202:
+            break
+        await asyncio.sleep(0.05)
+    assert resp.status == 200
+    assert resp.headers["Content-Type"] == "text/csv"
+    etag = resp.headers["ETag"]
+    report = await resp.read()
+    assert report.count(b"\n") == 2
+
+    resp = await cli.get(f"/api/report/jobs/{job_id}", headers={"Range": "bytes=0-1"})
+    assert resp.status == 206
+    assert await resp.read() == report[:2]
+
+    resp = await cli.get(f"/api/report/jobs/{job_id}", headers={"If-None-Match": etag})
+    assert resp.status == 304
+
+
+async def test_report_job_expired_while_building(
+    cli, accepted_operation, user1, user_selector, monkeypatch
+):
+    report_jobs = cli.app["report_jobs"]
+    redis = cli.app["redis"]
+    # Job is not queued for running workers, it is built right here
+    monkeypatch.setattr(app.report_jobs, "QUEUE_KEY", "report_jobs:test_queue")
+    user = await user_selector(user1)
+    job = await report_jobs.create(user["id"], "operations", "CSV")
+    await redis.delete("report_jobs:test_queue")
+    write_report_file = ReportBuilder.write_report_file
+
+    async def expiring_write_report_file(builder, path):
+        await write_report_file(builder, path)
+        await redis.delete(app.report_jobs.JOB_KEY.format(job["id"]))
+
+    monkeypatch.setattr(ReportBuilder, "write_report_file", expiring_write_report_file)
+    await report_jobs.build(job["id"])
+
+    assert not await redis.exists(app.report_jobs.JOB_KEY.format(job["id"]))
+    assert not os.path.exists(report_jobs.path(job))
+    resp = await cli.get(f"/api/report/jobs/{job['id']}")
+    assert resp.status == 404
+
+
+async def test_report_job_part_removed_on_failure(
+    cli, create_users, user1, user_selector, monkeypatch
+):
+    report_jobs = cli.app["report_jobs"]
+    monkeypatch.setattr(app.report_jobs, "QUEUE_KEY", "report_jobs:test_queue")
+    user = await user_selector(user1)
+    job = await report_jobs.create(user["id"], "operations", "CSV")
+    await cli.app["redis"].delete("report_jobs:test_queue")
+
+    async def failing_write_report_file(builder, path):
+        with open(path, "wb") as file:
+            file.write(b"id")
+        raise RuntimeError("Report building failed")
+
+    monkeypatch.setattr(ReportBuilder, "write_report_file", failing_write_report_file)
+    with pytest.raises(RuntimeError):
+        await report_jobs.build(job["id"])
+    assert not os.path.exists(f"{report_jobs.path(job)}.part")
+
+
+@pytest.mark.parametrize(
+    "record",
+    [
+        {"id": 1, "amount": decimal.Decimal("10.50"), "signature": "a<b>&c"},
+        {"id": 2, "login": "Пётр 😀", "type": "", "value": None},
+    ],
+)
+async def test_xml_row_serializer(record):
+    elem = Element("operation")
+    for key, val in record.items():
+        child = Element(key)
+        child.text = str(val)
+        elem.append(child)
+
+    serialize = xml_row_serializer("operation", tuple(record))
+    assert (
+        serialize(record).encode("ascii", "xmlcharrefreplace") == tostring(elem) + b"\n"
+    )
@@ -1,10 +1,14 @@
+import asyncio
 import datetime as dt
 import decimal
 
 import pytest
+import sqlalchemy as sa
 from freezegun import freeze_time
 
 from app.constants import WalletCurrencies
+from app.db.postgres.models import operations, user_operations, users, wallets
+from app.partitions import PARTITIONED_TABLES, create_partition_sql
 
 
 async def test_get_balance(cli, create_users, user1, wallet_selector, user_authorizer):
@@ -53,6 +57,11 @@ async def test_create_operation(
     operation_selector,
 ):
     amount, currency = amount_currency
+    # Partitions are created ahead from real date, not the frozen one
+    for table in PARTITIONED_TABLES:
+        await cli.app["db"].execute(
+            create_partition_sql(table, dt.datetime(2019, 1, 1))
+        )
     resp = await cli.post(
         "/api/wallet/operations",
         headers=await user_authorizer(user1),
@@ -67,3 +76,171 @@ async def test_create_operation(
     actual_amount = decimal.Decimal(amount) / rates[currency]
     assert operation["amount"] == actual_amount.quantize(decimal.Decimal(".01"))
     assert operation["datetime"] == dt.datetime(2019, 1, 1, 12, 12, 12, 123000)
+
+
+async def test_create_operation_errors(cli, create_users, user1, user_authorizer):
+    headers = await user_authorizer(user1)
+    resp = await cli.post(
+        "/api/wallet/operations",
+        headers=headers,
+        json={"amount": "1", "currency": "USD", "receiver_login": "nobody"},
+    )
+    assert resp.status == 404
+    resp = await cli.post(
+        "/api/wallet/operations",
+        headers=headers,
+        json={"amount": "1", "currency": "USD", "receiver_login": user1["login"]},
+    )
+    assert resp.status == 400
+
+
+async def test_create_operation_cached_wallets(
+    cli, create_users, user1, user2, user_authorizer
+):
+    headers = await user_authorizer(user1)
+    operation_ids = []
+    for _ in range(2):
+        resp = await cli.post(
+            "/api/wallet/operations",
+            headers=headers,
+            json={"amount": "1", "currency": "USD", "receiver_login": user2["login"]},
+        )
+        assert resp.status == 200
+        operation_ids.append((await resp.json())["id"])
+    assert operation_ids[0] != operation_ids[1]
+    assert cli.app["wallets"].stats()["hits"] == 2
+
+    history = await cli.app["db"].fetch_all(
+        user_operations.select().where(
+            user_operations.c.operation_id.in_(operation_ids)
+        )
+    )
+    assert len(history) == 4
+
+
+async def test_create_operations_batch(
+    cli, create_users, user1, user2, user_authorizer, rates, operation_selector
+):
+    resp = await cli.post(
+        "/api/wallet/operations/batch",
+        headers=await user_authorizer(user1),
+        json={
+            "operations": [
+                {"amount": "10", "currency": "USD", "receiver_login": user2["login"]},
+                {"amount": "7", "currency": "CNY", "receiver_login": user2["login"]},
+                {"amount": "1", "currency": "USD", "receiver_login": "nobody"},
+                {"amount": "1", "currency": "USD", "receiver_login": user1["login"]},
+            ]
+        },
+    )
+    assert resp.status == 200
+    results = (await resp.json())["operations"]
+    assert [
+        (result["index"], result["receiver_login"], result["code"])
+        for result in results
+    ] == [
+        (0, user2["login"], 200),
+        (1, user2["login"], 200),
+        (2, "nobody", 404),
+        (3, user1["login"], 400),
+    ]
+    assert results[0]["id"] != results[1]["id"]
+
+    operation = await operation_selector(user1)
+    assert operation["id"] in (results[0]["id"], results[1]["id"])
+    assert operation["sender_wallet_rate"] == rates[WalletCurrencies.USD]
+
+
+async def test_create_operations_batch_reserved_ids(
+    cli, create_users, user1, user2, user_authorizer
+):
+    resp = await cli.post(
+        "/api/wallet/operations/batch",
+        headers=await user_authorizer(user1),
+        json={
+            "operations": [
+                {"amount": "10", "currency": "USD", "receiver_login": user2["login"]},
+                {"amount": "7", "currency": "USD", "receiver_login": user2["login"]},
+            ]
+        },
+    )
+    assert resp.status == 200
+    results = (await resp.json())["operations"]
+
+    # Every result refers to the operation inserted for its own item
+    inserted = await cli.app["db"].fetch_all(
+        sa.select([operations.c.id, operations.c.amount, operations.c.signature])
+        .where(operations.c.id.in_([result["id"] for result in results]))
+        .order_by(operations.c.id)
+    )
+    assert [
+        (operation["id"], operation["amount"], operation["signature"])
+        for operation in inserted
+    ] == [
+        (result["id"], decimal.Decimal(result["amount"]), result["signature"])
+        for result in results
+    ]
+
+
+async def pooled_wallet(db, user: dict):
+    return await db.fetch_one(
+        sa.select([wallets.c.id, wallets.c.amount])
+        .select_from(wallets.join(users))
+        .where(users.c.login == user["login"])
+    )
+
+
+async def test_post_balance_concurrently(pooled_cli, pooled_users, user1):
+    resp = await pooled_cli.post(
+        "/api/auth/login", json={"password": user1["password"], "login": user1["login"]}
+    )
+    headers = {"Authorization": (await resp.json())["token"]}
+    responses = await asyncio.gather(
+        *[
+            pooled_cli.post(
+                "/api/wallet/balance",
+                headers=headers,
+                json={"amount": "1.01", "currency": "USD"},
+            )
+            for _ in range(100)
+        ]
+    )
+    assert all(resp.status == 200 for resp in responses)
+    wallet = await pooled_wallet(pooled_cli.app["db"], user1)
+    assert wallet["amount"] == decimal.Decimal("101.00")
+
+
+async def test_change_statuses_concurrently(pooled_cli, pooled_users, user1, user2):
+    resp = await pooled_cli.post(
+        "/api/auth/login", json={"password": user1["password"], "login": user1["login"]}
+    )
+    headers = {"Authorization": (await resp.json())["token"]}
+    await pooled_cli.post(
+        "/api/wallet/balance", headers=headers, json={"amount": "10", "currency": "USD"}
+    )
+    operation_ids = []
+    for _ in range(5):
+        resp = await pooled_cli.post(
+            "/api/wallet/operations",
+            headers=headers,
+            json={"amount": "3", "currency": "USD", "receiver_login": user2["login"]},
+        )
+        operation_ids.append((await resp.json())["id"])
+
+    # Sender wallet is debited by every transition at the same time
+    manager_auth = {
+        "X-Status-Manager-Token": pooled_cli.app["config"]["STATUS_MANAGER_TOKEN"]
+    }
+    responses = await asyncio.gather(
+        *[
+            pooled_cli.post(
+                f"/api/operations/{operation_id}",
+                headers=manager_auth,
+                json={"status": "PROCESSING"},
+            )
+            for operation_id in operation_ids
+        ]
+    )
+    assert sorted(resp.status for resp in responses) == [200, 200, 200, 202, 202]
+    wallet = await pooled_wallet(pooled_cli.app["db"], user1)
+    assert wallet["amount"] == decimal.Decimal("1.00")